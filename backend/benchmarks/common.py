@@ -0,0 +1,142 @@
+"""Offline stand-ins shared by the benchmark scripts."""
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import List
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+EMBEDDING_SIZE = 384
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings.
+
+    Words are hashed into a fixed number of dimensions, so texts sharing
+    vocabulary land close together. cost_per_text burns CPU to mimic the
+    MiniLM forward pass.
+    """
+
+    def __init__(self, size: int = EMBEDDING_SIZE, cost_per_text: float = 0.0):
+        self.size = size
+        self.cost_per_text = cost_per_text
+
+    def _embed(self, text: str) -> List[float]:
+        if self.cost_per_text:
+            deadline = time.perf_counter() + self.cost_per_text
+            while time.perf_counter() < deadline:
+                pass
+        vector = [0.0] * self.size
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.size
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubChatModel(BaseChatModel):
+    """Deterministic chat model with a fixed, simulated generation latency."""
+
+    latency: float = 0.05
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply(self, messages) -> str:
+        return f"Stub answer about: {str(messages[-1].content)[:80]}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for word in self._reply(messages).split(' '):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + ' '))
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Build a minimal text-only PDF, one string per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        lines = [_escape_pdf_text(line) for line in text.splitlines() or [""]]
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode('latin-1', errors='replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream_bytes), stream_bytes))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+def synthetic_pages(count: int, words_per_page: int = 400, seed: int = 0) -> List[str]:
+    """Generate deterministic pseudo-lecture pages."""
+    vocabulary = (
+        "gradient descent matrix vector eigenvalue probability entropy network layer "
+        "neuron activation loss optimizer tensor kernel convolution attention token "
+        "embedding transformer recursion graph tree hash sorting complexity proof lemma"
+    ).split()
+    pages = []
+    for page in range(count):
+        words = []
+        for i in range(words_per_page):
+            digest = hashlib.md5(f"{seed}:{page}:{i}".encode()).digest()
+            words.append(vocabulary[digest[0] % len(vocabulary)])
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        pages.append(f"Lecture page {page}\n" + "\n".join(lines))
+    return pages
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,85 @@
+"""
+Chat latency under concurrent load while an ingestion is in progress.
+
+The same load is first run with no ingestion, so the idle percentiles show
+how much of the latency the ingest is responsible for.
+
+Run from the backend directory:
+    python -m benchmarks.concurrent_chat --clients 20 --requests 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from rag.pdf_bot import PDFBot
+from utils.concurrency import shutdown_pools
+from .common import HashEmbeddings, StubChatModel, make_pdf, percentile, synthetic_pages
+
+
+async def chat_client(bot, session_id: str, requests: int, llm, latencies, topic: str = "gradient descent"):
+    for i in range(requests):
+        start = time.perf_counter()
+        await bot.get_response(session_id, f"Explain {topic}, question {i}", llm)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    bot = PDFBot(HashEmbeddings(cost_per_text=args.embed_cost))
+    warm_pdf = make_pdf(synthetic_pages(5))
+    await bot.process_pdf([warm_pdf], "warm")
+    await bot.process_pdf([warm_pdf], "idle")
+    llm = StubChatModel(latency=args.llm_latency)
+
+    # Its own session and questions, so the loaded run starts with an empty history and no cache hits
+    idle_latencies = []
+    await asyncio.gather(*(
+        chat_client(bot, "idle", args.requests, llm, idle_latencies, topic="backpropagation")
+        for _ in range(args.clients)
+    ))
+
+    ingest_pdf = make_pdf(synthetic_pages(args.ingest_pages, seed=1))
+    ingest_start = time.perf_counter()
+    ingest_task = asyncio.create_task(bot.process_pdf([ingest_pdf], "ingest"))
+
+    latencies = []
+    chat_start = time.perf_counter()
+    await asyncio.gather(*(
+        chat_client(bot, "warm", args.requests, llm, latencies) for _ in range(args.clients)
+    ))
+    chat_elapsed = time.perf_counter() - chat_start
+    await ingest_task
+    ingest_elapsed = time.perf_counter() - ingest_start
+
+    return {
+        "clients": args.clients,
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "idle_p50_ms": percentile(idle_latencies, 50) * 1000,
+        "idle_p99_ms": percentile(idle_latencies, 99) * 1000,
+        "throughput_rps": len(latencies) / chat_elapsed,
+        "ingest_pages": args.ingest_pages,
+        "ingest_seconds": ingest_elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--embed-cost", type=float, default=0.002)
+    parser.add_argument("--ingest-pages", type=int, default=200)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    shutdown_pools()
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
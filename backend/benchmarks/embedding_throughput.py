@@ -0,0 +1,81 @@
+"""
+Embedding throughput (chunks/sec) versus micro-batch size.
+
+Several simulated sessions submit chunks concurrently through one
+EmbeddingService. Uses the real MiniLM model when sentence-transformers is
+installed, otherwise falls back to the hashing stub (pass --stub to force it).
+
+Run from the backend directory:
+    python -m benchmarks.embedding_throughput --chunks 512 --sessions 8
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.embeddings import MODEL_NAME, EmbeddingService, ServiceEmbeddings
+from .common import HashEmbeddings, synthetic_pages
+
+
+def load_model(stub: bool):
+    if not stub:
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(model_name=MODEL_NAME), MODEL_NAME
+        except ImportError:
+            pass
+    return HashEmbeddings(cost_per_text=0.0005), "hash-stub"
+
+
+def measure(model, texts, sessions: int, batch_size: int, workers: int):
+    service = EmbeddingService(model, max_batch_size=batch_size, workers=workers)
+    embeddings = ServiceEmbeddings(service)
+    per_session = [texts[i::sessions] for i in range(sessions)]
+
+    def ingest(session_texts):
+        # Each session submits its chunks in the small groups a splitter would produce
+        for start in range(0, len(session_texts), 8):
+            embeddings.embed_documents(session_texts[start:start + 8])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(ingest, per_session))
+    elapsed = time.perf_counter() - start
+    stats = service.stats()
+    service.stop()
+    return {
+        "batch_size": batch_size,
+        "chunks_per_sec": len(texts) / elapsed,
+        "avg_batch_size": stats["avg_batch_size"],
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-sizes", default="1,4,16,32,64,128")
+    parser.add_argument("--stub", action="store_true", help="Use the hashing stub instead of MiniLM")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    model, model_name = load_model(args.stub)
+    texts = synthetic_pages(args.chunks, words_per_page=120)
+    results = {
+        "model": model_name,
+        "chunks": args.chunks,
+        "sessions": args.sessions,
+        "runs": [
+            measure(model, texts, args.sessions, int(size), args.workers)
+            for size in args.batch_sizes.split(",")
+        ],
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
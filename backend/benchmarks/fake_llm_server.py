@@ -0,0 +1,140 @@
+"""
+Fake Groq/OpenAI-compatible chat completions server for offline testing.
+
+Serves POST /openai/v1/chat/completions (Groq's path) and
+/v1/chat/completions, streamed or not, with a fixed latency, and enforces a
+per-API-key request limit over a sliding window the way the real API does:
+every response reports the requests left and the time until the next slot
+frees in Groq's x-ratelimit-* headers, and over the limit it answers 429
+with a Retry-After header. GET /stats returns what it has seen.
+
+Run from the backend directory, then point the app at it:
+    python -m benchmarks.fake_llm_server --port 8100 --limit 30 --window-seconds 60
+    OMNILEARN_LLM_BASE_URL=http://127.0.0.1:8100 python main.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(latency: float = 0.2, limit: int = 0, window_seconds: float = 60.0, words: int = 40) -> FastAPI:
+    """The fake API; limit requests per key per window_seconds, 0 for no limit."""
+    app = FastAPI()
+    recent: Dict[str, Deque[float]] = {}
+    counters = {"requests": 0, "completed": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+    app.state.counters = counters
+
+    def admit(api_key: str):
+        """Count the request against the key's window; returns (admitted, rate-limit headers)."""
+        if not limit:
+            return True, {}
+        now = time.monotonic()
+        window = recent.setdefault(api_key, deque())
+        while window and window[0] <= now - window_seconds:
+            window.popleft()
+        admitted = len(window) < limit
+        if admitted:
+            window.append(now)
+        reset = window[0] + window_seconds - now
+        headers = {
+            "x-ratelimit-limit-requests": str(limit),
+            "x-ratelimit-remaining-requests": str(limit - len(window)),
+            "x-ratelimit-reset-requests": f"{reset:.2f}s",
+        }
+        if not admitted:
+            headers["retry-after"] = str(math.ceil(reset))
+        return admitted, headers
+
+    def reply(messages) -> str:
+        question = str(messages[-1].get("content", ""))[:60] if messages else ""
+        return " ".join([f"Fake answer to: {question}"] + ["lorem"] * words)
+
+    async def completions(request: Request):
+        body = await request.json()
+        api_key = request.headers.get("authorization", "").removeprefix("Bearer ")
+        counters["requests"] += 1
+        admitted, headers = admit(api_key)
+        if not admitted:
+            counters["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429, headers=headers,
+            )
+        text = reply(body.get("messages", []))
+        usage = {"prompt_tokens": sum(len(str(m.get("content", ""))) // 4 + 1 for m in body.get("messages", [])),
+                 "completion_tokens": len(text) // 4 + 1}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id, created, model = f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), body.get("model")
+        counters["in_flight"] += 1
+        counters["max_in_flight"] = max(counters["max_in_flight"], counters["in_flight"])
+
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(latency)
+            finally:
+                counters["in_flight"] -= 1
+            counters["completed"] += 1
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }, headers=headers)
+
+        async def events():
+            try:
+                pieces = text.split(" ")
+                for i, piece in enumerate(pieces):
+                    # Latency is spread over the stream, time to first token included
+                    await asyncio.sleep(latency / len(pieces))
+                    delta = {"role": "assistant", "content": piece + " "} if i == 0 else {"content": piece + " "}
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                             "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+                counters["completed"] += 1
+            finally:
+                counters["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+    app.add_api_route("/openai/v1/chat/completions", completions, methods=["POST"])
+    app.add_api_route("/v1/chat/completions", completions, methods=["POST"])
+    app.add_api_route("/stats", lambda: counters, methods=["GET"])
+    return app
+
+
+def serve_in_thread(app: FastAPI, port: int):
+    """Start the server on 127.0.0.1:port in a daemon thread; returns the uvicorn server."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per completion")
+    parser.add_argument("--limit", type=int, default=30, help="Requests per key per window; 0 for no limit")
+    parser.add_argument("--window-seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.latency, args.limit, args.window_seconds), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
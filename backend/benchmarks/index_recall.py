@@ -0,0 +1,223 @@
+"""
+Recall@k, latency and memory of the quantized index versus Chroma.
+
+Builds the same corpus into a Chroma collection (the default shared index)
+and a QuantizedVectorStore, then answers a set of queries with each.
+Recall@k is measured against exact float32 brute-force search. Each index is
+opened and queried in a fresh process, so the resident memory it adds is
+measured without the build or the other index in the way. Uses the real
+MiniLM model when sentence-transformers is installed, otherwise the hashing
+stub (pass --stub to force it).
+
+Run from the backend directory:
+    python -m benchmarks.index_recall --chunks 20000 --queries 200 --output index_recall.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from rag.quantized_index import QuantizedVectorStore
+from .common import HashEmbeddings, percentile
+from .embedding_throughput import load_model
+
+CHROMA_ADD_BATCH = 4096
+TOPICS = 200
+WORDS_PER_TOPIC = 40
+
+
+def _word(topic: int, index: int) -> str:
+    return hashlib.md5(f"{topic}:{index}".encode()).hexdigest()[:7]
+
+
+def synthetic_chunks(count: int, words: int = 120, seed: int = 0):
+    """Chunks drawn from overlapping topic vocabularies, so neighbours are meaningful but not trivial."""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for _ in range(count):
+        topics = rng.choice(TOPICS, size=3, replace=False)
+        weights = rng.dirichlet([1.0, 1.0, 1.0])
+        picks = rng.choice(3, size=words, p=weights)
+        chunks.append(" ".join(_word(int(topics[p]), int(rng.integers(WORDS_PER_TOPIC))) for p in picks))
+    return chunks
+
+
+def pad(text: str, chars: int) -> str:
+    """Repeat a chunk to a realistic stored size; the vector is computed from the unpadded text."""
+    return (text + " ") * max(1, chars // (len(text) + 1))
+
+
+def current_rss_mb():
+    """
+    Resident memory as (private, file-backed) MB.
+
+    File-backed pages of memory-mapped indexes are page cache: shared by
+    every worker mapping the same files and reclaimable under pressure.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident, shared = (int(field) for field in f.read().split()[1:3])
+        page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        return (resident - shared) * page_mb, shared * page_mb
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 0.0
+
+
+def rss_delta(start, end):
+    return {"private_mb": end[0] - start[0], "file_backed_mb": end[1] - start[1]}
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def build_chroma(path: str, ids, texts, vectors, embeddings):
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection("bench")
+    for start in range(0, len(ids), CHROMA_ADD_BATCH):
+        end = start + CHROMA_ADD_BATCH
+        collection.add(ids=ids[start:end], documents=texts[start:end],
+                       metadatas=[{"row": i} for i in range(start, min(end, len(ids)))],
+                       embeddings=vectors[start:end])
+
+
+def build_quantized(path: str, ids, texts, vectors, embeddings):
+    store = QuantizedVectorStore.create(path, embeddings)
+    for start in range(0, len(ids), CHROMA_ADD_BATCH):
+        end = start + CHROMA_ADD_BATCH
+        store.add_embedded(ids[start:end], texts[start:end],
+                           [{"row": i} for i in range(start, min(end, len(ids)))], vectors[start:end])
+    store.seal()
+
+
+def probe(backend: str, path: str, queries_path: str, ks, rerank_factors):
+    """Open one index in this (fresh) process and answer every query; prints JSON to stdout."""
+    queries = np.load(queries_path)
+    embeddings = HashEmbeddings()
+    rss_start = current_rss_mb()
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+        from langchain_chroma import Chroma
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        rss_start = current_rss_mb()
+        store = Chroma(client=client, collection_name="bench", embedding_function=embeddings)
+        settings = [None]
+    else:
+        store = QuantizedVectorStore(path, embeddings)
+        settings = rerank_factors
+    rss_open = current_rss_mb()
+
+    runs = []
+    for setting in settings:
+        if setting is not None:
+            store.rerank_factor = setting
+        for k in ks:
+            latencies, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = store.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                results.append([doc.id for doc, _ in hits])
+            runs.append({"rerank_factor": setting, "k": k, "ids": results,
+                         "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)})
+    print(json.dumps({
+        "rss_open": rss_delta(rss_start, rss_open),
+        "rss_after_queries": rss_delta(rss_start, current_rss_mb()),
+        "runs": runs,
+    }))
+
+
+def run_probe(backend: str, path: str, queries_path: str, ks, rerank_factors):
+    command = [sys.executable, "-m", "benchmarks.index_recall", "--probe", backend, "--index-path", path,
+               "--queries-path", queries_path, "--ks", ",".join(map(str, ks)),
+               "--rerank-factors", ",".join(map(str, rerank_factors))]
+    output = subprocess.run(command, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def recall(results, truth, k: int) -> float:
+    return float(np.mean([len(set(found[:k]) & set(expected[:k])) / k for found, expected in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunk-chars", type=int, default=5000, help="Stored size of every chunk")
+    parser.add_argument("--ks", default="1,4,10,20")
+    parser.add_argument("--rerank-factors", default="1,2,4,8")
+    parser.add_argument("--stub", action="store_true", help="Use the hashing stub instead of MiniLM")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--probe", choices=["chroma", "quantized"], help=argparse.SUPPRESS)
+    parser.add_argument("--index-path", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    ks = [int(k) for k in args.ks.split(",")]
+    rerank_factors = [int(f) for f in args.rerank_factors.split(",")]
+
+    if args.probe:
+        probe(args.probe, args.index_path, args.queries_path, ks, rerank_factors)
+        return
+
+    model, model_name = load_model(args.stub)
+    chunks = synthetic_chunks(args.chunks)
+    ids = [f"chunk-{i}" for i in range(len(chunks))]
+    texts = [pad(chunk, args.chunk_chars) for chunk in chunks]
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(chunks), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+    rng = np.random.default_rng(1)
+    queries = np.asarray(model.embed_documents([
+        " ".join(rng.choice(chunks[int(i)].split(), size=12)) for i in rng.integers(len(chunks), size=args.queries)
+    ]), dtype=np.float32)
+
+    # Exact float32 brute force is the ground truth for both indexes
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit.T
+    truth = [[ids[i] for i in np.argsort(-row)[:max(ks)]] for row in scores]
+
+    results = {"model": model_name, "chunks": len(chunks), "queries": len(queries), "chunk_chars": args.chunk_chars,
+               "dim": int(vectors.shape[1]), "embed_seconds": embed_seconds, "backends": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        queries_path = os.path.join(workdir, "queries.npy")
+        np.save(queries_path, queries)
+        for backend, build in (("chroma", build_chroma), ("quantized", build_quantized)):
+            path = os.path.join(workdir, backend)
+            start = time.perf_counter()
+            build(path, ids, texts, vectors, HashEmbeddings())
+            build_seconds = time.perf_counter() - start
+            measured = run_probe(backend, path, queries_path, ks, rerank_factors)
+            results["backends"][backend] = {
+                "build_seconds": build_seconds,
+                "disk_mb": directory_bytes(path) / (1024 * 1024),
+                "rss_open": measured["rss_open"],
+                "rss_after_queries": measured["rss_after_queries"],
+                "runs": [
+                    {
+                        "rerank_factor": run["rerank_factor"],
+                        "k": run["k"],
+                        "recall": recall(run["ids"], truth, run["k"]),
+                        "p50_ms": run["p50_ms"],
+                        "p95_ms": run["p95_ms"],
+                    }
+                    for run in measured["runs"]
+                ],
+            }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
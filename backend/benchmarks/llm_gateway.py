@@ -0,0 +1,123 @@
+"""
+Classroom burst against a rate-limited fake Groq server, with and without the LLM gateway.
+
+Many students send their question at the same moment with one API key,
+several of them asking the same thing. The direct client is a plain ChatGroq
+with the SDK's default retries, as the app used before the gateway; the
+gateway run uses LLMGateway as configured by default, pacing calls by the
+rate-limit headers the server reports, and the gateway_static run adds a
+token bucket with the fake server's limit. Reports
+successes, failures, latency percentiles and what the server saw (upstream
+requests, 429s, peak concurrency).
+
+Run from the backend directory:
+    python -m benchmarks.llm_gateway --students 60 --distinct 20 --limit 20 --window-seconds 10
+"""
+import argparse
+import asyncio
+import json
+import socket
+import time
+from langchain_groq import ChatGroq
+from rag.llm_gateway import LLMGateway
+from .common import percentile
+from .fake_llm_server import create_app, serve_in_thread
+
+MODEL = "llama-3.3-70b-versatile"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def burst(llm, questions, stream: bool):
+    async def ask(question: str):
+        start = time.perf_counter()
+        try:
+            if stream:
+                async for _ in llm.astream(question):
+                    pass
+            else:
+                await llm.ainvoke(question)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+
+    results = await asyncio.gather(*(ask(question) for question in questions))
+    latencies = [latency for latency, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    return {
+        "ok": len(latencies),
+        "failed": len(errors),
+        "errors": sorted(set(errors)),
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "max_s": max(latencies, default=0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--distinct", type=int, default=20, help="Distinct questions among the students")
+    parser.add_argument("--limit", type=int, default=20, help="Server limit: requests per key per window")
+    parser.add_argument("--window-seconds", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Gateway cap per API key")
+    parser.add_argument("--stream", action="store_true", help="Stream the answers, as /chat/stream does")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    port = free_port()
+    app = create_app(latency=args.latency, limit=args.limit, window_seconds=args.window_seconds)
+    server = serve_in_thread(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+    questions = [f"Question {i % args.distinct} about the lecture" for i in range(args.students)]
+    counters = app.state.counters
+
+    async def run():
+        results = {}
+        clients = {
+            "direct": lambda: ChatGroq(groq_api_key="key-direct", model_name=MODEL, base_url=base_url),
+            "gateway": lambda: LLMGateway(base_url=base_url, max_concurrency_per_key=args.max_concurrency),
+            "gateway_static": lambda: LLMGateway(
+                base_url=base_url,
+                max_concurrency_per_key=args.max_concurrency,
+                requests_per_minute=args.limit * 60 / args.window_seconds,
+                request_burst=args.limit,
+            ),
+        }
+        for name, factory in clients.items():
+            for counter in counters:
+                counters[counter] = 0
+            client = factory()
+            gateway = name.startswith("gateway")
+            # A key per run, so one run's window does not throttle the next
+            llm = client.chat_model(f"key-{name}", MODEL) if gateway else client
+            start = time.perf_counter()
+            results[name] = await burst(llm, questions, args.stream)
+            results[name]["seconds"] = time.perf_counter() - start
+            results[name]["server"] = dict(counters)
+            if gateway:
+                results[name]["gateway"] = next(iter(client.stats().values()))
+        return results
+
+    results = {
+        "students": args.students,
+        "distinct_questions": args.distinct,
+        "server_limit": f"{args.limit} requests / {args.window_seconds:g}s",
+        "latency_s": args.latency,
+        "stream": args.stream,
+        "runs": asyncio.run(run()),
+    }
+    server.should_exit = True
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
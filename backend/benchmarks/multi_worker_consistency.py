@@ -0,0 +1,165 @@
+"""
+Multi-worker consistency check for the shared session state.
+
+Starts several worker processes that share one data directory and session
+backend, the way uvicorn workers do, and drives them with commands: ingest
+in one worker, then read, chat, re-ingest and poll jobs from the others.
+Every check must see the latest write no matter which worker made it. The
+LLM and embedding model are replaced by the offline stand-ins, so no network
+or model download is needed. Exits non-zero if any check fails.
+
+Run from the backend directory:
+    python -m benchmarks.multi_worker_consistency --workers 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def serve(data_dir: str):
+    """Worker side: execute one JSON command per stdin line, answering on stdout."""
+    from benchmarks.common import HashEmbeddings, StubChatModel, make_pdf
+    from rag.chain_registry import ChainRegistry
+    from rag.hybrid_retriever import HybridRetriever
+    from rag.jobs import JobManager
+    from rag.pdf_bot import PDFBot
+    from rag.session_backend import get_session_backend
+
+    bot = PDFBot(HashEmbeddings(), chain_registry=ChainRegistry(), data_dir=data_dir)
+    jobs = JobManager(get_session_backend(data_dir))
+    llm = StubChatModel(latency=0)
+    loop = asyncio.get_running_loop()
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        command = json.loads(line)
+        op, session_id = command["op"], command.get("session")
+        try:
+            if op == "ingest":
+                result = await bot.process_pdf([make_pdf(command["pages"])], session_id)
+            elif op == "submit":
+                pdf = make_pdf(command["pages"])
+                result = jobs.submit(
+                    "pdf", lambda job: bot.process_pdf([pdf], session_id, progress=job.report),
+                    dedup_key=("pdf", session_id, command["key"])
+                )
+            elif op == "job":
+                result = jobs.get(command["job_id"])
+            elif op == "search":
+                retriever = HybridRetriever(sources=bot.vector_stores.sources(session_id), k=1)
+                result = [doc.page_content for doc in await retriever.ainvoke(command["query"])]
+            elif op == "chat":
+                _, history = await bot.get_response(session_id, command["message"], llm)
+                result = len(history)
+            elif op == "history":
+                result = len(bot.chat_stores[session_id].messages)
+            elif op == "sessions":
+                result = sorted(bot.vector_stores.keys())
+            else:
+                raise ValueError(f"Unknown command: {op}")
+            reply = {"ok": True, "result": result}
+        except Exception as e:
+            reply = {"ok": False, "error": getattr(e, "detail", None) or str(e)}
+        print(json.dumps(reply), flush=True)
+
+
+class Worker:
+    def __init__(self, data_dir: str):
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.multi_worker_consistency", "--serve", data_dir],
+            cwd=backend_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            env=dict(os.environ, OMNILEARN_ANSWER_CACHE="0"),
+        )
+
+    def call(self, op: str, **params):
+        self.process.stdin.write(json.dumps({"op": op, **params}) + "\n")
+        self.process.stdin.flush()
+        return json.loads(self.process.stdout.readline())
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=30)
+
+
+def run_checks(workers):
+    checks = []
+
+    def check(name: str, passed: bool, detail=None):
+        checks.append({"check": name, "passed": bool(passed), "detail": detail})
+
+    first, others = workers[0], workers[1:]
+    first.call("ingest", session="shared", pages=["Photosynthesis converts light into chemical energy."])
+    for i, worker in enumerate(others, start=1):
+        reply = worker.call("search", session="shared", query="photosynthesis light")
+        check(f"worker {i} sees upload from worker 0", reply["ok"] and "Photosynthesis" in reply["result"][0], reply)
+
+    reply = others[0].call("ingest", session="classmate", pages=["Photosynthesis converts light into chemical energy."])
+    check("same upload from another worker reuses the shared index", reply["ok"] and reply["result"]["shared"], reply)
+
+    # Worker 1 caches the session, then worker 0 replaces its documents
+    others[0].call("search", session="shared", query="photosynthesis")
+    first.call("ingest", session="shared", pages=["Mitochondria are the powerhouse of the cell."])
+    reply = others[0].call("search", session="shared", query="mitochondria cell")
+    check("worker 1 drops its cached copy after re-upload", reply["ok"] and "Mitochondria" in reply["result"][0], reply)
+
+    for i, worker in enumerate(workers):
+        worker.call("chat", session="shared", message=f"Question from worker {i}?")
+    expected = 2 * len(workers)
+    for i, worker in enumerate(workers):
+        reply = worker.call("history", session="shared")
+        check(f"worker {i} sees the whole chat history", reply.get("result") == expected, reply)
+
+    pages = [f"Chapter {n} covers thermodynamics and entropy." for n in range(40)]
+    submitted = first.call("submit", session="jobs", pages=pages, key="same-upload")["result"]
+    duplicate = others[0].call("submit", session="jobs", pages=pages, key="same-upload")["result"]
+    check("identical job on another worker is deduplicated", duplicate["follows"] == submitted["follows"], duplicate)
+    state = None
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        state = others[-1].call("job", job_id=submitted["job_id"])["result"]
+        if state and state["status"] in ("succeeded", "failed", "cancelled"):
+            break
+        # The owning worker only makes progress while it is waiting for commands
+        first.call("history", session="shared")
+        time.sleep(0.2)
+    check("job is pollable from another worker", state is not None and state["status"] == "succeeded", state)
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--serve", metavar="DATA_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args.serve))
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        workers = [Worker(data_dir) for _ in range(max(2, args.workers))]
+        try:
+            checks = run_checks(workers)
+        finally:
+            for worker in workers:
+                worker.close()
+
+    results = {"workers": len(workers), "passed": all(c["passed"] for c in checks), "checks": checks}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if results["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
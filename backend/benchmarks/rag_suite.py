@@ -0,0 +1,301 @@
+"""
+End-to-end RAG benchmark suite, fully offline.
+
+Measures, against the scraped_content/*.txt corpora and synthetic PDFs:
+  * ingest throughput (pages/s, chunks/s) for PDFs and text dumps
+  * retrieval latency per k
+  * end-to-end /chat latency under concurrency, through the FastAPI app
+  * peak RSS after each phase
+
+ChatGroq is replaced by the deterministic StubChatModel and MiniLM by the
+hashing embeddings, so runs are reproducible and need no API key or model
+download. Results are written as JSON together with the commit they were
+measured on; pass --baseline with an earlier results file to flag
+regressions beyond --tolerance (the exit code is non-zero if any are found).
+
+Run from the backend directory:
+    python -m benchmarks.rag_suite --output results.json
+    python -m benchmarks.rag_suite --baseline results.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import HashEmbeddings, StubChatModel, make_pdf, percentile, synthetic_pages
+
+QUERIES = [
+    "How is the agent loop implemented?",
+    "Which tools can the agent call?",
+    "How are configuration files loaded?",
+    "Explain gradient descent and the loss function",
+    "What does the attention layer compute?",
+    "How are documents split into chunks?",
+    "Where is the vector store created?",
+    "How does the browser tool work?",
+]
+
+# (metric path, True if higher is better) compared against --baseline
+TRACKED_METRICS = [
+    ("ingest.pdf.pages_per_sec", True),
+    ("ingest.pdf.chunks_per_sec", True),
+    ("ingest.corpus.chunks_per_sec", True),
+    ("retrieval.*.p50_ms", False),
+    ("retrieval.*.p99_ms", False),
+    ("chat.*.p50_ms", False),
+    ("chat.*.p99_ms", False),
+    ("chat.*.throughput_rps", True),
+    ("peak_rss_mb", False),
+]
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of this process's resident memory."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latency_stats(latencies):
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def bench_pdf_ingest(bot, args):
+    pdfs = [make_pdf(synthetic_pages(args.pdf_pages, seed=seed)) for seed in range(args.pdfs)]
+    pages = args.pdf_pages * args.pdfs
+    start = time.perf_counter()
+    result = await bot.process_pdf(pdfs, "bench-pdf", [f"lecture-{i}.pdf" for i in range(args.pdfs)])
+    elapsed = time.perf_counter() - start
+    return {
+        "files": args.pdfs,
+        "pages": pages,
+        "chunks": result["chunks"],
+        "seconds": elapsed,
+        "pages_per_sec": pages / elapsed,
+        "chunks_per_sec": result["chunks"] / elapsed,
+    }
+
+
+async def bench_corpus_ingest(bot, corpus_dir: str):
+    bot.scraped_content_dir = corpus_dir
+    files = sorted(os.path.basename(path) for path in glob.glob(os.path.join(corpus_dir, "*.txt")))
+    chunks = 0
+    total_bytes = 0
+    sessions = []
+
+    def progress(stage, done, total=None):
+        nonlocal chunks
+        if stage == "chunked":
+            chunks += done
+
+    start = time.perf_counter()
+    for i, filename in enumerate(files):
+        session_id = f"bench-corpus-{i}"
+        await bot.process_text_file(filename, session_id, progress=progress)
+        total_bytes += os.path.getsize(os.path.join(corpus_dir, filename))
+        sessions.append(session_id)
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(files),
+        "bytes": total_bytes,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "mb_per_sec": total_bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+        "chunks_per_sec": chunks / elapsed if elapsed else 0.0,
+    }, sessions
+
+
+async def bench_retrieval(stores_and_sessions, ks, repeats: int):
+    from rag.hybrid_retriever import HybridRetriever
+
+    results = {}
+    for k in ks:
+        latencies = []
+        for store, session_id in stores_and_sessions:
+            retriever = HybridRetriever(sources=store.sources(session_id), k=k)
+            for _ in range(repeats):
+                for query in QUERIES:
+                    start = time.perf_counter()
+                    await retriever.ainvoke(query)
+                    latencies.append(time.perf_counter() - start)
+        results[f"k={k}"] = latency_stats(latencies)
+    return results
+
+
+async def bench_chat(app, concurrency: int, requests: int):
+    import httpx
+
+    latencies = []
+    errors = 0
+
+    async def client_loop(client, client_id: int):
+        nonlocal errors
+        for i in range(requests):
+            payload = {
+                "session_id": "bench-pdf",
+                "message": f"{QUERIES[(client_id + i) % len(QUERIES)]} (client {client_id}, request {i})",
+                "groq_api_key": "offline",
+                "delta_history": True,
+            }
+            start = time.perf_counter()
+            response = await client.post("/chat", json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, c) for c in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        **latency_stats(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+    }
+
+
+async def run(args):
+    # main reads its configuration at import time, so import it only once the
+    # environment points at the scratch data directory
+    import main
+    from rag.chain_registry import ChainRegistry
+    from rag.github_rag import GitHubRAGBot
+    from rag.pdf_bot import PDFBot
+
+    embeddings = HashEmbeddings(cost_per_text=args.embed_cost)
+    llm = StubChatModel(latency=args.llm_latency)
+    main.pdf_bot = PDFBot(embeddings, chain_registry=ChainRegistry())
+    main.github_bot = GitHubRAGBot(embeddings, chain_registry=ChainRegistry())
+    main.get_llm = lambda groq_api_key, model_name=main.CHAT_MODEL: llm
+    main.get_rewrite_llm = lambda groq_api_key: None
+
+    results = {"ingest": {}, "peak_rss_mb_by_phase": {"start": peak_rss_mb()}}
+
+    results["ingest"]["pdf"] = await bench_pdf_ingest(main.pdf_bot, args)
+    results["peak_rss_mb_by_phase"]["pdf_ingest"] = peak_rss_mb()
+
+    results["ingest"]["corpus"], corpus_sessions = await bench_corpus_ingest(main.github_bot, args.corpus_dir)
+    results["peak_rss_mb_by_phase"]["corpus_ingest"] = peak_rss_mb()
+
+    sessions = [(main.pdf_bot.vector_stores, "bench-pdf")]
+    sessions += [(main.github_bot.vector_stores, session_id) for session_id in corpus_sessions]
+    ks = [int(k) for k in args.ks.split(",")]
+    results["retrieval"] = await bench_retrieval(sessions, ks, args.retrieval_repeats)
+    results["peak_rss_mb_by_phase"]["retrieval"] = peak_rss_mb()
+
+    results["chat"] = {}
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        results["chat"][f"c={concurrency}"] = await bench_chat(main.app, concurrency, args.requests)
+    results["peak_rss_mb_by_phase"]["chat"] = peak_rss_mb()
+    results["peak_rss_mb"] = peak_rss_mb()
+    results["llm_calls"] = llm.calls
+    return results
+
+
+def expand_metric(results, path: str):
+    """Yield (concrete path, value) for a dotted path where * matches any key."""
+    def walk(node, parts, prefix):
+        if not parts:
+            if isinstance(node, (int, float)):
+                yield ".".join(prefix), node
+            return
+        if not isinstance(node, dict):
+            return
+        keys = node.keys() if parts[0] == "*" else [parts[0]]
+        for key in keys:
+            if key in node:
+                yield from walk(node[key], parts[1:], prefix + [key])
+    yield from walk(results, path.split("."), [])
+
+
+def compare(results, baseline, tolerance: float):
+    """List the tracked metrics that got worse than baseline by more than tolerance."""
+    regressions = []
+    for path, higher_is_better in TRACKED_METRICS:
+        previous = dict(expand_metric(baseline, path))
+        for metric, value in expand_metric(results, path):
+            before = previous.get(metric)
+            if not before:
+                continue
+            change = (value - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({"metric": metric, "baseline": before, "current": value, "change": change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--corpus-dir", default=os.path.join(os.path.dirname(backend_dir), "scraped_content"))
+    parser.add_argument("--pdfs", type=int, default=4)
+    parser.add_argument("--pdf-pages", type=int, default=25)
+    parser.add_argument("--ks", default="1,4,8,16")
+    parser.add_argument("--retrieval-repeats", type=int, default=3)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=5, help="Chat requests per client")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--embed-cost", type=float, default=0.0,
+                        help="Simulated seconds of CPU per embedded text")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["OMNILEARN_DATA_DIR"] = data_dir
+        os.environ["OMNILEARN_WARM_UP"] = "0"
+        # Every question must reach the retriever and LLM, not the answer cache
+        os.environ["OMNILEARN_ANSWER_CACHE"] = "0"
+        from utils.concurrency import shutdown_pools
+
+        measured = asyncio.run(run(args))
+        shutdown_pools()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        **measured,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["baseline_commit"] = baseline.get("commit")
+        results["regressions"] = compare(results, baseline, args.tolerance)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Worker cold-start cost: time to import the app and to serve the first requests.
+
+Each measurement runs in a fresh interpreter so module and model caches are
+cold. "first_request" hits a lightweight endpoint; "first_embedding" is the
+first call that needs the model (after warm-up, if enabled). Uses the real
+MiniLM model when sentence-transformers is installed, otherwise falls back to
+the hashing stub (pass --stub to force it), which leaves only the import and
+startup cost of the app itself.
+
+Run from the backend directory:
+    python -m benchmarks.startup --runs 3
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROBE = r"""
+import json, sys, time
+if sys.argv[1:] == ["stub"]:
+    import utils.embeddings
+    from benchmarks.common import HashEmbeddings
+    stub = HashEmbeddings(cost_per_text=0.0005)
+    utils.embeddings.LazyEmbeddings.load = lambda self: stub
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    client.get("/api/github/sessions")
+    first_request = time.perf_counter()
+    main.embeddings.embed_query("first question")
+    first_embedding = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "startup_seconds": ready - imported,
+    "first_request_seconds": first_request - ready,
+    "first_embedding_seconds": first_embedding - first_request,
+    "total_seconds": first_embedding - start,
+}))
+"""
+
+
+def run_probe(warm_up: bool, stub: bool):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        # A fresh data dir and embedding cache keep runs independent of each other and of the app's data
+        env = dict(
+            os.environ,
+            OMNILEARN_WARM_UP="1" if warm_up else "0",
+            OMNILEARN_DATA_DIR=os.path.join(tmp, "data"),
+            OMNILEARN_EMBEDDING_CACHE=os.path.join(tmp, "embeddings.sqlite"),
+        )
+        command = [sys.executable, "-c", PROBE] + (["stub"] if stub else [])
+        result = subprocess.run(command, cwd=backend_dir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe exited with {result.returncode}:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--stub", action="store_true", help="Use the hashing stub instead of MiniLM")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    stub = args.stub or importlib.util.find_spec("sentence_transformers") is None
+    results = {"model": "hash-stub" if stub else "all-MiniLM-L6-v2"}
+    for warm_up in (False, True):
+        runs = [run_probe(warm_up, stub) for _ in range(args.runs)]
+        results["warm_up" if warm_up else "lazy"] = {
+            key: sum(run[key] for run in runs) / len(runs) for key in runs[0]
+        }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
-from langchain_groq import ChatGroq
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
+import asyncio
 import os
 import time
 
-from utils.embeddings import get_embeddings
+from utils.embeddings import get_embeddings, warm_up_embeddings
+from utils.concurrency import shutdown_pools
 from utils.logger import setup_logger
-from rag.pdf_bot import PDFBot
+from utils.tracing import TracingMiddleware, metrics
+from rag.pdf_bot import PDFBot, fingerprint_digests
+from rag.pdf_pipeline import preparse_pdf
 from rag.github_rag import GitHubRAGBot
+from rag.answer_cache import ANSWER_CACHE_ENABLED, SemanticAnswerCache
+from rag.context_compression import CONTEXT_COMPRESSION_ENABLED, ContextCompressor
+from rag.chain_registry import chain_registry
+from rag.jobs import JobManager, ProgressCallback, no_progress
+from rag.llm_gateway import LLMGateway
+from rag.pipeline import BATCH_MAX_QUESTIONS
+from rag.repo_ingest import check_repository_source, normalize_repository_url
+from rag.session_backend import get_session_backend
+from rag.session_store import DATA_DIR, SESSION_EVICTION_INTERVAL_SECONDS
+from rag.streaming import to_ndjson
+from rag.uploads import UploadSpool
 
 # Set up logger
 logger = setup_logger(__name__)
@@ -31,70 +46,237 @@ app.add_middleware(
 )
 logger.info("CORS middleware configured")
 
-# Initialize RAG bots
+# Per-request stage tracing; latency histograms are served on /metrics
+app.add_middleware(TracingMiddleware)
+
+# Initialize RAG bots; both share one lazily loaded embedding model
 try:
-    pdf_bot = PDFBot(get_embeddings())
-    github_bot = GitHubRAGBot(get_embeddings())
+    embeddings = get_embeddings()
+    # One answer cache for both bots; entries are scoped per bot and document set
+    answer_cache = SemanticAnswerCache(embeddings) if ANSWER_CACHE_ENABLED else None
+    # Retrieved chunks are cut down to the sentences relevant to the question before generation
+    compressor = ContextCompressor(embeddings) if CONTEXT_COMPRESSION_ENABLED else None
+    pdf_bot = PDFBot(embeddings, answer_cache=answer_cache, compressor=compressor)
+    github_bot = GitHubRAGBot(embeddings, answer_cache=answer_cache, compressor=compressor)
     logger.info("RAG bots initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize RAG bots: {str(e)}")
     raise
 
+# Background ingestion jobs for clients that poll instead of waiting on the request;
+# their state lives in the shared session backend so any worker can answer a poll
+jobs = JobManager(get_session_backend(DATA_DIR))
+
+# Uploads are spooled to disk instead of being held in memory; completed
+# files are pre-parsed while the rest of the batch is still uploading
+uploads = UploadSpool(get_session_backend(DATA_DIR), os.path.join(DATA_DIR, "uploads"), prepare=preparse_pdf)
+
+@app.on_event("startup")
+def start_embedding_warm_up():
+    # Load the model in the background so the worker accepts requests immediately
+    if os.environ.get("OMNILEARN_WARM_UP", "1") == "1":
+        warm_up_embeddings(background=True)
+        logger.info("Embedding model warm-up started")
+
+async def evict_idle_sessions():
+    """Drop idle sessions from memory on a timer, so they go even when no other session is accessed."""
+    while True:
+        await asyncio.sleep(SESSION_EVICTION_INTERVAL_SECONDS)
+        for bot in (pdf_bot, github_bot):
+            try:
+                bot.evict_idle()
+            except Exception as e:
+                logger.error(f"Evicting idle {bot.bot_type} sessions failed: {str(e)}", exc_info=True)
+
+@app.on_event("startup")
+async def start_session_eviction():
+    app.state.eviction_task = asyncio.create_task(evict_idle_sessions())
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    app.state.eviction_task.cancel()
+    shutdown_pools()
+    logger.info("Worker pools shut down")
+
+CHAT_MODEL = "llama-3.3-70b-versatile"
+
+# Every LLM call goes through one gateway: pooled clients and rate limits per API key,
+# retries on 429s and coalescing of identical in-flight prompts
+llm_gateway = LLMGateway()
+
+def get_llm(groq_api_key: str, model_name: str = CHAT_MODEL):
+    """Return the gateway's chat model for this API key and model."""
+    return llm_gateway.chat_model(groq_api_key, model_name)
+
+# Optional smaller model for condensing follow-up questions, e.g. llama-3.1-8b-instant
+REWRITE_MODEL = os.environ.get("OMNILEARN_REWRITE_MODEL")
+
+def get_rewrite_llm(groq_api_key: str):
+    """Return the question-rewrite client, or None to rewrite with the chat model."""
+    if not REWRITE_MODEL:
+        return None
+    return get_llm(groq_api_key, REWRITE_MODEL)
+
 class ChatInput(BaseModel):     # using the pydantic basemodel to make a bucker
     session_id: str
     message: str
     groq_api_key: str
+    delta_history: bool = False   # return only this turn's messages instead of the transcript
+
+class BatchChatInput(BaseModel):
+    session_id: str
+    questions: List[str]
+    groq_api_key: str
+    max_concurrency: Optional[int] = None   # simultaneous LLM calls, capped by the server
 
 class ChatResponse(BaseModel):
     answer: str
     chat_history: List[Dict[str, str]]
 
+class UploadInput(BaseModel):
+    session_id: str
+    filename: str
+    size: Optional[int] = None       # bytes; lets the server reject oversized files up front
+    sha256: Optional[str] = None     # hex digest of the whole file, verified on completion
+
+class UploadIngestInput(BaseModel):
+    session_id: str
+    upload_ids: List[str]
+    append: bool = False
+    background: bool = False
+
 class GitHubInput(BaseModel):
     url: str
     session_id: str
+    incremental: bool = True
+    background: bool = False   # return a job ID immediately and ingest in the background
+
+async def ingest_uploads(records: List[dict], session_id: str, append: bool = False,
+                         progress: ProgressCallback = no_progress):
+    """Index completed uploads for a session, discarding their spool files however it ends."""
+    try:
+        return await pdf_bot.process_pdf(
+            [uploads.path(record["upload_id"]) for record in records],
+            session_id,
+            [record["filename"] for record in records],
+            progress=progress,
+            append=append,
+            fingerprint=fingerprint_digests([record["sha256"] for record in records])
+        )
+    finally:
+        for record in records:
+            uploads.discard(record["upload_id"])
+
+def attach_to_result(bot, session_id: str):
+    """Join callback pointing a session at the index built by the job its request was merged into."""
+    async def join(result):
+        await bot.attach_session(session_id, result["fingerprint"])
+    return join
+
+def discard_uploads(records: List[dict]):
+    """Release callback dropping the spooled uploads of a request merged into another job."""
+    def release():
+        for record in records:
+            uploads.discard(record["upload_id"])
+    return release
+
+async def submit_or_ingest(records: List[dict], session_id: str, append: bool, background: bool):
+    """Ingest completed uploads now, or as a background job returning 202 with the job."""
+    if background:
+        fingerprint = fingerprint_digests([record["sha256"] for record in records])
+        # Identical uploads from different sessions share one job; an append only extends its own session
+        dedup_key = ("pdf", fingerprint, append, session_id) if append else ("pdf", fingerprint, append)
+        job = jobs.submit(
+            "pdf",
+            lambda job: ingest_uploads(records, session_id, append, progress=job.report),
+            dedup_key=dedup_key,
+            join=None if append else attach_to_result(pdf_bot, session_id),
+            release=discard_uploads(records)
+        )
+        return JSONResponse(status_code=202, content=job)
+    return await ingest_uploads(records, session_id, append)
 
 @app.post("/upload")
 async def upload_files(
     files: List[UploadFile] = File(...),
-    session_id: str = Form(...)
+    session_id: str = Form(...),
+    background: bool = Form(False),
+    append: bool = Form(False)
 ):
     logger.info(f"File upload request received for session: {session_id}")
+    records = []
     try:
         if not files:
             logger.warning("No files provided in upload request")
             raise HTTPException(status_code=400, detail="No files provided")
 
-        file_contents = []
         for uploaded_file in files:
             logger.debug(f"Processing file: {uploaded_file.filename}")
             if not uploaded_file.filename.lower().endswith('.pdf'):
                 logger.warning(f"Invalid file type attempted: {uploaded_file.filename}")
                 raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-            content = await uploaded_file.read()
-            file_contents.append(content)
+            # Copied to the spool in blocks, never read into memory as a whole
+            records.append(await uploads.spool(session_id, uploaded_file.filename, uploaded_file.file))
+        records = await uploads.resolve(session_id, [record["upload_id"] for record in records])
 
-        result = await pdf_bot.process_pdf(file_contents, session_id)
+        result = await submit_or_ingest(records, session_id, append, background)
         logger.info(f"Successfully processed {len(files)} files for session {session_id}")
         return result
         
     except Exception as e:
+        if not background:
+            for record in records:
+                uploads.discard(record["upload_id"])
         logger.error(f"Error in upload_files: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/uploads", status_code=201)
+async def create_upload(upload_input: UploadInput):
+    """Start a resumable upload; send the file with PUT /api/uploads/{upload_id}?offset=N."""
+    return uploads.create(upload_input.session_id, upload_input.filename, upload_input.size, upload_input.sha256)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    return uploads.status(upload_id)
+
+@app.put("/api/uploads/{upload_id}")
+async def write_upload_chunk(upload_id: str, offset: int, request: Request):
+    # The body is streamed to the spool file as it arrives
+    return await uploads.write(
+        upload_id, offset, request.stream(), chunk_sha256=request.headers.get("x-chunk-sha256")
+    )
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    return await uploads.complete(upload_id)
+
+@app.delete("/api/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    uploads.status(upload_id)
+    uploads.discard(upload_id)
+    return {"message": f"Upload {upload_id} deleted"}
+
+@app.post("/api/uploads/ingest")
+async def ingest_completed_uploads(ingest_input: UploadIngestInput):
+    logger.info(f"Ingesting {len(ingest_input.upload_ids)} uploads for session: {ingest_input.session_id}")
+    if not ingest_input.upload_ids:
+        raise HTTPException(status_code=400, detail="No uploads given")
+    records = await uploads.resolve(ingest_input.session_id, ingest_input.upload_ids)
+    return await submit_or_ingest(records, ingest_input.session_id, ingest_input.append, ingest_input.background)
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(chat_input: ChatInput):
     logger.info(f"Chat request received for session: {chat_input.session_id}")
     try:
-        llm = ChatGroq(
-            groq_api_key=chat_input.groq_api_key, 
-            model_name="llama-3.3-70b-versatile"
-        )
+        llm = get_llm(chat_input.groq_api_key)
         logger.debug("LLM initialized successfully")
         
         answer, history = await pdf_bot.get_response(
             chat_input.session_id,
             chat_input.message,
-            llm
+            llm,
+            get_rewrite_llm(chat_input.groq_api_key),
+            delta_history=chat_input.delta_history
         )
         logger.debug(f"Response generated for session {chat_input.session_id}")
         
@@ -106,6 +288,51 @@ async def chat(chat_input: ChatInput):
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(chat_input: ChatInput):
+    logger.info(f"Streaming chat request received for session: {chat_input.session_id}")
+    try:
+        llm = get_llm(chat_input.groq_api_key)
+        events = pdf_bot.stream_response(
+            chat_input.session_id,
+            chat_input.message,
+            llm,
+            get_rewrite_llm(chat_input.groq_api_key)
+        )
+        return StreamingResponse(to_ndjson(events), media_type="application/x-ndjson")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def validate_batch(batch_input: BatchChatInput):
+    questions = [question.strip() for question in batch_input.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="Questions must be a non-empty list of non-empty strings")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    return questions
+
+@app.post("/chat/batch")
+async def chat_batch(batch_input: BatchChatInput):
+    """Answer many questions for a session as NDJSON events, without touching its chat history."""
+    logger.info(f"Batch chat request received for session: {batch_input.session_id}")
+    questions = validate_batch(batch_input)
+    try:
+        events = pdf_bot.stream_batch_response(
+            batch_input.session_id,
+            questions,
+            get_llm(batch_input.groq_api_key),
+            batch_input.max_concurrency
+        )
+        return StreamingResponse(to_ndjson(events), media_type="application/x-ndjson")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch chat endpoint: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/github/process")
 async def process_github(github_input: GitHubInput):
     logger.info(f"GitHub processing request received - URL: {github_input.url}, Session: {github_input.session_id}")
@@ -118,6 +345,22 @@ async def process_github(github_input: GitHubInput):
         if not github_input.session_id:
             logger.warning("Empty session ID provided")
             raise HTTPException(status_code=400, detail="Session ID cannot be empty")
+        # Only git remotes, or local paths under the configured root; raises ValueError otherwise
+        check_repository_source(github_input.url)
+
+        if github_input.background:
+            job = jobs.submit(
+                "github",
+                lambda job: github_bot.process_repository(
+                    url=github_input.url,
+                    session_id=github_input.session_id,
+                    incremental=github_input.incremental,
+                    progress=job.report
+                ),
+                dedup_key=("github", normalize_repository_url(github_input.url), github_input.incremental),
+                join=attach_to_result(github_bot, github_input.session_id)
+            )
+            return JSONResponse(status_code=202, content=job)
 
         # Log processing attempt
         logger.info(f"Starting repository processing - URL: {github_input.url}")
@@ -125,7 +368,8 @@ async def process_github(github_input: GitHubInput):
         
         result = await github_bot.process_repository(
             url=github_input.url,
-            session_id=github_input.session_id
+            session_id=github_input.session_id,
+            incremental=github_input.incremental
         )
         
         processing_time = time.time() - start_time
@@ -149,16 +393,15 @@ async def process_github(github_input: GitHubInput):
 async def github_chat(chat_input: ChatInput):
     logger.info(f"GitHub chat request received for session: {chat_input.session_id}")
     try:
-        llm = ChatGroq(
-            groq_api_key=chat_input.groq_api_key,
-            model_name="llama-3.3-70b-versatile"
-        )
+        llm = get_llm(chat_input.groq_api_key)
         logger.debug("LLM initialized for GitHub chat")
         
         answer, history = await github_bot.get_response(
             chat_input.session_id,
             chat_input.message,
-            llm
+            llm,
+            get_rewrite_llm(chat_input.groq_api_key),
+            delta_history=chat_input.delta_history
         )
         logger.debug(f"GitHub chat response generated for session {chat_input.session_id}")
         
@@ -171,6 +414,45 @@ async def github_chat(chat_input: ChatInput):
         logger.error(error_message, exc_info=True)
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.post("/api/github/chat/stream")
+async def github_chat_stream(chat_input: ChatInput):
+    logger.info(f"Streaming GitHub chat request received for session: {chat_input.session_id}")
+    try:
+        llm = get_llm(chat_input.groq_api_key)
+        events = github_bot.stream_response(
+            chat_input.session_id,
+            chat_input.message,
+            llm,
+            get_rewrite_llm(chat_input.groq_api_key)
+        )
+        return StreamingResponse(to_ndjson(events), media_type="application/x-ndjson")
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_message = f"Error with GitHub chat stream: {str(e)}"
+        logger.error(error_message, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_message)
+
+@app.post("/api/github/chat/batch")
+async def github_chat_batch(batch_input: BatchChatInput):
+    """Answer many questions about a repository as NDJSON events, without touching its chat history."""
+    logger.info(f"Batch GitHub chat request received for session: {batch_input.session_id}")
+    questions = validate_batch(batch_input)
+    try:
+        events = github_bot.stream_batch_response(
+            batch_input.session_id,
+            questions,
+            get_llm(batch_input.groq_api_key),
+            batch_input.max_concurrency
+        )
+        return StreamingResponse(to_ndjson(events), media_type="application/x-ndjson")
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_message = f"Error with GitHub batch chat: {str(e)}"
+        logger.error(error_message, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_message)
+
 @app.get("/api/github/sessions")
 async def get_github_sessions():
     logger.info("Request received for GitHub sessions")
@@ -182,7 +464,57 @@ async def get_github_sessions():
         logger.error(f"Error retrieving GitHub sessions: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": jobs.list()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    logger.info(f"Cancellation request received for job: {job_id}")
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/api/chains/stats")
+async def get_chain_stats():
+    logger.info("Request received for chain registry stats")
+    return chain_registry.stats()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    logger.info("Request received for cache stats")
+    return {
+        "answers": answer_cache.stats() if answer_cache else None,
+        "context_compression": compressor.stats() if compressor else None,
+        "embeddings": embeddings.stats(),
+    }
+
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    # Per API-key hash: concurrency cap, in-flight and queued calls, retries, 429s and rate limit headroom
+    logger.info("Request received for LLM gateway stats")
+    return llm_gateway.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    # Per worker process: with several workers each scrape reaches one of them
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
-    logger.info("Starting FastAPI server")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Session state is shared through the data directory and session backend,
+    # so several workers can serve the same sessions
+    workers = int(os.environ.get("OMNILEARN_WORKERS", 1))
+    logger.info(f"Starting FastAPI server with {workers} worker(s)")
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
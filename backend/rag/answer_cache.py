@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+ANSWER_CACHE_ENABLED = os.environ.get("OMNILEARN_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("OMNILEARN_ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("OMNILEARN_ANSWER_CACHE_TTL_SECONDS", 24 * 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("OMNILEARN_ANSWER_CACHE_MAX_ENTRIES", 10000))
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector)) or 1.0
+    return vector / norm
+
+
+class _Scope:
+    """
+    Normalized question vectors and answers of one scope, oldest first.
+
+    Rows live in [start, end) of a preallocated matrix. Entries are only
+    appended at the end and dropped from the start (the cache evicts in
+    insertion order), and a full matrix is copied into a new one rather than
+    reused, so a view of the live rows stays valid after the lock is released.
+    """
+
+    def __init__(self, dim: int):
+        self.matrix = np.empty((16, dim), dtype=np.float32)
+        self.answers: List[Optional[str]] = []
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def append(self, vector: np.ndarray, answer: str):
+        if self.end == len(self.matrix):
+            live = self.matrix[self.start:self.end]
+            self.matrix = np.empty((max(16, 2 * len(live)), self.matrix.shape[1]), dtype=np.float32)
+            self.matrix[:len(live)] = live
+            self.answers = self.answers[self.start:self.end]
+            self.start, self.end = 0, len(live)
+        self.matrix[self.end] = vector
+        self.answers.append(answer)
+        self.end += 1
+
+    def drop_oldest(self):
+        self.answers[self.start] = None
+        self.start += 1
+
+    def snapshot(self):
+        return self.matrix[self.start:self.end], self.answers, self.start
+
+
+class SemanticAnswerCache:
+    """
+    Reuses answers to questions that are semantically the same.
+
+    Entries live in scopes, normally a bot type plus the fingerprint of the
+    session's document set, so sessions with different uploads never share
+    answers. A lookup embeds the standalone question and returns the stored
+    answer of the most similar question in the scope when the cosine
+    similarity reaches the threshold; the scores are one matrix product over a
+    snapshot of the scope, computed outside the lock. Entries expire after
+    ttl_seconds, and the oldest ones are dropped beyond max_entries.
+    """
+
+    def __init__(self, embeddings, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (scope, created)
+        self._scopes: Dict[str, _Scope] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, scope: str, question: str) -> Optional[str]:
+        """Return a cached answer for a close-enough question, embedding it once."""
+        vector = _normalize(self.embeddings.embed_query(question))
+        with self._lock:
+            self._expire(time.time())
+            entries = self._scopes.get(scope)
+            snapshot = entries.snapshot() if entries is not None else None
+
+        best_answer, best_score = None, self.threshold
+        if snapshot is not None:
+            matrix, answers, start = snapshot
+            scores = matrix @ vector
+            # Ties go to the newest entry, as the answer most likely produced from the current context
+            best = len(scores) - 1 - int(np.argmax(scores[::-1]))
+            if scores[best] >= best_score:
+                best_answer, best_score = answers[start + best], float(scores[best])
+
+        with self._lock:
+            if best_answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if best_answer is not None:
+            logger.info(f"Answer cache hit (similarity {best_score:.3f}) in scope {scope}")
+        return best_answer
+
+    def store(self, scope: str, question: str, answer: str):
+        vector = _normalize(self.embeddings.embed_query(question))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, time.time())
+            if scope not in self._scopes:
+                self._scopes[scope] = _Scope(len(vector))
+            self._scopes[scope].append(vector, answer)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _expire(self, now: float):
+        while self._entries:
+            entry_id = next(iter(self._entries))
+            if now - self._entries[entry_id][1] <= self.ttl_seconds:
+                break
+            self._drop(entry_id)
+
+    def _drop(self, entry_id: int):
+        # Entries are dropped in insertion order, so this is always the oldest of its scope
+        scope = self._entries.pop(entry_id)[0]
+        entries = self._scopes[scope]
+        entries.drop_oldest()
+        if not entries:
+            del self._scopes[scope]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
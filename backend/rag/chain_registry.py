@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+DEFAULT_TTL_SECONDS = 30 * 60
+DEFAULT_MAX_ENTRIES = 2000
+
+
+def hash_api_key(api_key: str) -> str:
+    """Short, non-reversible fingerprint of an API key for use in cache keys."""
+    return hashlib.sha256((api_key or "").encode('utf-8')).hexdigest()[:16]
+
+
+def llm_cache_key(llm) -> Tuple[str, str]:
+    """Return (model name, API-key hash) identifying a chat model client."""
+    model_name = getattr(llm, "model_name", None) or type(llm).__name__
+    api_key = getattr(llm, "groq_api_key", None)
+    if api_key is not None and hasattr(api_key, "get_secret_value"):
+        api_key = api_key.get_secret_value()
+    return model_name, hash_api_key(api_key or "")
+
+
+class ChainRegistry:
+    """
+    TTL/LRU cache for objects that are expensive to rebuild per request.
+
+    Used for per-session RAG chains, keyed by (session, bot type, model,
+    API-key hash, rewrite model, session version, kind). Entries idle for longer than
+    ttl_seconds are dropped, as are the least recently used ones once
+    max_entries is exceeded.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+
+        value = factory()
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, session_id: str, bot_type: str = None):
+        """Drop every entry built for a session, e.g. after its documents change."""
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if isinstance(key, tuple) and len(key) > 1 and key[0] == session_id
+                and (bot_type is None or key[1] == bot_type)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if stale:
+            logger.debug(f"Invalidated {len(stale)} cached chains for session: {session_id}")
+
+    def _evict_expired(self, now: float):
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Process-wide registry shared by both bots and the LLM client factory
+chain_registry = ChainRegistry()
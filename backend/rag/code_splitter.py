@@ -0,0 +1,88 @@
+import os
+import re
+from typing import Dict, List
+from langchain.schema import Document
+from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+
+CODE_CHUNK_SIZE = 1500
+CODE_CHUNK_OVERLAP = 150
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": Language.PYTHON, ".js": Language.JS, ".jsx": Language.JS, ".ts": Language.TS,
+    ".tsx": Language.TS, ".java": Language.JAVA, ".kt": Language.KOTLIN, ".go": Language.GO,
+    ".rs": Language.RUST, ".rb": Language.RUBY, ".php": Language.PHP, ".c": Language.C,
+    ".h": Language.C, ".cpp": Language.CPP, ".hpp": Language.CPP, ".cc": Language.CPP,
+    ".cs": Language.CSHARP, ".swift": Language.SWIFT, ".scala": Language.SCALA,
+    ".md": Language.MARKDOWN, ".rst": Language.RST, ".html": Language.HTML, ".sol": Language.SOL,
+}
+
+# gitingest separates files with a "FILE: <path>" line framed by rows of '='
+_GITINGEST_FILE_HEADER = re.compile(r"^={16,}\nFILE: (?P<path>.+?)\n={16,}\n", re.MULTILINE)
+# scrape_textarea_content wraps each textarea in a banner and a closing rule
+_TEXTAREA_BANNER = re.compile(r"^Content from textarea \d+:\n={50}\n", re.MULTILINE)
+_TEXTAREA_FOOTER = re.compile(r"\n={50}\n*\Z")
+
+_splitters: Dict[object, RecursiveCharacterTextSplitter] = {}
+
+
+def _get_splitter(language) -> RecursiveCharacterTextSplitter:
+    if language not in _splitters:
+        if language is None:
+            _splitters[language] = RecursiveCharacterTextSplitter(
+                chunk_size=CODE_CHUNK_SIZE, chunk_overlap=CODE_CHUNK_OVERLAP, add_start_index=True
+            )
+        else:
+            _splitters[language] = RecursiveCharacterTextSplitter.from_language(
+                language, chunk_size=CODE_CHUNK_SIZE, chunk_overlap=CODE_CHUNK_OVERLAP, add_start_index=True
+            )
+    return _splitters[language]
+
+
+def detect_language(path: str):
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+
+
+def split_gitingest_dump(text: str, source: str = None) -> List[Document]:
+    """Break a gitingest dump into one Document per file, using its FILE headers."""
+    text = _TEXTAREA_BANNER.sub("", text)
+    headers = list(_GITINGEST_FILE_HEADER.finditer(text))
+    if not headers:
+        return [Document(page_content=text, metadata={"source": source or "repository"})]
+
+    documents = []
+    summary = _TEXTAREA_FOOTER.sub("", text[:headers[0].start()].rstrip()).strip()
+    if summary:
+        documents.append(Document(page_content=summary, metadata={"source": "repository-summary"}))
+    for header, next_header in zip(headers, headers[1:] + [None]):
+        end = next_header.start() if next_header else len(text)
+        content = _TEXTAREA_FOOTER.sub("", text[header.end():end]).strip("\n")
+        if content.strip():
+            documents.append(Document(page_content=content, metadata={"source": header.group("path").strip()}))
+    return documents
+
+
+def split_code_documents(documents: List[Document]) -> List[Document]:
+    """
+    Chunk per-file documents along their language structure.
+
+    Each chunk keeps its file path and gains language, start_line and end_line
+    metadata; the path and line range are also prepended to the chunk text so
+    the model can cite where an answer came from.
+    """
+    chunks = []
+    for document in documents:
+        path = document.metadata.get("source", "")
+        language = detect_language(path)
+        text = document.page_content
+        for chunk in _get_splitter(language).split_documents([document]):
+            start_index = chunk.metadata.pop("start_index", 0)
+            start_line = text.count("\n", 0, max(start_index, 0)) + 1
+            end_line = start_line + chunk.page_content.count("\n")
+            chunk.metadata.update({
+                "language": language.value if language else "text",
+                "start_line": start_line,
+                "end_line": end_line,
+            })
+            chunk.page_content = f"File: {path} (lines {start_line}-{end_line})\n{chunk.page_content}"
+            chunks.append(chunk)
+    return chunks
@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from utils.embedding_cache import CachedEmbeddings
+from utils.logger import setup_logger
+from .history import estimate_tokens
+
+# Set up logger
+logger = setup_logger(__name__)
+
+CONTEXT_COMPRESSION_ENABLED = os.environ.get("OMNILEARN_CONTEXT_COMPRESSION", "1") == "1"
+# Estimated tokens of retrieved context allowed into the answer prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("OMNILEARN_CONTEXT_TOKEN_BUDGET", 2000))
+# Segments shorter than this are merged into their neighbour
+MIN_SEGMENT_CHARS = 40
+# Paragraphs longer than this are cut at line breaks (code, tables, lists)
+MAX_SEGMENT_CHARS = 400
+# Marks text left out between two kept segments of a chunk
+GAP_MARKER = "[...]"
+# Segment vectors kept in memory for chunks that are retrieved again
+SEGMENT_CACHE_SIZE = int(os.environ.get("OMNILEARN_COMPRESSION_CACHE_SEGMENTS", 4096))
+
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+(?=\S)|\n\s*\n")
+
+
+def split_segments(text: str) -> List[str]:
+    """
+    Cut a chunk into sentences, or groups of lines where there are no sentences.
+
+    Prose splits at sentence ends and blank lines. Longer pieces, such as
+    code or tables, are cut at line breaks into groups of at most
+    MAX_SEGMENT_CHARS. Very short pieces are merged into the previous one.
+    """
+    pieces = []
+    for piece in _SENTENCE_BREAK_RE.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if len(piece) <= MAX_SEGMENT_CHARS:
+            pieces.append(piece)
+            continue
+        group = []
+        for line in piece.splitlines():
+            if group and sum(len(part) + 1 for part in group) + len(line) > MAX_SEGMENT_CHARS:
+                pieces.append("\n".join(group))
+                group = []
+            group.append(line)
+        if group:
+            pieces.append("\n".join(group))
+
+    segments: List[str] = []
+    for piece in pieces:
+        if segments and (len(piece) < MIN_SEGMENT_CHARS or len(segments[-1]) < MIN_SEGMENT_CHARS):
+            segments[-1] = f"{segments[-1]}\n{piece}"
+        else:
+            segments.append(piece)
+    return segments
+
+
+class ContextCompressor:
+    """
+    Shrinks retrieved chunks to the parts relevant to the question.
+
+    Every chunk is cut into sentences (or line groups for code), which are
+    scored by cosine similarity to the question with the same embedding
+    model the index uses. Segment vectors are kept in a small in-memory LRU
+    rather than the disk cache of chunk embeddings, whose table they would
+    otherwise churn, so a chunk retrieved again soon costs no model calls.
+    The best segments are kept until token_budget estimated tokens are used,
+    then put back in their original order within their chunk, with
+    GAP_MARKER where text was dropped. Context already within the budget is
+    passed through untouched.
+    """
+
+    def __init__(self, embeddings, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 cache_size: int = SEGMENT_CACHE_SIZE):
+        if isinstance(embeddings, CachedEmbeddings):
+            embeddings = embeddings.embeddings
+        self.embeddings = embeddings
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.requests = 0
+        self.compressed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def _count(self, tokens_before: int, tokens_after: int):
+        with self._lock:
+            self.requests += 1
+            self.compressed += tokens_after < tokens_before
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+
+    def _embed_segments(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            vectors = {text: self._vectors.get(text) for text in texts}
+            for text, vector in vectors.items():
+                if vector is not None:
+                    self._vectors.move_to_end(text)
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            computed = np.asarray(self.embeddings.embed_documents(missing), dtype=np.float32)
+            with self._lock:
+                for text, vector in zip(missing, computed):
+                    vectors[text] = self._vectors[text] = vector
+                while len(self._vectors) > self.cache_size:
+                    self._vectors.popitem(last=False)
+        return np.stack([vectors[text] for text in texts])
+
+    def compress(self, question: str, documents: List[Document]) -> Tuple[List[Document], Dict[str, Any]]:
+        """Return the compressed documents and the token counts before and after."""
+        tokens_before = sum(estimate_tokens(doc.page_content) for doc in documents)
+        if tokens_before <= self.token_budget:
+            self._count(tokens_before, tokens_before)
+            return documents, {"tokens_before": tokens_before, "tokens_after": tokens_before, "tokens_saved": 0}
+
+        segments = [
+            (doc_index, position, text)
+            for doc_index, doc in enumerate(documents)
+            for position, text in enumerate(split_segments(doc.page_content))
+        ]
+        vectors = self._embed_segments([text for _, _, text in segments])
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = (vectors @ query) / np.where(norms == 0, 1.0, norms)
+
+        kept, used = [], 0
+        for index in np.argsort(-scores):
+            cost = estimate_tokens(segments[index][2])
+            # The best segment is kept even when it alone exceeds the budget
+            if kept and used + cost > self.token_budget:
+                continue
+            kept.append(segments[index])
+            used += cost
+
+        by_document: Dict[int, List[Tuple[int, str]]] = {}
+        for doc_index, position, text in sorted(kept):
+            by_document.setdefault(doc_index, []).append((position, text))
+        compressed = []
+        for doc_index, parts in by_document.items():
+            pieces, previous = [], -1
+            for position, text in parts:
+                if position != previous + 1:
+                    pieces.append(GAP_MARKER)
+                pieces.append(text)
+                previous = position
+            source = documents[doc_index]
+            compressed.append(Document(page_content="\n".join(pieces), metadata=source.metadata, id=source.id))
+
+        tokens_after = sum(estimate_tokens(doc.page_content) for doc in compressed)
+        self._count(tokens_before, tokens_after)
+        logger.info(
+            f"Compressed context from {tokens_before} to {tokens_after} tokens "
+            f"({len(kept)} of {len(segments)} segments from {len(compressed)} of {len(documents)} chunks)"
+        )
+        return compressed, {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "compressed": self.compressed,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+            "token_budget": self.token_budget,
+        }
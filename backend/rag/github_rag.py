@@ -1,39 +1,71 @@
 import os
 import shutil
+from contextlib import asynccontextmanager
 from typing import List, Tuple, Dict, Any
 from fastapi import HTTPException
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_chroma import Chroma
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader
 from langchain.schema import Document
-from .repo_scrape import scrape_textarea_content, convert_github_to_gitingest
+from .code_splitter import split_code_documents, split_gitingest_dump
+from .answer_cache import ANSWER_CACHE_ENABLED, SemanticAnswerCache
+from .context_compression import CONTEXT_COMPRESSION_ENABLED, ContextCompressor
+from .history import HistoryManager
+from .hybrid_retriever import HybridRetriever
+from .jobs import ProgressCallback, no_progress
+from .repo_ingest import checkout_repository, load_repository_documents
+from .chain_registry import ChainRegistry, chain_registry as default_chain_registry, llm_cache_key
+from .pipeline import RAGPipeline
+from .session_store import ChatHistoryStore, SessionStore, add_embedded, add_in_batches
+from .streaming import stream_batch_answers, stream_rag_chain
+from .repo_manifest import RepositoryManifest, fingerprint_file_hashes, hash_content, make_chunk_id
+from utils.concurrency import ingest_slot, run_blocking, run_ingest
 from utils.logger import setup_logger
+from utils.tracing import span
 import time
 # Set up logger
 logger = setup_logger(__name__)
 
+# Number of chunks embedded and added to the vector store at a time
+INGEST_BATCH_SIZE = 64
+
 class GitHubRAGBot:
-    def __init__(self, embeddings):
+    bot_type = "github"
+
+    def __init__(self, embeddings, chain_registry: ChainRegistry = None, data_dir: str = None,
+                 answer_cache: SemanticAnswerCache = None, compressor: ContextCompressor = None):
         logger.info("Initializing GitHubRAGBot")
         self.embeddings = embeddings
-        self.chat_stores = {}
-        self.vector_stores = {}
+        self.chain_registry = chain_registry or default_chain_registry
+        if answer_cache is None and ANSWER_CACHE_ENABLED:
+            answer_cache = SemanticAnswerCache(embeddings)
+        self.answer_cache = answer_cache
+        if compressor is None and CONTEXT_COMPRESSION_ENABLED:
+            compressor = ContextCompressor(embeddings)
+        self.compressor = compressor
+        self.chat_stores = ChatHistoryStore(self.bot_type, data_dir=data_dir)
+        self.history = HistoryManager(self.chat_stores)
+        self.vector_stores = SessionStore(
+            self.bot_type,
+            embeddings,
+            data_dir=data_dir,
+            on_evict=lambda session: self.chain_registry.invalidate(session, self.bot_type)
+        )
+        self.manifests = {}
+        self.vector_stores.shared.on_delete = self._drop_manifest
         self.base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
         self.scraped_content_dir = os.path.join(self.base_dir, "scraped_content")
+        self.repositories_dir = os.path.join(self.base_dir, "repositories")
+        self.manifests_dir = os.path.join(os.path.dirname(self.vector_stores.persist_dir), "manifests")
         
         try:
             os.makedirs(self.scraped_content_dir, exist_ok=True)
+            os.makedirs(self.repositories_dir, exist_ok=True)
             logger.debug(f"Scraped content directory ensured at: {self.scraped_content_dir}")
         except Exception as e:
             logger.error(f"Failed to create scraped content directory: {str(e)}", exc_info=True)
             raise
 
-    async def process_text_file(self, filename: str, session_id: str):
+    async def process_text_file(self, filename: str, session_id: str, progress: ProgressCallback = no_progress):
         logger.info(f"Processing text file: {filename} for session: {session_id}")
         try:
             file_path = os.path.join(self.scraped_content_dir, filename)
@@ -55,7 +87,7 @@ class GitHubRAGBot:
             loader = TextLoader(file_path, encoding='utf-8')
             
             try:
-                docs = loader.load()
+                docs = await run_ingest(loader.load)
                 documents.extend(docs)
                 logger.info(f"Loaded {len(documents)} documents")
             except Exception as load_error:
@@ -74,15 +106,34 @@ class GitHubRAGBot:
                     )
 
             logger.debug("Splitting text into chunks")
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=5000, chunk_overlap=500)
-            splits = text_splitter.split_documents(documents)
+            file_documents = [
+                file_doc
+                for doc in documents
+                for file_doc in split_gitingest_dump(doc.page_content, filename)
+            ]
+            logger.info(f"Found {len(file_documents)} files in the dump")
+            progress("parsed", len(file_documents), len(file_documents))
+            splits = split_code_documents(file_documents)
             logger.info(f"Created {len(splits)} text chunks")
+            progress("chunked", len(splits), len(splits))
             
             logger.debug("Creating vector store from documents")
-            self.vector_stores[session_id] = Chroma.from_documents(
-                documents=splits, 
-                embedding=self.embeddings
-            )
+            embedded = 0
+
+            def on_batch(size: int):
+                nonlocal embedded
+                embedded += size
+                progress("embedded", embedded, len(splits))
+
+            async def build(vector_store, sparse_index):
+                await run_ingest(add_in_batches, vector_store, splits, sparse_index=sparse_index, on_batch=on_batch)
+
+            # Identical dumps share one index; a text dump has no manifest to refresh incrementally
+            fingerprint = hash_content("".join(doc.page_content for doc in documents))
+            with span("ingest", bot=self.bot_type, documents=len(file_documents), chunks=len(splits)):
+                async with ingest_slot():
+                    await self.vector_stores.shared.ensure(fingerprint, build)
+                    await run_blocking(self.vector_stores.attach, session_id, fingerprint)
             logger.info(f"Vector store created for session: {session_id}")
             
             # Keep the file for future reference instead of deleting it
@@ -94,102 +145,302 @@ class GitHubRAGBot:
             logger.error(f"Error processing text file: {str(e)}", exc_info=True)
             raise HTTPException(status_code=400, detail=str(e))
 
-    async def process_repository(self, url: str, session_id: str, wait_time: int = 10):
+    async def process_repository(self, url: str, session_id: str, incremental: bool = True,
+                                 progress: ProgressCallback = no_progress):
+        """
+        Index a repository for a session.
+
+        Each snapshot of the repository contents is indexed once and shared by
+        every session that processes it. When a new snapshot has to be built
+        and incremental is True, the chunks of files unchanged since the
+        session's previous snapshot are copied over with their embeddings, so
+        only added or changed files are embedded. Stage counts (fetched,
+        parsed, chunked, embedded) go to progress.
+        """
         logger.info(f"Processing repository URL: {url} for session: {session_id}")
         try:
-            # Convert URL
-            gitingest_url = convert_github_to_gitingest(url)
-            logger.debug(f"Using GitIngest URL: {gitingest_url}")
-            
-            # Ensure scraped_content directory exists
-            os.makedirs(self.scraped_content_dir, exist_ok=True)
-            
-            # Call the scraper function with the correct directory path
-            textarea_texts, saved_file = scrape_textarea_content(
-                gitingest_url, 
-                wait_time=wait_time,
-                output_dir=self.scraped_content_dir  # Pass the directory path
-            )
-            
-            if not textarea_texts:
-                logger.warning("No content found in repository")
-                raise HTTPException(status_code=404, detail="No content found in repository")
-            
-            # Get just the filename without path
-            filename = os.path.basename(saved_file)
-            logger.debug(f"Processing file: {filename}")
-            
-            # Process the file
-            result = await self.process_text_file(filename, session_id)
-            result["repository"] = url
-            result["content_items"] = len(textarea_texts)
-            
-            logger.info(f"Repository processed successfully with {len(textarea_texts)} content items")
-            return result
-            
+            with span("ingest", bot=self.bot_type) as stage:
+                async with ingest_slot():
+                    progress("fetched", 0, 1)
+                    async with self._checkout(url) as repo_root:
+                        with span("fetch") as fetch:
+                            file_hashes, size = await run_ingest(self._hash_files, repo_root)
+                            fetch.set(documents=len(file_hashes), bytes=size)
+                        progress("fetched", 1, 1)
+                        result = await self._index_repository(
+                            url, session_id, repo_root, file_hashes, incremental, progress
+                        )
+                stage.set(documents=result["content_items"], chunks=result["chunks"], shared=result["shared"])
+                return result
+
+        except HTTPException:
+            raise
+        except ValueError as e:
+            logger.warning(f"Rejected repository source: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.error(f"Error processing repository: {str(e)}", exc_info=True)
-            # Include more debug information
-            logger.error(f"Attempted file path: {self.scraped_content_dir}")
+            logger.error(f"Attempted checkout directory: {self.repositories_dir}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def get_response(self, session_id: str, message: str, llm):
+    @asynccontextmanager
+    async def _checkout(self, url: str):
+        """
+        Fetch the repository and hold its checkout locked while it is indexed.
+
+        Files are streamed from the working tree twice, once to hash them and
+        once to build the index, so the lock keeps another ingest of the same
+        repository from updating the tree in between. Taking and releasing
+        the lock block, so they run on the ingest pool.
+        """
+        checkout = checkout_repository(url, self.repositories_dir)
+        repo_root = await run_ingest(checkout.__enter__)
+        logger.debug(f"Repository working tree: {repo_root}")
+        try:
+            yield repo_root
+        finally:
+            await run_ingest(checkout.__exit__, None, None, None)
+
+    @staticmethod
+    def _hash_files(repo_root: str) -> Tuple[Dict[str, str], int]:
+        """Content hash of every indexable file and their total size, reading one file at a time."""
+        file_hashes, size = {}, 0
+        for document in load_repository_documents(repo_root):
+            file_hashes[document.metadata["source"]] = hash_content(document.page_content)
+            size += len(document.page_content.encode('utf-8'))
+        return file_hashes, size
+
+    async def _index_repository(self, url: str, session_id: str, repo_root: str, file_hashes: Dict[str, str],
+                                incremental: bool, progress: ProgressCallback = no_progress):
+        """Point the session at the shared index of the repository's files, building it if needed."""
+        if not file_hashes:
+            logger.warning("No content found in repository")
+            raise HTTPException(status_code=404, detail="No content found in repository")
+        fingerprint = fingerprint_file_hashes(file_hashes)
+        progress("parsed", len(file_hashes), len(file_hashes))
+
+        previous, previous_store = None, None
+        previous_fingerprint = self.vector_stores.base(session_id)
+        if incremental and previous_fingerprint and self.vector_stores.shared.is_ready(previous_fingerprint):
+            previous = self._get_manifest(previous_fingerprint)
+            if previous is not None:
+                logger.info(f"Incrementally re-indexing session: {session_id}")
+                previous_store = self.vector_stores.shared[previous_fingerprint]
+        chunks = {"embedded": 0}
+
+        async def build(vector_store, sparse_index):
+            manifest = RepositoryManifest(url)
+            chunks["embedded"] = await run_ingest(
+                self._build_snapshot, vector_store, sparse_index, manifest, load_repository_documents(repo_root),
+                previous, previous_store, progress
+            )
+            manifest.save(self._manifest_path(fingerprint))
+            self.manifests[fingerprint] = manifest
+
+        with span("index") as stage:
+            built = await self.vector_stores.shared.ensure(fingerprint, build)
+            await run_blocking(self.vector_stores.attach, session_id, fingerprint)
+            stage.set(chunks=chunks["embedded"], shared=not built)
+
+        stats = self._diff_stats(previous, file_hashes)
+        logger.info(
+            f"Repository processed successfully: {stats['added']} added, {stats['changed']} changed, "
+            f"{stats['removed']} removed, {stats['unchanged']} unchanged files, {chunks['embedded']} new chunks"
+            + ("" if built else " (shared index reused)")
+        )
+        return {
+            "message": f"Repository {url} processed successfully",
+            "repository": url,
+            "content_items": len(file_hashes),
+            "shared": not built,
+            "chunks": chunks["embedded"],
+            "fingerprint": fingerprint,
+            **stats,
+        }
+
+    @staticmethod
+    def _diff_stats(previous: RepositoryManifest, file_hashes: Dict[str, str]) -> Dict[str, int]:
+        """File-level changes between the session's previous snapshot and the new one."""
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        for rel_path, content_hash in file_hashes.items():
+            previous_hash = previous.file_hash(rel_path) if previous else None
+            if previous_hash is None:
+                stats["added"] += 1
+            else:
+                stats["unchanged" if previous_hash == content_hash else "changed"] += 1
+        if previous:
+            stats["removed"] = sum(1 for rel_path in previous.files if rel_path not in file_hashes)
+        return stats
+
+    def _build_snapshot(self, vector_store, sparse_index, manifest: RepositoryManifest, documents,
+                        previous: RepositoryManifest = None, previous_store=None,
+                        progress: ProgressCallback = no_progress) -> int:
+        """
+        Fill a new shared index with the given files, recording them in the manifest.
+
+        Chunks of files whose hash matches the previous snapshot are copied
+        with their stored embeddings instead of being split and embedded
+        again. Returns the number of newly embedded chunks.
+        """
+        batch, batch_ids, copy_ids = [], [], []
+        chunked = 0
+        embedded = 0
+
+        for document in documents:
+            rel_path = document.metadata["source"]
+            content_hash = hash_content(document.page_content)
+            if previous is not None and previous.file_hash(rel_path) == content_hash:
+                chunk_ids = previous.chunk_ids(rel_path)
+                manifest.set_file(rel_path, content_hash, chunk_ids)
+                copy_ids.extend(chunk_ids)
+                if len(copy_ids) >= INGEST_BATCH_SIZE:
+                    self._copy_chunks(previous_store, vector_store, sparse_index, copy_ids)
+                    copy_ids = []
+                continue
+
+            splits = split_code_documents([document])
+            chunk_ids = [make_chunk_id(rel_path, content_hash, i) for i in range(len(splits))]
+            manifest.set_file(rel_path, content_hash, chunk_ids)
+            batch.extend(splits)
+            batch_ids.extend(chunk_ids)
+            chunked += len(splits)
+            progress("chunked", chunked)
+            if len(batch) >= INGEST_BATCH_SIZE:
+                add_in_batches(vector_store, batch, ids=batch_ids, sparse_index=sparse_index)
+                embedded += len(batch)
+                progress("embedded", embedded, chunked)
+                batch, batch_ids = [], []
+
+        progress("chunked", chunked, chunked)
+        if batch:
+            add_in_batches(vector_store, batch, ids=batch_ids, sparse_index=sparse_index)
+            embedded += len(batch)
+            progress("embedded", embedded, chunked)
+        if copy_ids:
+            self._copy_chunks(previous_store, vector_store, sparse_index, copy_ids)
+        return embedded
+
+    @staticmethod
+    def _copy_chunks(source, target, sparse_index, ids: List[str]):
+        """Copy stored chunks, embeddings included, from one index to another."""
+        page = source.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        if not page["ids"]:
+            return
+        add_embedded(target, page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+        sparse_index.add(page["ids"], page["documents"])
+
+    def _get_manifest(self, fingerprint: str):
+        """Manifest of a shared repository index; indexes are read-only, so it is cached."""
+        if fingerprint not in self.manifests:
+            self.manifests[fingerprint] = RepositoryManifest.load(self._manifest_path(fingerprint))
+        return self.manifests[fingerprint]
+
+    def _manifest_path(self, fingerprint: str) -> str:
+        return os.path.join(self.manifests_dir, f"{self.vector_stores.shared.collection_name(fingerprint)}.json")
+
+    def _drop_manifest(self, fingerprint: str):
+        self.manifests.pop(fingerprint, None)
+        if os.path.exists(self._manifest_path(fingerprint)):
+            os.remove(self._manifest_path(fingerprint))
+
+    async def get_response(self, session_id: str, message: str, llm, rewrite_llm=None,
+                           delta_history: bool = False):
         logger.info(f"Generating response for session {session_id}")
         try:
             if session_id not in self.vector_stores:
                 logger.error(f"No vector store found for session: {session_id}")
                 raise HTTPException(status_code=400, detail="No documents uploaded")
             
-            logger.debug("Setting up retriever and prompts")
-            retriever = self.vector_stores[session_id].as_retriever()
-            
-            contextualize_q_prompt = ChatPromptTemplate.from_messages([
-                ("system", self._get_contextualize_prompt()),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ])
-            
-            logger.debug("Creating history aware retriever")
-            history_aware_retriever = create_history_aware_retriever(
-                llm, retriever, contextualize_q_prompt
-            )
-
-            logger.debug("Setting up QA chain")
-            qa_prompt = ChatPromptTemplate.from_messages([
-                ("system", self._get_qa_prompt()),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ])
-            
-            question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-            rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-            
-            if session_id not in self.chat_stores:
-                logger.debug(f"Creating new chat history for session: {session_id}")
-                self.chat_stores[session_id] = ChatMessageHistory()
-            
-            logger.debug("Setting up conversational RAG chain")
-            conversational_rag_chain = RunnableWithMessageHistory(
-                rag_chain,
-                lambda session: self.chat_stores[session],
-                input_messages_key="input",
-                history_messages_key="chat_history",
-                output_messages_key="answer"
-            )
+            with span("history_load") as stage:
+                chat_history = self.chat_stores.create(session_id)
+                messages = chat_history.messages
+                prompt_history = self.history.window(session_id, messages)
+                stage.set(messages=len(messages), window=len(prompt_history))
+            rag_chain = self._get_rag_chain(session_id, llm, rewrite_llm)
             
             logger.info("Generating response")
-            response = conversational_rag_chain.invoke(
-                {"input": message},
-                config={"configurable": {"session_id": session_id}},
-            )
+            response = await rag_chain.ainvoke({"input": message, "chat_history": prompt_history})
+            with span("history_save"):
+                chat_history.add_user_message(message)
+                chat_history.add_ai_message(response['answer'])
+            self.history.schedule_summary(session_id, chat_history, rewrite_llm or llm)
             
             logger.debug("Response generated successfully")
-            return response['answer'], self._format_history(session_id)
+            return response['answer'], self._format_history(session_id, start=len(messages) if delta_history else 0)
         
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
+    def stream_response(self, session_id: str, message: str, llm, rewrite_llm=None):
+        """Validate the session and return an async iterator of answer events."""
+        logger.info(f"Streaming response for session {session_id}")
+        if session_id not in self.vector_stores:
+            logger.error(f"No vector store found for session: {session_id}")
+            raise HTTPException(status_code=400, detail="No documents uploaded")
+        if session_id not in self.chat_stores:
+            logger.debug(f"Creating new chat history for session: {session_id}")
+            self.chat_stores.create(session_id)
+        rag_chain = self._get_rag_chain(session_id, llm, rewrite_llm)
+        chat_history = self.chat_stores[session_id]
+        return stream_rag_chain(
+            rag_chain,
+            chat_history,
+            message,
+            prompt_history=self.history.window(session_id, chat_history.messages),
+            on_complete=lambda: self.history.schedule_summary(session_id, chat_history, rewrite_llm or llm)
+        )
+
+    def stream_batch_response(self, session_id: str, questions: List[str], llm, max_concurrency: int = None):
+        """Validate the session and return an async iterator of batch answer events; history is untouched."""
+        logger.info(f"Batch of {len(questions)} questions for session {session_id}")
+        if session_id not in self.vector_stores:
+            logger.error(f"No vector store found for session: {session_id}")
+            raise HTTPException(status_code=400, detail="No documents uploaded")
+        rag_chain = self._get_rag_chain(session_id, llm)
+        return stream_batch_answers(rag_chain, questions, max_concurrency)
+
+    def _get_rag_chain(self, session_id: str, llm, rewrite_llm=None):
+        rewrite_key = llm_cache_key(rewrite_llm) if rewrite_llm is not None else None
+        # The version changes whenever any worker re-indexes the session
+        version = self.vector_stores.version(session_id)
+        key = (session_id, self.bot_type, *llm_cache_key(llm), rewrite_key, version, "rag")
+        return self.chain_registry.get_or_create(
+            key, lambda: self._build_rag_chain(session_id, llm, rewrite_llm)
+        )
+
+    def _build_rag_chain(self, session_id: str, llm, rewrite_llm=None):
+        logger.debug("Setting up hybrid retriever and prompts")
+        retriever = HybridRetriever(sources=self.vector_stores.sources(session_id))
+        
+        contextualize_q_prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_contextualize_prompt()),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ])
+
+        logger.debug("Setting up QA chain")
+        qa_prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_qa_prompt()),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ])
+        
+        return RAGPipeline(
+            llm,
+            retriever,
+            contextualize_q_prompt,
+            qa_prompt,
+            answer_cache=self.answer_cache,
+            cache_scope=lambda: self._cache_scope(session_id),
+            rewrite_llm=rewrite_llm,
+            compressor=self.compressor
+        )
+
+    def _cache_scope(self, session_id: str):
+        fingerprint = self.vector_stores.fingerprint(session_id)
+        return f"{self.bot_type}:{fingerprint}" if fingerprint else None
+
     def _get_contextualize_prompt(self):
         return (
             "Given a chat history and the latest user question "
@@ -209,10 +460,10 @@ class GitHubRAGBot:
             "\n\n{context}"
         )
 
-    def _format_history(self, session_id: str):
-        """Format the chat history for return."""
+    def _format_history(self, session_id: str, start: int = 0):
+        """Format the chat history for return, optionally only from index start onwards."""
         history = []
-        for msg in self.chat_stores[session_id].messages:
+        for msg in self.chat_stores[session_id].messages[start:]:
             history.append({
                 "role": "user" if msg.type == "human" else "assistant",
                 "content": msg.content
@@ -222,12 +473,25 @@ class GitHubRAGBot:
     def clear_chat_history(self, session_id: str):
         """Clear the chat history for a session."""
         if session_id in self.chat_stores:
-            self.chat_stores[session_id].clear()
+            self.chat_stores.clear(session_id)
             logger.info(f"Chat history for session {session_id} cleared successfully")
             return {"message": f"Chat history for session {session_id} cleared successfully"}
         logger.warning(f"No chat history found for session {session_id}")
         return {"message": f"No chat history found for session {session_id}"}
 
+    async def attach_session(self, session_id: str, fingerprint: str):
+        """Point a session at the shared index another session's ingest built from the same snapshot."""
+        if not await run_blocking(self.vector_stores.shared.retain, fingerprint):
+            raise KeyError(f"Shared index {fingerprint[:12]} no longer exists")
+        await run_blocking(self.vector_stores.attach, session_id, fingerprint)
+
+    def evict_idle(self) -> List[str]:
+        """Drop sessions idle past the timeout from memory; they stay on disk."""
+        evicted = self.vector_stores.evict_idle() + self.chat_stores.evict_idle()
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} idle sessions and indexes from memory")
+        return evicted
+
     def get_available_sessions(self):
         """Get a list of sessions with processed repositories."""
         logger.info("Fetching available sessions")
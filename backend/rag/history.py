@@ -0,0 +1,102 @@
+import asyncio
+import os
+from typing import List
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from utils.embeddings import estimate_tokens
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("OMNILEARN_HISTORY_TOKEN_BUDGET", 2000))
+# Messages that must fall out of the window before they are folded into the summary
+HISTORY_SUMMARIZE_AFTER = int(os.environ.get("OMNILEARN_HISTORY_SUMMARIZE_AFTER", 6))
+HISTORY_SUMMARY_ENABLED = os.environ.get("OMNILEARN_HISTORY_SUMMARY", "1") == "1"
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "Progressively summarize a tutoring conversation. Extend the existing summary "
+     "with the new lines, keeping the topics, documents or files discussed, facts "
+     "established and open questions. Reply with the updated summary only, in at "
+     "most 200 words."),
+    ("human", "Existing summary:\n{summary}\n\nNew lines:\n{conversation}"),
+])
+
+
+class HistoryManager:
+    """
+    Bounds how much chat history is replayed into the prompts.
+
+    The full transcript stays in the session's ChatHistoryStore. Prompts get
+    a rolling summary of older turns followed by the most recent messages that
+    fit within token_budget. Messages that slid out of the budget stay in the
+    prompt until the summary covers them; once summarize_after of them have
+    piled up, they are folded into the summary by a background LLM call, so
+    answering never waits for it.
+    """
+
+    def __init__(self, chat_stores, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summarize_after: int = HISTORY_SUMMARIZE_AFTER, summarize: bool = HISTORY_SUMMARY_ENABLED):
+        self.chat_stores = chat_stores
+        self.token_budget = token_budget
+        self.summarize_after = summarize_after
+        self.summarize = summarize
+        self._pending = set()
+        self._tasks = set()
+
+    def _window_start(self, messages: List[BaseMessage], covered: int) -> int:
+        """Index of the oldest message that still fits in the token budget."""
+        used = 0
+        start = len(messages)
+        while start > covered:
+            cost = estimate_tokens(messages[start - 1].content)
+            if used + cost > self.token_budget and start < len(messages):
+                break
+            used += cost
+            start -= 1
+        # Never open the window with an answer whose question was cut off
+        while start < len(messages) and messages[start].type != "human":
+            start += 1
+        return start
+
+    def window(self, session_id: str, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Return the summary and recent messages to send with the next question."""
+        state = self.chat_stores.load_summary(session_id)
+        covered = min(state["covered"], len(messages))
+        # Without summaries, whatever leaves the budget is dropped for good
+        start = covered if self.summarize else self._window_start(messages, covered)
+        recent = messages[start:]
+        if state["summary"]:
+            return [SystemMessage(content=f"Summary of the earlier conversation:\n{state['summary']}"), *recent]
+        return recent
+
+    def schedule_summary(self, session_id: str, chat_history, llm):
+        """Fold messages that left the window into the summary, in the background."""
+        if not self.summarize or session_id in self._pending:
+            return
+        messages = chat_history.messages
+        state = self.chat_stores.load_summary(session_id)
+        covered = min(state["covered"], len(messages))
+        start = self._window_start(messages, covered)
+        if start - covered < self.summarize_after:
+            return
+        self._pending.add(session_id)
+        task = asyncio.create_task(self._summarize(session_id, state["summary"], messages[covered:start], start, llm))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session_id: str, summary: str, messages: List[BaseMessage], covered: int, llm):
+        try:
+            conversation = "\n".join(
+                f"{'User' if msg.type == 'human' else 'Assistant'}: {msg.content}" for msg in messages
+            )
+            chain = SUMMARY_PROMPT | llm | StrOutputParser()
+            updated = await chain.ainvoke({"summary": summary or "(none)", "conversation": conversation})
+            self.chat_stores.save_summary(session_id, updated.strip(), covered)
+            logger.info(f"Summarized {len(messages)} older messages for session {session_id}")
+        except Exception as e:
+            logger.warning(f"History summarization failed for session {session_id}: {str(e)}")
+        finally:
+            self._pending.discard(session_id)
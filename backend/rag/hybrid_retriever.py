@@ -0,0 +1,103 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+RETRIEVAL_K = int(os.environ.get("OMNILEARN_RETRIEVAL_K", 4))
+HYBRID_FETCH_K = int(os.environ.get("OMNILEARN_HYBRID_FETCH_K", 20))
+RRF_K = int(os.environ.get("OMNILEARN_RRF_K", 60))
+MIN_RELEVANCE = os.environ.get("OMNILEARN_MIN_RELEVANCE")
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses dense Chroma results with BM25 results by reciprocal-rank fusion.
+
+    Searches every (vector store, BM25 index) pair in sources, typically a
+    session's shared base index and its private overlay. Each ranked list
+    contributes 1 / (rrf_k + rank) per chunk; the top k fused chunks are
+    returned. Dense hits below score_threshold (relevance in [0, 1]) and
+    sparse hits below min_sparse_score are dropped before fusion.
+    """
+
+    sources: List[Tuple[Any, Any]]
+    k: int = RETRIEVAL_K
+    fetch_k: int = HYBRID_FETCH_K
+    rrf_k: int = RRF_K
+    score_threshold: Optional[float] = float(MIN_RELEVANCE) if MIN_RELEVANCE else None
+    min_sparse_score: float = 0.0
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # Embed the query once for all sources
+        embedding = self.sources[0][0].embeddings.embed_query(query)
+        return self._resolve([self._rank(query, embedding)])[0]
+
+    def retrieve_many(self, queries: List[str]) -> List[List[Document]]:
+        """
+        Retrieve for several queries at once.
+
+        The queries are embedded in one batch, and chunks found by more than
+        one query are loaded from their collection only once.
+        """
+        if not queries:
+            return []
+        embeddings = self.sources[0][0].embeddings.embed_documents(queries)
+        return self._resolve([self._rank(query, embedding) for query, embedding in zip(queries, embeddings)])
+
+    def _rank(self, query: str, embedding: List[float]):
+        """Fused top-k chunk IDs for a query, with the documents and owning stores found along the way."""
+        dense = []
+        sparse = []
+        for vector_store, sparse_index in self.sources:
+            relevance = vector_store._select_relevance_score_fn()
+            dense.extend(
+                (doc, relevance(distance)) for doc, distance in
+                vector_store.similarity_search_by_vector_with_relevance_scores(embedding, k=self.fetch_k)
+            )
+            sparse.extend(
+                (doc_id, score, vector_store) for doc_id, score in sparse_index.search(query, self.fetch_k)
+                if score > self.min_sparse_score
+            )
+        if self.score_threshold is not None:
+            dense = [(doc, score) for doc, score in dense if score >= self.score_threshold]
+        dense = sorted(dense, key=lambda hit: hit[1], reverse=True)[:self.fetch_k]
+        sparse = sorted(sparse, key=lambda hit: hit[1], reverse=True)[:self.fetch_k]
+
+        fused: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        owners: Dict[str, Any] = {}
+        for rank, (doc, _) in enumerate(dense):
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            documents[doc.id] = doc
+        for rank, (doc_id, _, vector_store) in enumerate(sparse):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            owners.setdefault(doc_id, vector_store)
+
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return top_ids, documents, owners
+
+    def _resolve(self, rankings) -> List[List[Document]]:
+        """Turn rankings into documents, loading every sparse-only hit once across all of them."""
+        documents: Dict[str, Document] = {}
+        missing: Dict[int, Tuple[Any, set]] = {}
+        for top_ids, found, owners in rankings:
+            documents.update(found)
+        for top_ids, found, owners in rankings:
+            for doc_id in top_ids:
+                if doc_id not in documents:
+                    missing.setdefault(id(owners[doc_id]), (owners[doc_id], set()))[1].add(doc_id)
+        for vector_store, ids in missing.values():
+            documents.update(self._load(vector_store, sorted(ids)))
+        return [[documents[doc_id] for doc_id in top_ids if doc_id in documents] for top_ids, _, _ in rankings]
+
+    @staticmethod
+    def _load(vector_store, ids: List[str]) -> Dict[str, Document]:
+        """Fetch sparse-only hits from the collection that holds them."""
+        page = vector_store.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: Document(page_content=text, metadata=metadata or {}, id=doc_id)
+            for doc_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+        }
@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+JOB_RETENTION_SECONDS = float(os.environ.get("OMNILEARN_JOB_RETENTION_SECONDS", 3600))
+# Minimum interval between progress writes to the shared backend
+JOB_PUBLISH_INTERVAL = 0.5
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# progress(stage, done, total=None); ingestion code reports through this
+ProgressCallback = Callable[..., None]
+# join(result); applies a shared job's result to a request that was merged into it
+JoinCallback = Callable[[Any], Awaitable[None]]
+
+
+def no_progress(stage: str, done: int, total: Optional[int] = None):
+    """Progress callback for ingestions that nobody is watching."""
+
+
+class JobCancelled(Exception):
+    """Raised from a progress report once the job has been cancelled."""
+
+
+class Job:
+    """
+    One background ingestion with per-stage progress.
+
+    report() is safe to call from worker threads. After cancel() it raises
+    JobCancelled, which stops blocking loops (embedding batches, repository
+    walks) at their next progress report even though a running thread cannot
+    be interrupted.
+
+    A deduplicated ingestion runs once as a shared job, and every request for
+    it gets its own job following the shared one (follows holds its ID), so
+    each request has its own status, result and cancellation.
+    """
+
+    def __init__(self, kind: str, dedup_key: Optional[Hashable] = None,
+                 on_report: Optional[Callable[["Job"], None]] = None,
+                 shared: bool = False, follows: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.dedup_key = dedup_key
+        self.shared = shared
+        self.follows = follows
+        self.status = QUEUED
+        self.stages: Dict[str, Dict[str, Optional[int]]] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.cancel_requested = False
+        self.task: Optional[asyncio.Task] = None
+        self.on_report = on_report
+        self._lock = threading.Lock()
+
+    def report(self, stage: str, done: int, total: Optional[int] = None):
+        if self.on_report is not None:
+            self.on_report(self)
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+        with self._lock:
+            previous = self.stages.get(stage, {})
+            self.stages[stage] = {"done": done, "total": total if total is not None else previous.get("total")}
+            self.updated_at = time.time()
+
+    def cancel(self):
+        self.cancel_requested = True
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stages": {stage: dict(progress) for stage, progress in self.stages.items()},
+                "result": self.result,
+                "error": self.error,
+                "shared": self.shared,
+                "follows": self.follows,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+
+
+class JobManager:
+    """
+    Runs ingestions in the background and tracks them by job ID.
+
+    Work submitted with a dedup_key runs once as a shared job per key; each
+    submission gets a job of its own that follows it. A request merged into
+    a shared job started by another request applies the result through its
+    join callback and only then reports success, so a failed join fails that
+    request alone. Its release callback runs once the request has ended in
+    any state. Cancelling a request detaches it, and cancels the shared job
+    only when no other request is still waiting on it. Concurrency is
+    bounded by the ingest slot the bots acquire, so a running job may report
+    no progress until a slot frees up. Finished jobs are kept for
+    retention_seconds so clients can poll the outcome.
+
+    With a shared session backend, job state, deduplication and cancellation
+    work across worker processes: any worker can report on or cancel a job,
+    while the worker that accepted it runs it and publishes its progress.
+    """
+
+    def __init__(self, backend=None, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.backend = backend
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[Hashable, Job] = {}
+        self._published: Dict[str, float] = {}
+        self._waiters: Dict[str, int] = {}
+
+    @staticmethod
+    def _dedup_digest(dedup_key: Hashable) -> str:
+        return hashlib.sha1(repr(dedup_key).encode('utf-8')).hexdigest()
+
+    def submit(self, kind: str, work: Callable[[Job], Awaitable[Any]],
+               dedup_key: Optional[Hashable] = None, join: Optional[JoinCallback] = None,
+               release: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """Start work(job) in the background, or follow the in-flight job with the same key."""
+        self._prune()
+        if dedup_key is None:
+            return self._start(Job(kind, on_report=self._reporter()), work).to_dict()
+
+        shared = self._active.get(dedup_key)
+        if shared is not None:
+            logger.info(f"Reusing in-flight {kind} job {shared.id}")
+            return self._follow(kind, shared.id, join, release)
+
+        shared = Job(kind, dedup_key, on_report=self._reporter(), shared=True)
+        if self.backend is not None:
+            lock_key = f"job-key:{self._dedup_digest(dedup_key)}"
+            if not self.backend.set(lock_key, shared.id, nx=True, ex=self.retention_seconds):
+                existing = self.get(self.backend.get(lock_key) or "")
+                if existing is not None and existing["status"] not in FINISHED:
+                    logger.info(f"Reusing in-flight {kind} job {existing['job_id']} from another worker")
+                    return self._follow(kind, existing["job_id"], join, release)
+                self.backend.set(lock_key, shared.id, ex=self.retention_seconds)
+
+        self._active[dedup_key] = shared
+        self._start(shared, work)
+        # The request that started the shared job gets its result from work itself
+        return self._follow(kind, shared.id, None, None)
+
+    def _reporter(self) -> Optional[Callable[[Job], None]]:
+        return self._publish if self.backend is not None else None
+
+    def _start(self, job: Job, work: Callable[[Job], Awaitable[Any]]) -> Job:
+        self._jobs[job.id] = job
+        self._publish(job, force=True)
+        job.task = asyncio.create_task(self._run(job, work))
+        logger.info(f"Submitted {job.kind} job {job.id}")
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]):
+        job.status = RUNNING
+        self._publish(job, force=True)
+        try:
+            job.result = await work(job)
+            job.status = SUCCEEDED
+            logger.info(f"Job {job.id} succeeded in {time.time() - job.created_at:.2f}s")
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            logger.info(f"Job {job.id} cancelled")
+        except Exception as e:
+            if job.cancel_requested:
+                job.status = CANCELLED
+                logger.info(f"Job {job.id} cancelled")
+            else:
+                job.status = FAILED
+                job.error = getattr(e, "detail", None) or str(e)
+                logger.error(f"Job {job.id} failed: {job.error}")
+        finally:
+            job.updated_at = time.time()
+            if job.dedup_key is not None and self._active.get(job.dedup_key) is job:
+                del self._active[job.dedup_key]
+                if self.backend is not None:
+                    self.backend.delete(f"job-key:{self._dedup_digest(job.dedup_key)}")
+            self._publish(job, force=True)
+
+    def _follow(self, kind: str, shared_id: str, join: Optional[JoinCallback],
+                release: Optional[Callable[[], None]]) -> Dict[str, Any]:
+        """Create the job through which one request waits for a shared job."""
+        job = Job(kind, follows=shared_id)
+        self._jobs[job.id] = job
+        self._add_waiter(shared_id, 1)
+        job.task = asyncio.create_task(self._await_shared(job, join))
+        # Runs even when the task is cancelled before it starts
+        job.task.add_done_callback(lambda task: self._followed(job, task, release))
+        self._publish(job, force=True)
+        return job.to_dict()
+
+    async def _await_shared(self, job: Job, join: Optional[JoinCallback]):
+        job.status = RUNNING
+        self._publish(job, force=True)
+        while True:
+            shared = self._jobs.get(job.follows)
+            if shared is not None and shared.task is not None:
+                await asyncio.wait({shared.task}, timeout=JOB_PUBLISH_INTERVAL)
+            else:
+                await asyncio.sleep(JOB_PUBLISH_INTERVAL)
+            state = self.get(job.follows)
+            if state is None:
+                raise RuntimeError(f"Job {job.follows} is no longer tracked")
+            with job._lock:
+                job.stages = state["stages"]
+                job.updated_at = time.time()
+            # Picks up cancellation requested through another worker
+            self._publish(job)
+            if job.cancel_requested:
+                raise asyncio.CancelledError()
+            if state["status"] in FINISHED:
+                break
+        if state["status"] == SUCCEEDED and join is not None:
+            await join(state["result"])
+        return state
+
+    def _followed(self, job: Job, task: asyncio.Task, release: Optional[Callable[[], None]]):
+        """Settle a request once it stops waiting; its status is set only after the release has run."""
+        if release is not None:
+            try:
+                release()
+            except Exception as e:
+                logger.warning(f"Releasing the resources of job {job.id} failed: {str(e)}")
+        remaining = self._add_waiter(job.follows, -1)
+        if task.cancelled():
+            status, result, error = CANCELLED, None, None
+            logger.info(f"Job {job.id} detached from job {job.follows}")
+            if remaining <= 0:
+                logger.info(f"No request is waiting on job {job.follows} any more; cancelling it")
+                self.cancel(job.follows)
+        elif task.exception() is not None:
+            status, result, error = FAILED, None, getattr(task.exception(), "detail", None) or str(task.exception())
+            logger.error(f"Applying the result of job {job.follows} to job {job.id} failed: {error}")
+        else:
+            state = task.result()
+            status, result, error = state["status"], state["result"], state["error"]
+        with job._lock:
+            job.status, job.result, job.error = status, result, error
+            job.updated_at = time.time()
+        self._publish(job, force=True)
+
+    def _add_waiter(self, job_id: str, amount: int) -> int:
+        """Adjust and return how many requests are waiting on a shared job, across workers."""
+        if self.backend is not None:
+            return self.backend.incr(f"job-waiters:{job_id}", amount)
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + amount
+        return self._waiters[job_id]
+
+    def _publish(self, job: Job, force: bool = False):
+        """Write the job's state to the shared backend and pick up remote cancellation."""
+        if self.backend is None:
+            return
+        now = time.time()
+        if not force and now - self._published.get(job.id, 0.0) < JOB_PUBLISH_INTERVAL:
+            return
+        self._published[job.id] = now
+        if job.status not in FINISHED and self.backend.get(f"job-cancel:{job.id}"):
+            job.cancel_requested = True
+        self.backend.hset("jobs", job.id, json.dumps(job.to_dict()))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.backend is not None:
+            state = self.backend.hget("jobs", job_id)
+            return json.loads(state) if state else None
+        return None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a job; a request following a shared job is detached from it instead."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if job.status not in FINISHED:
+                job.cancel()
+                logger.info(f"Cancellation requested for job {job_id}")
+            return job.to_dict()
+        state = self.get(job_id)
+        if state is not None and state["status"] not in FINISHED:
+            # The owning worker sees the flag at its job's next progress report
+            self.backend.set(f"job-cancel:{job_id}", 1, ex=self.retention_seconds)
+            logger.info(f"Cancellation requested for job {job_id} running in another worker")
+        return state
+
+    def list(self) -> List[Dict[str, Any]]:
+        self._prune()
+        jobs = {job_id: job.to_dict() for job_id, job in self._jobs.items()}
+        if self.backend is not None:
+            for job_id, state in self.backend.hgetall("jobs").items():
+                jobs.setdefault(job_id, json.loads(state))
+        # Shared jobs are reported through the requests following them
+        return [state for state in jobs.values() if not state.get("shared")]
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED and job.updated_at < cutoff
+        ]:
+            del self._jobs[job_id]
+            self._published.pop(job_id, None)
+            self._waiters.pop(job_id, None)
+        if self.backend is not None:
+            for job_id, state in self.backend.hgetall("jobs").items():
+                state = json.loads(state)
+                if state["status"] in FINISHED and state["updated_at"] < cutoff:
+                    self.backend.hdel("jobs", job_id)
+                    self.backend.delete(f"job-waiters:{job_id}")
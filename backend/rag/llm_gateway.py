@@ -0,0 +1,626 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_groq import ChatGroq
+from pydantic import Field, SecretStr
+from utils.logger import setup_logger
+from .chain_registry import hash_api_key
+from .history import estimate_tokens
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# OpenAI/Groq-compatible endpoint; unset means Groq's public API
+LLM_BASE_URL = os.environ.get("OMNILEARN_LLM_BASE_URL") or None
+LLM_TIMEOUT_SECONDS = float(os.environ.get("OMNILEARN_LLM_TIMEOUT_SECONDS", 60))
+# Simultaneous upstream calls per API key; further calls wait their turn
+LLM_MAX_CONCURRENCY_PER_KEY = int(os.environ.get("OMNILEARN_LLM_MAX_CONCURRENCY_PER_KEY", 8))
+# Static requests and tokens per minute per API key and model, per worker process, on top of the limits
+# the provider reports in its responses; 0 (the default) leaves pacing to the reported limits alone
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("OMNILEARN_LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("OMNILEARN_LLM_TOKENS_PER_MINUTE", 0))
+# Requests that may start back to back before the per-minute rate applies; 0 means a full minute's worth
+LLM_REQUEST_BURST = float(os.environ.get("OMNILEARN_LLM_REQUEST_BURST", 0))
+LLM_MAX_RETRIES = int(os.environ.get("OMNILEARN_LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_SECONDS = float(os.environ.get("OMNILEARN_LLM_BACKOFF_SECONDS", 1.0))
+LLM_MAX_BACKOFF_SECONDS = 30.0
+# A call that would have to queue longer than this for rate limits fails instead; 0 waits as long as needed
+LLM_MAX_QUEUE_SECONDS = float(os.environ.get("OMNILEARN_LLM_MAX_QUEUE_SECONDS", 0))
+# Clients of API keys unused for this long are closed
+LLM_CLIENT_IDLE_SECONDS = float(os.environ.get("OMNILEARN_LLM_CLIENT_IDLE_SECONDS", 1800))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Groq's reset times look like "2m59.56s", "7.66s" or "120ms"
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class LLMQueueTimeout(Exception):
+    """Raised when a call would wait longer than the queue limit for its rate limit."""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate units per second, up to capacity.
+
+    Waiters are served in arrival order. A call may debit more than it
+    reserved (the real token count of a response), driving the level below
+    zero so later calls wait for the overdraft to refill. pause() holds
+    every waiter back, for example until a 429's Retry-After has passed.
+    acquire_blocking() serves synchronous callers from worker threads.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._state_lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait(self, amount: float, now: float) -> float:
+        shortfall = amount - self.level
+        return max(self.paused_until - now, shortfall / self.rate if shortfall > 0 else 0.0)
+
+    def _take(self, amount: float, max_wait: float) -> float:
+        """Debit amount and return 0, or return how long to wait before it is available."""
+        with self._state_lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._wait(amount, now)
+            if wait <= 0:
+                self.level -= amount
+                return 0.0
+        if max_wait and wait > max_wait:
+            raise LLMQueueTimeout(f"LLM rate limit would delay this call by {wait:.0f}s")
+        return wait
+
+    async def acquire(self, amount: float = 1.0, max_wait: float = LLM_MAX_QUEUE_SECONDS):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                wait = self._take(amount, max_wait)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def acquire_blocking(self, amount: float = 1.0, max_wait: float = LLM_MAX_QUEUE_SECONDS):
+        amount = min(amount, self.capacity)
+        while True:
+            wait = self._take(amount, max_wait)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def debit(self, amount: float):
+        with self._state_lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        self._refill(time.monotonic())
+        return {"available": round(self.level, 1), "capacity": self.capacity,
+                "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 1)}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate-limit reset header, either plain seconds or Groq's "1m2.5s" form."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DURATION_RE.findall(value)
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts) if parts else None
+
+
+class ProviderLimits:
+    """
+    The rate limits of one API key and model as the provider reports them.
+
+    Every Groq response carries the requests and tokens left in the current
+    window and the time until each resets (x-ratelimit-remaining-* and
+    x-ratelimit-reset-*). Calls are admitted against the last reported
+    budget, counted down locally until the next response refreshes it; once
+    a budget is spent, callers wait for its reset, after which it is unknown
+    again until a response reports it. pause() holds every caller back, for
+    example until a 429's Retry-After has passed. acquire_blocking() serves
+    synchronous callers from worker threads.
+    """
+
+    KINDS = ("requests", "tokens")
+
+    def __init__(self):
+        self.remaining: Dict[str, Optional[float]] = {kind: None for kind in self.KINDS}
+        self.reset_at: Dict[str, float] = {kind: 0.0 for kind in self.KINDS}
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._state_lock = threading.Lock()
+
+    def update(self, headers):
+        now = time.monotonic()
+        with self._state_lock:
+            for kind in self.KINDS:
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining is None or reset is None:
+                    continue
+                try:
+                    self.remaining[kind] = float(remaining)
+                except ValueError:
+                    continue
+                self.reset_at[kind] = now + reset
+
+    def _wait(self, tokens: float, now: float) -> float:
+        wait = self.paused_until - now
+        for kind, amount in (("requests", 1), ("tokens", tokens)):
+            if self.remaining[kind] is None:
+                continue
+            if now >= self.reset_at[kind]:
+                self.remaining[kind] = None
+            elif self.remaining[kind] < amount:
+                wait = max(wait, self.reset_at[kind] - now)
+        return wait
+
+    def _take(self, tokens: float, max_wait: float) -> float:
+        """Count one call against the budgets and return 0, or return how long to wait for them."""
+        with self._state_lock:
+            now = time.monotonic()
+            wait = self._wait(tokens, now)
+            if wait <= 0:
+                for kind, amount in (("requests", 1), ("tokens", tokens)):
+                    if self.remaining[kind] is not None:
+                        self.remaining[kind] -= amount
+                return 0.0
+        if max_wait and wait > max_wait:
+            raise LLMQueueTimeout(f"LLM rate limit would delay this call by {wait:.0f}s")
+        return wait
+
+    async def acquire(self, tokens: float, max_wait: float = LLM_MAX_QUEUE_SECONDS):
+        async with self._lock:
+            while True:
+                wait = self._take(tokens, max_wait)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def acquire_blocking(self, tokens: float, max_wait: float = LLM_MAX_QUEUE_SECONDS):
+        while True:
+            wait = self._take(tokens, max_wait)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **{f"remaining_{kind}": self.remaining[kind] for kind in self.KINDS},
+            **{f"reset_{kind}_seconds": round(max(0.0, self.reset_at[kind] - now), 1) for kind in self.KINDS},
+            "paused_seconds": round(max(0.0, self.paused_until - now), 1),
+        }
+
+
+class _KeyState:
+    """Pooled HTTP clients, concurrency cap, rate limits and counters of one API key."""
+
+    def __init__(self, api_key: str, max_concurrency: int):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self.http_client = httpx.Client(
+            limits=limits, timeout=LLM_TIMEOUT_SECONDS, event_hooks={"response": [self._record_limits]}
+        )
+        self.http_async_client = httpx.AsyncClient(
+            limits=limits, timeout=LLM_TIMEOUT_SECONDS, event_hooks={"response": [self._observe]}
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Synchronous calls run in worker threads, outside the event loop the semaphore belongs to
+        self.thread_semaphore = threading.Semaphore(max_concurrency)
+        self.models: Dict[str, "GatewayChatModel"] = {}
+        self.provider_limits: Dict[str, ProviderLimits] = {}
+        self.request_buckets: Dict[str, TokenBucket] = {}
+        self.token_buckets: Dict[str, TokenBucket] = {}
+        self.last_used = time.monotonic()
+        self.counters = {"requests": 0, "queued": 0, "in_flight": 0, "retries": 0, "rate_limited": 0,
+                         "coalesced": 0, "failures": 0}
+
+    async def _observe(self, response: httpx.Response):
+        self._record_limits(response)
+
+    def _record_limits(self, response: httpx.Response):
+        """Record the rate-limit headers of every response, 429s included, for the model requested."""
+        try:
+            model_name = json.loads(response.request.content).get("model")
+        except (ValueError, AttributeError, httpx.RequestNotRead):
+            return
+        limits = self.provider_limits.get(model_name)
+        if limits is not None:
+            limits.update(response.headers)
+
+    def close(self):
+        self.http_client.close()
+        try:
+            asyncio.get_running_loop().create_task(self.http_async_client.aclose())
+        except RuntimeError:
+            pass
+
+
+# A streamed chunk, or the one ChatResult of a call that is not streamed
+CallOutput = Union[ChatGenerationChunk, ChatResult]
+
+
+class _SharedCall:
+    """One upstream call whose result, or stream of chunks, is shared by identical concurrent callers."""
+
+    def __init__(self):
+        self.chunks: List[CallOutput] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk: CallOutput):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    async def replay(self) -> AsyncIterator[CallOutput]:
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.chunks) > position)
+                chunks, done = self.chunks[position:], self.done
+            for chunk in chunks:
+                # Callers annotate the messages they receive, so each gets its own copy
+                yield chunk.model_copy(deep=True)
+            position += len(chunks)
+            if done and position == len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _call_key(model: "GatewayChatModel", messages: List[BaseMessage], stop, stream: bool, kwargs) -> str:
+    payload = json.dumps(
+        [model.model_name, stream, stop, [[m.type, m.content] for m in messages], sorted(kwargs.items())],
+        default=str,
+    )
+    return f"{model.key_hash}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def _usage_tokens(output: CallOutput) -> Optional[int]:
+    message = output.generations[0].message if isinstance(output, ChatResult) else output.message
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class LLMGateway:
+    """
+    Shared front end for all chat model calls to Groq (or any compatible API).
+
+    Per API key, one pair of pooled HTTP clients serves every model, and at
+    most max_concurrency calls are in flight; the rest queue. Each key and
+    model is paced by the limits the provider reports in its response
+    headers (see ProviderLimits), so a spent budget makes calls wait for its
+    reset instead of turning into 429s; static requests and tokens per
+    minute can be added as token buckets, but are off by default. A 429 or
+    transient failure is retried with exponential backoff and jitter,
+    honouring Retry-After, and a 429 also pauses that key and model so
+    queued calls back off with it. Identical calls already in flight
+    (same key, model, messages and parameters) are coalesced into one
+    upstream request whose result, or token stream, every caller receives.
+
+    Static limits and queues are per worker process; the reported limits
+    cover every worker and host sharing the key, as seen in each response.
+    Synchronous calls are paced and retried the same way from the calling
+    thread, but are not coalesced.
+    """
+
+    def __init__(self, base_url: Optional[str] = LLM_BASE_URL,
+                 max_concurrency_per_key: int = LLM_MAX_CONCURRENCY_PER_KEY,
+                 requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 request_burst: float = LLM_REQUEST_BURST,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_seconds: float = LLM_BACKOFF_SECONDS,
+                 max_queue_seconds: float = LLM_MAX_QUEUE_SECONDS,
+                 idle_seconds: float = LLM_CLIENT_IDLE_SECONDS):
+        self.base_url = base_url
+        self.max_concurrency_per_key = max_concurrency_per_key
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_burst = request_burst or requests_per_minute
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_queue_seconds = max_queue_seconds
+        self.idle_seconds = idle_seconds
+        self._keys: Dict[str, _KeyState] = {}
+        self._inflight: Dict[str, _SharedCall] = {}
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for key_hash, state in list(self._keys.items()):
+            if state.last_used < cutoff and not state.counters["in_flight"] and not state.counters["queued"]:
+                logger.info(f"Closing idle LLM clients for key {key_hash}")
+                state.close()
+                del self._keys[key_hash]
+
+    def chat_model(self, api_key: str, model_name: str) -> "GatewayChatModel":
+        """The chat model for this key and model, sharing the key's pooled clients and limits."""
+        key_hash = hash_api_key(api_key)
+        if key_hash not in self._keys:
+            self._prune()
+            self._keys[key_hash] = _KeyState(api_key, self.max_concurrency_per_key)
+        state = self._keys[key_hash]
+        state.last_used = time.monotonic()
+        model = state.models.get(model_name)
+        if model is None:
+            client = ChatGroq(
+                groq_api_key=api_key,
+                model_name=model_name,
+                base_url=self.base_url,
+                timeout=LLM_TIMEOUT_SECONDS,
+                # Retries happen here, in step with the rate limits
+                max_retries=0,
+                http_client=state.http_client,
+                http_async_client=state.http_async_client,
+            )
+            model = state.models[model_name] = GatewayChatModel(
+                model_name=model_name, groq_api_key=SecretStr(api_key), key_hash=key_hash, client=client, gateway=self
+            )
+            state.provider_limits[model_name] = ProviderLimits()
+            if self.requests_per_minute:
+                state.request_buckets[model_name] = TokenBucket(self.requests_per_minute / 60, self.request_burst)
+            if self.tokens_per_minute:
+                state.token_buckets[model_name] = TokenBucket(self.tokens_per_minute / 60, self.tokens_per_minute)
+        return model
+
+    async def _admit(self, state: _KeyState, model_name: str, tokens: int):
+        """Wait for the rate limits of the key and model."""
+        state.counters["queued"] += 1
+        try:
+            await state.provider_limits[model_name].acquire(tokens, self.max_queue_seconds)
+            requests = state.request_buckets.get(model_name)
+            if requests is not None:
+                await requests.acquire(1, self.max_queue_seconds)
+            token_bucket = state.token_buckets.get(model_name)
+            if token_bucket is not None:
+                await token_bucket.acquire(tokens, self.max_queue_seconds)
+        finally:
+            state.counters["queued"] -= 1
+
+    def _admit_blocking(self, state: _KeyState, model_name: str, tokens: int):
+        """Wait for the rate limits of the key and model, blocking the calling thread."""
+        state.counters["queued"] += 1
+        try:
+            state.provider_limits[model_name].acquire_blocking(tokens, self.max_queue_seconds)
+            requests = state.request_buckets.get(model_name)
+            if requests is not None:
+                requests.acquire_blocking(1, self.max_queue_seconds)
+            token_bucket = state.token_buckets.get(model_name)
+            if token_bucket is not None:
+                token_bucket.acquire_blocking(tokens, self.max_queue_seconds)
+        finally:
+            state.counters["queued"] -= 1
+
+    def _backoff(self, state: _KeyState, model_name: str, error: BaseException, attempt: int) -> float:
+        delay = _retry_after(error)
+        if getattr(error, "status_code", None) == 429:
+            state.counters["rate_limited"] += 1
+            delay = delay if delay is not None else self.backoff_seconds * 2 ** attempt
+            # Everyone queued on this key and model backs off with this call
+            state.provider_limits[model_name].pause(delay)
+            for buckets in (state.request_buckets, state.token_buckets):
+                if model_name in buckets:
+                    buckets[model_name].pause(delay)
+        if delay is None:
+            delay = self.backoff_seconds * 2 ** attempt
+        return min(LLM_MAX_BACKOFF_SECONDS, delay) + random.uniform(0, self.backoff_seconds)
+
+    def _retry_delay(self, state: _KeyState, model_name: str, error: Exception, attempt: int,
+                     retryable: bool = True) -> Optional[float]:
+        """Seconds to wait before retrying a failed call, or None if it has failed for good."""
+        if not retryable or attempt >= self.max_retries or not _is_retryable(error):
+            state.counters["failures"] += 1
+            logger.warning(f"LLM call to {model_name} failed after {attempt + 1} attempt(s): {str(error)}")
+            return None
+        delay = self._backoff(state, model_name, error, attempt)
+        state.counters["retries"] += 1
+        logger.info(f"Retrying LLM call to {model_name} in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{self.max_retries}): {str(error)}")
+        return delay
+
+    async def _upstream(self, model: "GatewayChatModel", shared: _SharedCall, prompt_tokens: int,
+                        factory: Callable[[ChatGroq], AsyncIterator[CallOutput]]):
+        """Run a call through the rate limits and concurrency cap with retries, publishing its output."""
+        # Chains may hold a model whose idle key state was closed since; calls go through the live one
+        model = self.chat_model(model.groq_api_key.get_secret_value(), model.model_name)
+        state = self._keys[model.key_hash]
+        state.counters["requests"] += 1
+        attempt = 0
+        while True:
+            published = 0
+            try:
+                # A queue timeout fails the call like any other error, so its callers hear about it
+                await self._admit(state, model.model_name, prompt_tokens)
+                async with state.semaphore:
+                    state.counters["in_flight"] += 1
+                    try:
+                        total_tokens = None
+                        async for chunk in factory(model.client):
+                            total_tokens = _usage_tokens(chunk) or total_tokens
+                            await shared.publish(chunk)
+                            published += 1
+                    finally:
+                        state.counters["in_flight"] -= 1
+                tokens = state.token_buckets.get(model.model_name)
+                if tokens is not None and total_tokens:
+                    tokens.debit(total_tokens - prompt_tokens)
+                await shared.finish()
+                return
+            except Exception as e:
+                # A stream that already produced tokens cannot be replayed transparently
+                delay = self._retry_delay(state, model.model_name, e, attempt, retryable=not published)
+                if delay is None:
+                    await shared.finish(e)
+                    return
+                attempt += 1
+                await asyncio.sleep(delay)
+            except BaseException as e:
+                await shared.finish(e)
+                raise
+
+    def _forget(self, key: str, shared: _SharedCall):
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
+
+    async def _subscribe(self, model: "GatewayChatModel", messages: List[BaseMessage], stop, stream: bool,
+                         kwargs, factory) -> AsyncIterator[CallOutput]:
+        key = _call_key(model, messages, stop, stream, kwargs)
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = self._inflight[key] = _SharedCall()
+            prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+            shared.task = asyncio.create_task(self._upstream(model, shared, prompt_tokens, factory))
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+        elif model.key_hash in self._keys:
+            self._keys[model.key_hash].counters["coalesced"] += 1
+        shared.subscribers += 1
+        try:
+            async for chunk in shared.replay():
+                yield chunk
+        finally:
+            shared.subscribers -= 1
+            # Nobody is waiting for the answer any more
+            if not shared.subscribers and not shared.done and shared.task is not None:
+                self._forget(key, shared)
+                shared.task.cancel()
+
+    def generate(self, model: "GatewayChatModel", messages: List[BaseMessage], stop=None, **kwargs) -> ChatResult:
+        """Make a call from a synchronous caller, blocking its thread for the rate limits and retries."""
+        model = self.chat_model(model.groq_api_key.get_secret_value(), model.model_name)
+        state = self._keys[model.key_hash]
+        state.counters["requests"] += 1
+        prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        attempt = 0
+        while True:
+            try:
+                self._admit_blocking(state, model.model_name, prompt_tokens)
+                with state.thread_semaphore:
+                    state.counters["in_flight"] += 1
+                    try:
+                        result = model.client._generate(messages, stop=stop, **kwargs)
+                    finally:
+                        state.counters["in_flight"] -= 1
+                tokens = state.token_buckets.get(model.model_name)
+                total_tokens = _usage_tokens(result)
+                if tokens is not None and total_tokens:
+                    tokens.debit(total_tokens - prompt_tokens)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(state, model.model_name, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+
+    async def agenerate(self, model: "GatewayChatModel", messages: List[BaseMessage], stop=None,
+                        **kwargs) -> ChatResult:
+        async def once(client: ChatGroq):
+            yield await client._agenerate(messages, stop=stop, **kwargs)
+
+        results = [result async for result in self._subscribe(model, messages, stop, False, kwargs, once)]
+        return results[0]
+
+    async def astream(self, model: "GatewayChatModel", messages: List[BaseMessage], stop=None,
+                      **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        def chunks(client: ChatGroq):
+            return client._astream(messages, stop=stop, **kwargs)
+
+        async for chunk in self._subscribe(model, messages, stop, True, kwargs, chunks):
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            key_hash: {
+                "max_concurrency": state.max_concurrency,
+                **state.counters,
+                "models": {
+                    model_name: {
+                        "provider": state.provider_limits[model_name].stats(),
+                        "requests": state.request_buckets[model_name].stats()
+                        if model_name in state.request_buckets else None,
+                        "tokens": state.token_buckets[model_name].stats()
+                        if model_name in state.token_buckets else None,
+                    }
+                    for model_name in state.models
+                },
+            }
+            for key_hash, state in self._keys.items()
+        }
+
+
+class GatewayChatModel(BaseChatModel):
+    """Chat model whose calls go through an LLMGateway; wraps the ChatGroq doing the requests."""
+
+    model_name: str
+    groq_api_key: SecretStr
+    key_hash: str
+    client: Any = Field(exclude=True)
+    gateway: Any = Field(exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "groq-gateway"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self.gateway.generate(self, messages, stop, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await self.gateway.agenerate(self, messages, stop, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async for chunk in self.gateway.astream(self, messages, stop, **kwargs):
+            yield chunk
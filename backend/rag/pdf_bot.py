@@ -1,100 +1,202 @@
-import tempfile
+import hashlib
 import os
 from typing import List
 from fastapi import HTTPException
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_chroma import Chroma
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+from utils.concurrency import ingest_slot, run_blocking, run_ingest
+from utils.tracing import span
+from .chain_registry import ChainRegistry, chain_registry as default_chain_registry, llm_cache_key
+from .answer_cache import ANSWER_CACHE_ENABLED, SemanticAnswerCache
+from .context_compression import CONTEXT_COMPRESSION_ENABLED, ContextCompressor
+from .history import HistoryManager
+from .hybrid_retriever import HybridRetriever
+from .jobs import ProgressCallback, no_progress
+from .pdf_pipeline import PDFSource, stream_pdf_pages
+from .pipeline import RAGPipeline
+from .session_store import ChatHistoryStore, SessionStore, add_in_batches
+from .streaming import stream_batch_answers, stream_rag_chain
+
+
+def fingerprint_digests(digests: List[str]) -> str:
+    """Order-independent hash identifying a set of files by their SHA-256 hex digests."""
+    return hashlib.sha256("\n".join(sorted(digests)).encode('utf-8')).hexdigest()
+
+
+def fingerprint_files(files: List[bytes]) -> str:
+    """Order-independent hash identifying a set of uploaded files."""
+    return fingerprint_digests([hashlib.sha256(content).hexdigest() for content in files])
+
 
 class PDFBot:
-    def __init__(self, embeddings):
+    bot_type = "pdf"
+
+    def __init__(self, embeddings, chain_registry: ChainRegistry = None, data_dir: str = None,
+                 answer_cache: SemanticAnswerCache = None, compressor: ContextCompressor = None):
         self.embeddings = embeddings
-        self.chat_stores = {}
-        self.vector_stores = {}
+        self.chain_registry = chain_registry or default_chain_registry
+        if answer_cache is None and ANSWER_CACHE_ENABLED:
+            answer_cache = SemanticAnswerCache(embeddings)
+        self.answer_cache = answer_cache
+        if compressor is None and CONTEXT_COMPRESSION_ENABLED:
+            compressor = ContextCompressor(embeddings)
+        self.compressor = compressor
+        self.chat_stores = ChatHistoryStore(self.bot_type, data_dir=data_dir)
+        self.history = HistoryManager(self.chat_stores)
+        self.vector_stores = SessionStore(
+            self.bot_type,
+            embeddings,
+            data_dir=data_dir,
+            on_evict=lambda session: self.chain_registry.invalidate(session, self.bot_type)
+        )
+
+    async def process_pdf(self, files: List[PDFSource], session_id: str, filenames: List[str] = None,
+                          progress: ProgressCallback = no_progress, append: bool = False,
+                          fingerprint: str = None):
+        """
+        Index uploaded PDFs for a session.
 
-    async def process_pdf(self, files: List[bytes], session_id: str):
+        The files are indexed once per unique set of contents and shared by
+        every session uploading the same set. With append, they are added to
+        the session's private overlay on top of what it already has. Files
+        are in-memory bytes or paths of spooled uploads; for paths the caller
+        passes the fingerprint computed while spooling.
+        """
         try:
-            documents = []
-            for file_content in files:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                    temp_file.write(file_content)
-                    temp_file_path = temp_file.name
-                
-                try:
-                    loader = PyPDFLoader(temp_file_path)
-                    docs = loader.load()
-                    documents.extend(docs)
-                finally:
-                    os.unlink(temp_file_path)
-
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=5000, chunk_overlap=500)
-            splits = text_splitter.split_documents(documents)
-            
-            self.vector_stores[session_id] = Chroma.from_documents(
-                documents=splits, 
-                embedding=self.embeddings
-            )
+            fingerprint = fingerprint or fingerprint_files(files)
+            counts = {"pages": 0, "chunked": 0, "embedded": 0}
+
+            async def build(vector_store, sparse_index):
+                # Pages stream in from the process pool; each batch is split and
+                # embedded while the next page ranges are still being parsed
+                async for pages in stream_pdf_pages(files, filenames, progress=progress):
+                    counts["pages"] += len(pages)
+                    chunked = counts["chunked"]
+                    with span("index_batch", pages=len(pages)) as stage:
+                        await run_ingest(self._index_documents, vector_store, sparse_index, pages, counts, progress)
+                        stage.set(chunks=counts["chunked"] - chunked)
+
+            size = sum(len(content) if isinstance(content, bytes) else os.path.getsize(content) for content in files)
+            with span("ingest", bot=self.bot_type, bytes=size) as stage:
+                async with ingest_slot():
+                    if append and session_id in self.vector_stores:
+                        await build(self.vector_stores.open_overlay(session_id), self.vector_stores.sparse_index(session_id))
+                        self.vector_stores.add_overlay(session_id, fingerprint)
+                        shared = False
+                    else:
+                        shared = not await self.vector_stores.shared.ensure(fingerprint, build)
+                        await run_blocking(self.vector_stores.attach, session_id, fingerprint)
+                stage.set(pages=counts["pages"], chunks=counts["embedded"], shared=shared)
             
-            return {"message": "Files processed successfully"}
+            return {
+                "message": "Files processed successfully",
+                "pages": counts["pages"],
+                "chunks": counts["embedded"],
+                "shared": shared,
+                "fingerprint": fingerprint,
+            }
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-    async def get_response(self, session_id: str, message: str, llm):
+    def _index_documents(self, vector_store, sparse_index, documents, counts, progress: ProgressCallback):
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=5000, chunk_overlap=500)
+        splits = text_splitter.split_documents(documents)
+        counts["chunked"] += len(splits)
+        progress("chunked", counts["chunked"])
+
+        def on_batch(size: int):
+            counts["embedded"] += size
+            progress("embedded", counts["embedded"], counts["chunked"])
+
+        add_in_batches(vector_store, splits, sparse_index=sparse_index, on_batch=on_batch)
+
+    async def get_response(self, session_id: str, message: str, llm, rewrite_llm=None,
+                           delta_history: bool = False):
         try:
             if session_id not in self.vector_stores:
                 raise HTTPException(status_code=400, detail="No documents uploaded for this session")
             
-            retriever = self.vector_stores[session_id].as_retriever()
-            
-            # Set up prompts and chains
-            contextualize_q_prompt = ChatPromptTemplate.from_messages([
-                ("system", self._get_contextualize_prompt()),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ])
-            
-            history_aware_retriever = create_history_aware_retriever(
-                llm, 
-                retriever, 
-                contextualize_q_prompt
-            )
-
-            qa_prompt = ChatPromptTemplate.from_messages([
-                ("system", self._get_qa_prompt()),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ])
+            with span("history_load") as stage:
+                chat_history = self.chat_stores.create(session_id)
+                messages = chat_history.messages
+                prompt_history = self.history.window(session_id, messages)
+                stage.set(messages=len(messages), window=len(prompt_history))
+            rag_chain = self._get_rag_chain(session_id, llm, rewrite_llm)
             
-            question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-            rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+            response = await rag_chain.ainvoke({"input": message, "chat_history": prompt_history})
+            with span("history_save"):
+                chat_history.add_user_message(message)
+                chat_history.add_ai_message(response['answer'])
+            self.history.schedule_summary(session_id, chat_history, rewrite_llm or llm)
             
-            # Handle chat history
-            if session_id not in self.chat_stores:
-                self.chat_stores[session_id] = ChatMessageHistory()
-            
-            conversational_rag_chain = RunnableWithMessageHistory(
-                rag_chain,
-                lambda session: self.chat_stores[session],
-                input_messages_key="input",
-                history_messages_key="chat_history",
-                output_messages_key="answer"
-            )
-            
-            response = conversational_rag_chain.invoke(
-                {"input": message},
-                config={"configurable": {"session_id": session_id}},
-            )
-            
-            return response['answer'], self._format_history(session_id)
+            return response['answer'], self._format_history(session_id, start=len(messages) if delta_history else 0)
         
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    def stream_response(self, session_id: str, message: str, llm, rewrite_llm=None):
+        """Validate the session and return an async iterator of answer events."""
+        if session_id not in self.vector_stores:
+            raise HTTPException(status_code=400, detail="No documents uploaded for this session")
+        if session_id not in self.chat_stores:
+            self.chat_stores.create(session_id)
+        rag_chain = self._get_rag_chain(session_id, llm, rewrite_llm)
+        chat_history = self.chat_stores[session_id]
+        return stream_rag_chain(
+            rag_chain,
+            chat_history,
+            message,
+            prompt_history=self.history.window(session_id, chat_history.messages),
+            on_complete=lambda: self.history.schedule_summary(session_id, chat_history, rewrite_llm or llm)
+        )
+
+    def stream_batch_response(self, session_id: str, questions: List[str], llm, max_concurrency: int = None):
+        """Validate the session and return an async iterator of batch answer events; history is untouched."""
+        if session_id not in self.vector_stores:
+            raise HTTPException(status_code=400, detail="No documents uploaded for this session")
+        rag_chain = self._get_rag_chain(session_id, llm)
+        return stream_batch_answers(rag_chain, questions, max_concurrency)
+
+    def _get_rag_chain(self, session_id: str, llm, rewrite_llm=None):
+        rewrite_key = llm_cache_key(rewrite_llm) if rewrite_llm is not None else None
+        # The version changes whenever any worker re-indexes the session
+        version = self.vector_stores.version(session_id)
+        key = (session_id, self.bot_type, *llm_cache_key(llm), rewrite_key, version, "rag")
+        return self.chain_registry.get_or_create(
+            key, lambda: self._build_rag_chain(session_id, llm, rewrite_llm)
+        )
+
+    def _build_rag_chain(self, session_id: str, llm, rewrite_llm=None):
+        retriever = HybridRetriever(sources=self.vector_stores.sources(session_id))
+        
+        # Set up prompts and chains
+        contextualize_q_prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_contextualize_prompt()),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ])
+
+        qa_prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_qa_prompt()),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ])
+        
+        return RAGPipeline(
+            llm,
+            retriever,
+            contextualize_q_prompt,
+            qa_prompt,
+            answer_cache=self.answer_cache,
+            cache_scope=lambda: self._cache_scope(session_id),
+            rewrite_llm=rewrite_llm,
+            compressor=self.compressor
+        )
+
+    def _cache_scope(self, session_id: str):
+        fingerprint = self.vector_stores.fingerprint(session_id)
+        return f"{self.bot_type}:{fingerprint}" if fingerprint else None
+
     def _get_contextualize_prompt(self):
         return (
             "Given a chat history and the latest user question "
@@ -114,11 +216,22 @@ class PDFBot:
             "\n\n{context}"
         )
 
-    def _format_history(self, session_id: str):
+    def _format_history(self, session_id: str, start: int = 0):
+        """Serialize the transcript, or only the messages from index start onwards."""
         history = []
-        for msg in self.chat_stores[session_id].messages:
+        for msg in self.chat_stores[session_id].messages[start:]:
             history.append({
                 "role": "user" if msg.type == "human" else "assistant",
                 "content": msg.content
             })
-        return history
\ No newline at end of file
+        return history
+
+    async def attach_session(self, session_id: str, fingerprint: str):
+        """Point a session at the shared index another session's ingest built from the same files."""
+        if not await run_blocking(self.vector_stores.shared.retain, fingerprint):
+            raise KeyError(f"Shared index {fingerprint[:12]} no longer exists")
+        await run_blocking(self.vector_stores.attach, session_id, fingerprint)
+
+    def evict_idle(self) -> List[str]:
+        """Drop sessions idle past the timeout from memory; they stay on disk."""
+        return self.vector_stores.evict_idle() + self.chat_stores.evict_idle()
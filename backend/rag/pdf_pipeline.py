@@ -0,0 +1,185 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+from itertools import islice
+from typing import AsyncIterator, List, Optional, Union
+from langchain.schema import Document
+from pypdf import PdfReader
+from utils.concurrency import PROCESS_WORKERS, run_in_process, run_ingest
+from utils.logger import setup_logger
+from .jobs import ProgressCallback, no_progress
+
+# Set up logger
+logger = setup_logger(__name__)
+
+PAGES_PER_TASK = 16
+MAX_TASKS_IN_FLIGHT = max(2, PROCESS_WORKERS * 2)
+
+# In-memory PDF content, or the path of a spooled upload
+PDFSource = Union[bytes, str]
+
+
+def _open_pdf(content: PDFSource) -> PdfReader:
+    # A path is opened by the worker process itself, so only the path is pickled
+    return PdfReader(io.BytesIO(content) if isinstance(content, bytes) else content)
+
+
+def _spool_pdf(content: bytes) -> str:
+    """Write in-memory PDF content to a temporary file, returning its path."""
+    fd, path = tempfile.mkstemp(prefix="omnilearn-", suffix=".pdf")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def count_pages(content: PDFSource) -> int:
+    return len(_open_pdf(content).pages)
+
+
+def parse_page_range(content: PDFSource, start: int, end: int, source: str) -> List[Document]:
+    """Extract pages [start, end) of a PDF (runs in a worker process)."""
+    reader = _open_pdf(content)
+    total_pages = len(reader.pages)
+    documents = []
+    for page_number in range(start, min(end, total_pages)):
+        text = reader.pages[page_number].extract_text() or ""
+        if text.strip():
+            documents.append(Document(
+                page_content=text,
+                metadata={"source": source, "page": page_number, "total_pages": total_pages},
+            ))
+    return documents
+
+
+def parsed_pages_path(path: str) -> str:
+    """Sidecar file holding the pre-parsed pages of a spooled PDF."""
+    return f"{path}.pages.jsonl"
+
+
+def _write_pages(f, pages: List[Document]):
+    for page in pages:
+        f.write(json.dumps({"page_content": page.page_content, "metadata": page.metadata}) + "\n")
+
+
+def _read_pages(f, count: int) -> List[Document]:
+    return [Document(**json.loads(line)) for line in islice(f, count)]
+
+
+def _count_lines(path: str) -> int:
+    with open(path, encoding='utf-8') as f:
+        return sum(1 for _ in f)
+
+
+async def preparse_pdf(path: str, filename: str):
+    """
+    Parse a spooled PDF ahead of ingestion into its pages sidecar.
+
+    Runs as soon as an upload completes, while the client may still be
+    sending other files. The sidecar only appears once it is complete, so a
+    reader never sees a partial one.
+    """
+    target = parsed_pages_path(path)
+    partial = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(partial, 'w', encoding='utf-8') as f:
+            async for pages in stream_pdf_pages([path], [filename]):
+                await run_ingest(_write_pages, f, pages)
+        os.replace(partial, target)
+        logger.info(f"Pre-parsed {filename} while the upload was in progress")
+    except Exception as e:
+        logger.warning(f"Pre-parsing {filename} failed, it will be parsed at ingestion: {str(e)}")
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+async def stream_pdf_pages(
+    files: List[PDFSource],
+    filenames: Optional[List[str]] = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    max_in_flight: int = MAX_TASKS_IN_FLIGHT,
+    progress: ProgressCallback = no_progress,
+) -> AsyncIterator[List[Document]]:
+    """
+    Parse PDFs across the process pool and yield their pages in batches.
+
+    Every file is cut into page ranges that are parsed in parallel, with at
+    most max_in_flight ranges outstanding, so memory stays bounded by the
+    window rather than by the size of the upload. Batches are yielded as soon
+    as they are parsed, which lets the caller split and embed them while the
+    next ranges are still being parsed. Parsed pages are reported to
+    progress as the "parsed" stage.
+
+    Files may be given as in-memory bytes or as paths of spooled uploads;
+    spooled uploads that were already pre-parsed are read back from their
+    pages sidecar instead of being parsed again. In-memory files are written
+    to a temporary file first, so worker tasks receive a path and a page
+    range instead of a pickled copy of the whole PDF each.
+    """
+    filenames = filenames or [f"upload-{i + 1}.pdf" for i in range(len(files))]
+    spooled = []
+    try:
+        paths = []
+        for content in files:
+            if isinstance(content, bytes):
+                content = await run_ingest(_spool_pdf, content)
+                spooled.append(content)
+            paths.append(content)
+        async for pages in _stream_spooled_pages(paths, filenames, pages_per_task, max_in_flight, progress):
+            yield pages
+    finally:
+        for path in spooled:
+            os.remove(path)
+
+
+async def _stream_spooled_pages(files: List[str], filenames: List[str], pages_per_task: int, max_in_flight: int,
+                                progress: ProgressCallback) -> AsyncIterator[List[Document]]:
+    """stream_pdf_pages for files on disk."""
+    preparsed = [parsed_pages_path(path) for path in files if os.path.exists(parsed_pages_path(path))]
+    to_parse = [
+        (path, filename) for path, filename in zip(files, filenames)
+        if parsed_pages_path(path) not in preparsed
+    ]
+    preparsed_counts = [await run_ingest(_count_lines, path) for path in preparsed]
+    page_counts = await asyncio.gather(*(run_in_process(count_pages, path) for path, _ in to_parse))
+    total_pages = sum(page_counts) + sum(preparsed_counts)
+    logger.info(
+        f"Parsing {len(to_parse)} PDFs with {total_pages - sum(preparsed_counts)} pages "
+        f"({len(preparsed)} more already pre-parsed)"
+    )
+    progress("parsed", 0, total_pages)
+
+    parsed_pages = 0
+    for path in preparsed:
+        with open(path, encoding='utf-8') as f:
+            while True:
+                pages = await run_ingest(_read_pages, f, pages_per_task)
+                if not pages:
+                    break
+                parsed_pages += len(pages)
+                progress("parsed", parsed_pages, total_pages)
+                yield pages
+
+    ranges = (
+        (path, start, min(start + pages_per_task, page_count), filename)
+        for (path, filename), page_count in zip(to_parse, page_counts)
+        for start in range(0, page_count, pages_per_task)
+    )
+
+    pending = {}
+    for task_args in ranges:
+        future = asyncio.ensure_future(run_in_process(parse_page_range, *task_args))
+        pending[future] = task_args[2] - task_args[1]
+        if len(pending) >= max_in_flight:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                parsed_pages += pending.pop(future)
+                progress("parsed", parsed_pages, total_pages)
+                yield future.result()
+    while pending:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            parsed_pages += pending.pop(future)
+            progress("parsed", parsed_pages, total_pages)
+            yield future.result()
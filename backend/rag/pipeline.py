@@ -0,0 +1,242 @@
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from langchain_core.output_parsers import StrOutputParser
+from utils.concurrency import run_blocking
+from utils.logger import setup_logger
+from utils.tracing import span
+from .history import estimate_tokens
+from .query_rewrite import REWRITE, choose_rewrite_path
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# Largest batch of questions accepted in one request
+BATCH_MAX_QUESTIONS = int(os.environ.get("OMNILEARN_BATCH_MAX_QUESTIONS", 100))
+# Upper bound on simultaneous LLM calls for one batch of questions
+BATCH_MAX_CONCURRENCY = int(os.environ.get("OMNILEARN_BATCH_MAX_CONCURRENCY", 8))
+
+
+def normalize_question(question: str) -> str:
+    """Key under which repeated questions in a batch are answered once."""
+    return " ".join(question.lower().split())
+
+
+class RAGPipeline:
+    """
+    Conversational retrieval chain with explicit steps.
+
+    Equivalent to create_history_aware_retriever + create_retrieval_chain:
+    the latest message is condensed into a standalone question using the chat
+    history, that question drives retrieval, and the answer is generated from
+    the retrieved context, the history and the original message. Keeping the
+    steps separate lets the standalone question be checked against the
+    semantic answer cache before any retrieval or generation happens.
+
+    The rewrite is skipped on the first turn and for questions that already
+    read as standalone; when it is needed it runs on rewrite_llm if one is
+    given, so a small fast model can do it instead of the answering model.
+
+    With a compressor, the retrieved chunks are cut down to the sentences
+    most relevant to the standalone question before they go into the answer
+    prompt; the sources reported to the client are the full chunks.
+
+    Each step runs in a tracing span (rewrite, cache_lookup, retrieve,
+    compress, prompt, generate) carrying its document, byte and token counts.
+    """
+
+    def __init__(self, llm, retriever, contextualize_prompt, qa_prompt,
+                 answer_cache=None, cache_scope: Optional[Callable[[], Optional[str]]] = None,
+                 rewrite_llm=None, compressor=None):
+        self.retriever = retriever
+        self.rewrite_chain = contextualize_prompt | (rewrite_llm or llm) | StrOutputParser()
+        self.rewrite_model = getattr(rewrite_llm or llm, "model_name", None) or type(rewrite_llm or llm).__name__
+        self.llm = llm
+        self.qa_prompt = qa_prompt
+        self.answer_cache = answer_cache
+        self.cache_scope = cache_scope
+        self.compressor = compressor
+
+    async def condense(self, message: str, chat_history) -> str:
+        """Return a standalone version of the message."""
+        path = choose_rewrite_path(message, chat_history)
+        if path != REWRITE:
+            logger.info(f"Question rewrite path: {path} (skipped)")
+            return message
+        start = time.perf_counter()
+        with span("rewrite", model=self.rewrite_model) as stage:
+            question = await self.rewrite_chain.ainvoke({"input": message, "chat_history": chat_history})
+            stage.set(
+                tokens_in=estimate_tokens(message) + sum(estimate_tokens(str(m.content)) for m in chat_history),
+                tokens_out=estimate_tokens(question),
+            )
+        logger.info(
+            f"Question rewrite path: {path} on {self.rewrite_model} "
+            f"({(time.perf_counter() - start) * 1000:.0f} ms)"
+        )
+        return question
+
+    def _scope(self) -> Optional[str]:
+        if self.answer_cache is None or self.cache_scope is None:
+            return None
+        return self.cache_scope()
+
+    async def _cached_answer(self, scope: Optional[str], question: str) -> Optional[str]:
+        if scope is None:
+            return None
+        with span("cache_lookup") as stage:
+            answer = await run_blocking(self.answer_cache.lookup, scope, question)
+            stage.set(hit=answer is not None)
+        return answer
+
+    async def _retrieve(self, question: str):
+        with span("retrieve") as stage:
+            context = await self.retriever.ainvoke(question)
+            stage.set(documents=len(context), bytes=sum(len(doc.page_content.encode('utf-8')) for doc in context))
+        return context
+
+    async def _prompt(self, message: str, chat_history, context, question: Optional[str] = None):
+        """Stuff the retrieved documents, compressed against question, into the answer prompt."""
+        if self.compressor is not None and context:
+            with span("compress", documents=len(context)) as stage:
+                context, report = await run_blocking(self.compressor.compress, question or message, context)
+                stage.set(**report)
+        with span("prompt", documents=len(context)) as stage:
+            context_text = "\n\n".join(doc.page_content for doc in context)
+            prompt = await self.qa_prompt.ainvoke(
+                {"input": message, "chat_history": chat_history, "context": context_text}
+            )
+            stage.set(
+                bytes=len(context_text.encode('utf-8')),
+                tokens_in=sum(estimate_tokens(str(m.content)) for m in prompt.to_messages()),
+            )
+        return prompt
+
+    @staticmethod
+    def _record_usage(stage, prompt, answer: str, usage):
+        """Token counts reported by the provider, or estimates when it reports none."""
+        if usage:
+            stage.set(tokens_in=usage.get("input_tokens", 0), tokens_out=usage.get("output_tokens", 0))
+        else:
+            stage.set(
+                tokens_in=sum(estimate_tokens(str(m.content)) for m in prompt.to_messages()),
+                tokens_out=estimate_tokens(answer),
+            )
+
+    async def _remember(self, scope: Optional[str], question: str, answer: str):
+        if scope is not None and answer:
+            await run_blocking(self.answer_cache.store, scope, question, answer)
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        message = inputs["input"]
+        chat_history = inputs.get("chat_history", [])
+        question = await self.condense(message, chat_history)
+
+        scope = self._scope()
+        cached = await self._cached_answer(scope, question)
+        if cached is not None:
+            return {"input": message, "question": question, "context": [], "answer": cached, "cached": True}
+
+        context = await self._retrieve(question)
+        prompt = await self._prompt(message, chat_history, context, question)
+        with span("generate") as stage:
+            response = await self.llm.ainvoke(prompt)
+            answer = StrOutputParser().invoke(response)
+            self._record_usage(stage, prompt, answer, getattr(response, "usage_metadata", None))
+        await self._remember(scope, question, answer)
+        return {"input": message, "question": question, "context": context, "answer": answer, "cached": False}
+
+    async def astream(self, inputs: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the standalone question, then the retrieved context, then answer chunks."""
+        message = inputs["input"]
+        chat_history = inputs.get("chat_history", [])
+        question = await self.condense(message, chat_history)
+        yield {"question": question}
+
+        scope = self._scope()
+        cached = await self._cached_answer(scope, question)
+        if cached is not None:
+            yield {"context": [], "cached": True}
+            yield {"answer": cached}
+            return
+
+        context = await self._retrieve(question)
+        yield {"context": context}
+        prompt = await self._prompt(message, chat_history, context, question)
+        answer_parts = []
+        usage = None
+        with span("generate") as stage:
+            async for chunk in self.llm.astream(prompt):
+                if not answer_parts:
+                    stage.set(first_token_ms=(time.perf_counter() - stage.start) * 1000)
+                if getattr(chunk, "usage_metadata", None):
+                    usage = chunk.usage_metadata
+                token = StrOutputParser().invoke(chunk)
+                if token:
+                    answer_parts.append(token)
+                    yield {"answer": token}
+            self._record_usage(stage, prompt, "".join(answer_parts), usage)
+        await self._remember(scope, question, "".join(answer_parts))
+
+    async def abatch_answers(self, questions: List[str],
+                             max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer independent questions, yielding each result as soon as it is ready.
+
+        Batch questions carry no chat history, so there is nothing to rewrite.
+        Repeated questions are answered once, cached answers are returned
+        first, retrieval for the rest runs as one batch (one embedding call,
+        shared chunks loaded once), and generation runs through the LLM's
+        batch API with at most max_concurrency calls in flight. Results carry
+        the index of the question they answer; a failed generation yields an
+        "error" for its questions instead of failing the batch.
+        """
+        positions: Dict[str, List[int]] = {}
+        for index, question in enumerate(questions):
+            positions.setdefault(normalize_question(question), []).append(index)
+        unique = [questions[indexes[0]] for indexes in positions.values()]
+        logger.info(f"Answering a batch of {len(questions)} questions ({len(unique)} distinct)")
+
+        def results(question: str, **result):
+            return [
+                {"index": index, "question": questions[index], **result}
+                for index in positions[normalize_question(question)]
+            ]
+
+        scope = self._scope()
+        pending = []
+        for question in unique:
+            cached = await self._cached_answer(scope, question)
+            if cached is None:
+                pending.append(question)
+                continue
+            for result in results(question, context=[], answer=cached, cached=True):
+                yield result
+        if not pending:
+            return
+
+        with span("retrieve", questions=len(pending)) as stage:
+            contexts = await run_blocking(self.retriever.retrieve_many, pending)
+            stage.set(documents=sum(len(context) for context in contexts))
+        prompts = [await self._prompt(question, [], context) for question, context in zip(pending, contexts)]
+
+        with span("generate", questions=len(pending)) as stage:
+            tokens_in = tokens_out = 0
+            async for position, response in self.llm.abatch_as_completed(
+                prompts, config={"max_concurrency": max(1, min(max_concurrency, BATCH_MAX_CONCURRENCY))},
+                return_exceptions=True
+            ):
+                question = pending[position]
+                if isinstance(response, Exception):
+                    logger.warning(f"Batch question failed: {str(response)}")
+                    for result in results(question, error=str(response)):
+                        yield result
+                    continue
+                answer = StrOutputParser().invoke(response)
+                usage = getattr(response, "usage_metadata", None) or {}
+                tokens_in += usage.get("input_tokens", 0)
+                tokens_out += usage.get("output_tokens", 0) or estimate_tokens(answer)
+                await self._remember(scope, question, answer)
+                for result in results(question, context=contexts[position], answer=answer, cached=False):
+                    yield result
+            stage.set(tokens_in=tokens_in, tokens_out=tokens_out)
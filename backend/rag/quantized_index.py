@@ -0,0 +1,225 @@
+import json
+import mmap
+import os
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# Candidates scored exactly per requested result, taken from the int8 scan
+QUANTIZED_RERANK_FACTOR = int(os.environ.get("OMNILEARN_QUANTIZED_RERANK_FACTOR", 4))
+# Rows dequantized at a time while scanning, bounding the scratch memory of a search
+SCAN_BLOCK_ROWS = 16384
+INDEX_FORMAT_VERSION = 1
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class QuantizedVectorStore:
+    """
+    Read-only vector index with int8 vectors and chunk texts in memory-mapped files.
+
+    Vectors are normalized and quantized per row to int8 with a float32
+    scale, a quarter of the float32 size. A search scans the int8 matrix
+    block by block for approximate cosine scores, then re-ranks the best
+    k * rerank_factor candidates exactly against the float32 vectors,
+    of which only the candidate rows are read. Chunk texts and
+    metadata sit in one records file and are read only for the hits, so
+    resident memory is the page cache the OS chooses to keep plus the ID
+    table and per-row scales.
+
+    Exposes the parts of the Chroma vector store interface the retriever,
+    the BM25 rebuild and ingestion use. An index is written once (add
+    documents, then seal()) and never modified afterwards, which is how
+    shared indexes are used.
+
+    Files in the index directory:
+        vectors.f32    float32 rows, normalized (exact re-ranking, copies)
+        vectors.i8.npy int8 rows
+        scales.npy     float32 scale per row
+        records.bin    JSON {"text", "metadata"} per row, back to back
+        offsets.npy    int64 byte offsets into records.bin (count + 1)
+        ids.json       chunk IDs by row
+        index.json     count and dimension; written last, marks the index sealed
+    """
+
+    rerank_factor = QUANTIZED_RERANK_FACTOR
+
+    def __init__(self, path: str, embeddings):
+        self.path = path
+        self.embeddings = embeddings
+        self._writing = False
+        self._load()
+
+    @classmethod
+    def create(cls, path: str, embeddings) -> "QuantizedVectorStore":
+        """Start a new, empty index at path, replacing anything left there."""
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        store = cls.__new__(cls)
+        store.path = path
+        store.embeddings = embeddings
+        store._writing = True
+        store._ids: List[str] = []
+        store._record_offsets = [0]
+        store._dim: Optional[int] = None
+        store._vector_file = open(os.path.join(path, "vectors.f32"), 'wb')
+        store._record_file = open(os.path.join(path, "records.bin"), 'wb')
+        return store
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        with open(self._file("index.json")) as f:
+            info = json.load(f)
+        self.count = info["count"]
+        self._dim = info["dim"]
+        with open(self._file("ids.json")) as f:
+            self._ids = json.load(f)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._scales = np.load(self._file("scales.npy"))
+        self._offsets = np.load(self._file("offsets.npy"), mmap_mode='r')
+        if self.count:
+            self._int8 = np.load(self._file("vectors.i8.npy"), mmap_mode='r')
+            self._float32 = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode='r',
+                                      shape=(self.count, self._dim))
+            with open(self._file("records.bin"), 'rb') as f:
+                self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Writing
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        ids = ids or [uuid.uuid4().hex for _ in documents]
+        texts = [doc.page_content for doc in documents]
+        self.add_embedded(ids, texts, [doc.metadata for doc in documents], self.embeddings.embed_documents(texts))
+        return ids
+
+    def add_embedded(self, ids: List[str], documents: List[str], metadatas: List[Optional[Dict]], embeddings):
+        """Append chunks whose embeddings are already known."""
+        if not self._writing:
+            raise RuntimeError(f"Quantized index {self.path} is sealed")
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        self._vector_file.write(vectors.tobytes())
+        for text, metadata in zip(documents, metadatas):
+            record = json.dumps({"text": text, "metadata": metadata or {}}).encode('utf-8')
+            self._record_file.write(record)
+            self._record_offsets.append(self._record_offsets[-1] + len(record))
+        self._ids.extend(ids)
+
+    def seal(self):
+        """Quantize the vectors, write the lookup files and reopen the index read-only."""
+        self._vector_file.close()
+        self._record_file.close()
+        count, dim = len(self._ids), self._dim or 0
+        scales = np.zeros(count, dtype=np.float32)
+        if count:
+            vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode='r', shape=(count, dim))
+            quantized = np.lib.format.open_memmap(self._file("vectors.i8.npy"), mode='w+', dtype=np.int8,
+                                                  shape=(count, dim))
+            for start in range(0, count, SCAN_BLOCK_ROWS):
+                block = vectors[start:start + SCAN_BLOCK_ROWS]
+                block_scales = np.abs(block).max(axis=1) / 127.0
+                block_scales[block_scales == 0] = 1.0
+                quantized[start:start + len(block)] = np.round(block / block_scales[:, None]).astype(np.int8)
+                scales[start:start + len(block)] = block_scales
+            quantized.flush()
+            del quantized, vectors
+        np.save(self._file("scales.npy"), scales)
+        np.save(self._file("offsets.npy"), np.asarray(self._record_offsets, dtype=np.int64))
+        with open(self._file("ids.json"), 'w') as f:
+            json.dump(self._ids, f)
+        with open(self._file("index.json"), 'w') as f:
+            json.dump({"version": INDEX_FORMAT_VERSION, "count": count, "dim": dim}, f)
+        self._writing = False
+        self._load()
+        logger.info(f"Sealed quantized index with {count} chunks at: {self.path}")
+
+    # Reading
+
+    def _document(self, row: int) -> Document:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        record = json.loads(self._records[start:end])
+        return Document(page_content=record["text"], metadata=record["metadata"], id=self._ids[row])
+
+    def _select_relevance_score_fn(self):
+        return VectorStore._euclidean_relevance_score_fn
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4, **kwargs):
+        """
+        The k nearest chunks with their distances, like the Chroma method of the same name.
+
+        Distances are squared L2 distances between the normalized vectors, as
+        Chroma's default space reports them, so relevance thresholds mean the
+        same with either index.
+        """
+        if not self.count:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        approximate = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCAN_BLOCK_ROWS):
+            block = self._int8[start:start + SCAN_BLOCK_ROWS]
+            approximate[start:start + len(block)] = (block @ query) * self._scales[start:start + len(block)]
+
+        candidates = min(self.count, max(k, k * self.rerank_factor))
+        rows = np.argpartition(-approximate, candidates - 1)[:candidates]
+        # Ascending rows turn the float32 reads into a forward sweep over the file
+        rows.sort()
+        exact = self._float32[rows] @ query
+        best = np.argsort(-exact)[:k]
+        return [(self._document(int(rows[i])), float(2.0 - 2.0 * exact[i])) for i in best]
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict[str, Any]:
+        """Chunks by ID, or a page of all chunks, in the shape Chroma returns."""
+        include = include or ["documents", "metadatas"]
+        if ids is not None:
+            rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        else:
+            start = offset or 0
+            rows = list(range(start, min(self.count, start + limit) if limit else self.count))
+        documents = [self._document(row) for row in rows] if {"documents", "metadatas"} & set(include) else []
+        result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [doc.page_content for doc in documents]
+        if "metadatas" in include:
+            result["metadatas"] = [doc.metadata for doc in documents]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self._float32[rows]) if rows else np.empty((0, self._dim or 0))
+        return result
+
+
+class QuantizedIndexes:
+    """Shared indexes stored as quantized, memory-mapped directories under root."""
+
+    def __init__(self, root: str, embeddings):
+        self.root = root
+        self.embeddings = embeddings
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def create(self, name: str, metadata: Optional[Dict] = None) -> QuantizedVectorStore:
+        return QuantizedVectorStore.create(self._path(name), self.embeddings)
+
+    def open(self, name: str) -> QuantizedVectorStore:
+        return QuantizedVectorStore(self._path(name), self.embeddings)
+
+    def seal(self, vector_store: QuantizedVectorStore):
+        vector_store.seal()
+
+    def delete(self, name: str):
+        # Workers with the index open keep their mappings until they drop it
+        shutil.rmtree(self._path(name), ignore_errors=True)
@@ -0,0 +1,55 @@
+import os
+import re
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+REWRITE_HEURISTIC_ENABLED = os.environ.get("OMNILEARN_REWRITE_HEURISTIC", "1") == "1"
+
+FIRST_TURN = "first_turn"
+STANDALONE = "standalone"
+REWRITE = "rewrite"
+
+_WORD_RE = re.compile(r"[a-z0-9_']+")
+# Words that point back at something said earlier in the conversation
+REFERENCE_TERMS = {
+    "it", "its", "it's", "this", "that", "these", "those", "they", "them", "their", "theirs",
+    "he", "him", "his", "she", "her", "hers", "one", "ones", "former", "latter", "above",
+    "previous", "previously", "earlier", "before", "same", "again", "else", "further",
+    "more", "another", "other", "also", "too", "instead", "there", "then", "such",
+}
+# Openings that only make sense as a continuation
+FOLLOW_UP_OPENINGS = (
+    "and ", "but ", "so ", "also ", "what about", "how about", "why not", "what else",
+    "then ", "ok ", "okay ", "now ", "same ", "elaborate", "explain more", "tell me more",
+    "go on", "continue", "expand",
+)
+MIN_STANDALONE_WORDS = 4
+
+
+def is_standalone(message: str) -> bool:
+    """
+    Cheap check for questions that can be answered without the chat history.
+
+    A question is treated as standalone when it has enough words to carry its
+    own subject, does not open like a continuation and contains no pronoun or
+    back-reference. The check is deliberately conservative: anything doubtful
+    goes through the rewrite.
+    """
+    text = message.strip().lower()
+    words = _WORD_RE.findall(text)
+    if len(words) < MIN_STANDALONE_WORDS:
+        return False
+    if text.startswith(FOLLOW_UP_OPENINGS):
+        return False
+    return not any(word in REFERENCE_TERMS for word in words)
+
+
+def choose_rewrite_path(message: str, chat_history) -> str:
+    """Return FIRST_TURN, STANDALONE or REWRITE for the latest message."""
+    if not chat_history:
+        return FIRST_TURN
+    if REWRITE_HEURISTIC_ENABLED and is_standalone(message):
+        return STANDALONE
+    return REWRITE
@@ -0,0 +1,336 @@
+import fnmatch
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set
+from urllib.parse import urlparse
+from langchain.schema import Document
+from utils.concurrency import interprocess_lock
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# File types worth indexing for question answering over a codebase
+DEFAULT_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".go", ".rs", ".rb",
+    ".php", ".c", ".h", ".cpp", ".hpp", ".cc", ".cs", ".swift", ".scala",
+    ".sh", ".sql", ".html", ".css", ".scss", ".vue", ".md", ".rst", ".txt",
+    ".json", ".yaml", ".yml", ".toml", ".ini", ".cfg",
+}
+DEFAULT_FILENAMES = {"Dockerfile", "Makefile", "README", "LICENSE"}
+MAX_FILE_SIZE = 512 * 1024  # bytes
+ALWAYS_SKIPPED_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv"}
+# Local paths below this directory may be ingested in place; unset, only git remotes are accepted
+LOCAL_REPOSITORY_ROOT = os.environ.get("OMNILEARN_LOCAL_REPOSITORY_ROOT")
+REMOTE_SCHEMES = {"http", "https", "ssh"}
+# scp-like ssh remotes, e.g. git@github.com:owner/repo.git
+_SCP_LIKE_RE = re.compile(r"^(?P<user>[\w.-]+)@(?P<host>[A-Za-z0-9][\w.-]*):(?P<path>.+)$")
+
+
+def is_remote_url(source: str) -> bool:
+    """Return True for http(s) and ssh git remotes."""
+    if _SCP_LIKE_RE.match(source):
+        return True
+    parsed = urlparse(source)
+    return (
+        parsed.scheme.lower() in REMOTE_SCHEMES
+        and bool(parsed.hostname)
+        and not parsed.hostname.startswith('-')
+    )
+
+
+def normalize_repository_url(source: str) -> str:
+    """
+    Canonical form of a repository source, used to key checkouts and ingests.
+
+    Scheme and host are lower-cased, scp-like remotes become ssh:// URLs and
+    a trailing slash or .git is dropped; local paths are made absolute.
+    """
+    match = _SCP_LIKE_RE.match(source)
+    if match:
+        source = f"ssh://{match['user']}@{match['host']}/{match['path']}"
+    parsed = urlparse(source)
+    if parsed.scheme.lower() in REMOTE_SCHEMES:
+        path = parsed.path.rstrip('/')
+        path = path[:-4] if path.endswith(".git") else path
+        return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}"
+    return os.path.realpath(source)
+
+
+def check_repository_source(source: str, local_root: Optional[str] = None) -> str:
+    """
+    Validate a repository source sent by a client.
+
+    Git remotes are always accepted. A local path only when local_root (by
+    default OMNILEARN_LOCAL_REPOSITORY_ROOT) is configured and the path is a
+    directory inside it, symlinks resolved.
+
+    Returns:
+        str: The source to clone or read
+
+    Raises:
+        ValueError: For anything else
+    """
+    if is_remote_url(source):
+        return source
+    local_root = LOCAL_REPOSITORY_ROOT if local_root is None else local_root
+    if not local_root:
+        raise ValueError("Only http(s) and ssh git repository URLs are accepted")
+    root = os.path.realpath(local_root)
+    path = os.path.realpath(source)
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        raise ValueError("Local repositories must be directories under the configured repository root")
+    return path
+
+
+def _is_bare_repository(path: str) -> bool:
+    try:
+        result = subprocess.run(
+            ["git", "-C", path, "rev-parse", "--is-bare-repository"],
+            capture_output=True, text=True, check=True,
+        )
+        return result.stdout.strip() == "true"
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+def get_checkout_name(source: str) -> str:
+    """
+    Build a stable directory name for a repository source.
+
+    The owner-repo part is only for humans; the hash of the normalized URL
+    keeps repositories of the same name on different hosts, or forks, apart.
+    """
+    normalized = normalize_repository_url(source)
+    path_parts = urlparse(normalized).path.rstrip('/').split('/')
+    readable = re.sub(r"[^\w.-]", "_", '-'.join(part for part in path_parts[-2:] if part)) or "repository"
+    digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+    return f"{readable}-{digest}"
+
+
+def _origin_url(dest: str) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "-C", dest, "remote", "get-url", "origin"],
+                                capture_output=True, text=True, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    return result.stdout.strip()
+
+
+def clone_repository(source: str, dest: str) -> str:
+    """
+    Shallow-clone a repository into dest, or fast-forward the checkout already there.
+
+    A checkout whose origin is not the source (or that is broken) is removed
+    and cloned again. Callers hold the checkout lock, see checkout_repository.
+
+    Args:
+        source (str): Remote URL or path of a bare repository
+        dest (str): Directory of the working tree
+
+    Returns:
+        str: Path of the working tree
+    """
+    if os.path.isdir(os.path.join(dest, ".git")):
+        origin = _origin_url(dest)
+        if origin is not None and normalize_repository_url(origin) == normalize_repository_url(source):
+            logger.info(f"Updating existing checkout at: {dest}")
+            subprocess.run(["git", "-C", dest, "fetch", "--depth", "1", "origin"],
+                           capture_output=True, text=True, check=True)
+            subprocess.run(["git", "-C", dest, "reset", "--hard", "FETCH_HEAD"],
+                           capture_output=True, text=True, check=True)
+            return dest
+        logger.warning(f"Checkout at {dest} does not track {source}, cloning it again")
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+
+    logger.info(f"Cloning {source} into: {dest}")
+    subprocess.run(["git", "clone", "--depth", "1", "--", source, dest],
+                   capture_output=True, text=True, check=True)
+    return dest
+
+
+@contextmanager
+def checkout_repository(source: str, checkout_dir: str, local_root: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield a local working tree for the source, cloning or updating it first.
+
+    Remote and bare repositories are checked out under checkout_dir and
+    locked, across workers too, until the caller is done: a concurrent ingest
+    of the same repository cannot fetch or reset the tree while it is read.
+    Local working trees inside the allowed root are read in place.
+
+    Raises:
+        ValueError: When the source is not an accepted repository
+    """
+    source = check_repository_source(source, local_root)
+    if not is_remote_url(source) and not _is_bare_repository(source):
+        logger.debug(f"Reading local repository in place: {source}")
+        yield source
+        return
+
+    os.makedirs(checkout_dir, exist_ok=True)
+    dest = os.path.join(checkout_dir, get_checkout_name(source))
+    with interprocess_lock(dest + ".lock"):
+        yield clone_repository(source, dest)
+
+
+class GitIgnoreMatcher:
+    """Minimal .gitignore matcher for trees that are not git checkouts."""
+
+    def __init__(self):
+        self.rules = []  # (base_dir, pattern, negated, dir_only, anchored)
+
+    def add_file(self, base_dir: str, gitignore_path: str):
+        try:
+            with open(gitignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = '/' in line
+            self.rules.append((base_dir, line.lstrip('/'), negated, dir_only, anchored))
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for base_dir, pattern, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base_dir:
+                if not rel_path.startswith(base_dir + '/'):
+                    continue
+                candidate = rel_path[len(base_dir) + 1:]
+            else:
+                candidate = rel_path
+            if anchored:
+                matched = fnmatch.fnmatch(candidate, pattern)
+            else:
+                matched = fnmatch.fnmatch(os.path.basename(candidate), pattern)
+            if matched:
+                ignored = not negated
+        return ignored
+
+
+def _list_git_files(root: str) -> Optional[List[str]]:
+    """List tracked and untracked-but-not-ignored files using git itself."""
+    if not os.path.exists(os.path.join(root, ".git")):
+        return None
+    try:
+        result = subprocess.run(
+            ["git", "-C", root, "ls-files", "--cached", "--others", "--exclude-standard", "-z"],
+            capture_output=True, check=True,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        logger.warning(f"git ls-files failed, falling back to directory walk: {str(e)}")
+        return None
+    return [p for p in result.stdout.decode('utf-8', errors='ignore').split('\0') if p]
+
+
+def _walk_files(root: str) -> Iterator[str]:
+    """Walk a plain directory tree, honoring nested .gitignore files."""
+    matcher = GitIgnoreMatcher()
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir
+        if '.gitignore' in filenames:
+            matcher.add_file(rel_dir, os.path.join(dirpath, '.gitignore'))
+
+        kept_dirs = []
+        for dirname in sorted(dirnames):
+            rel_path = f"{rel_dir}/{dirname}" if rel_dir else dirname
+            if dirname in ALWAYS_SKIPPED_DIRS or matcher.is_ignored(rel_path, is_dir=True):
+                continue
+            kept_dirs.append(dirname)
+        dirnames[:] = kept_dirs
+
+        for filename in sorted(filenames):
+            rel_path = f"{rel_dir}/{filename}" if rel_dir else filename
+            if not matcher.is_ignored(rel_path, is_dir=False):
+                yield rel_path
+
+
+def _is_regular_file_inside(root: str, rel_path: str) -> bool:
+    """False for symlinks and for paths that resolve outside the working tree, e.g. through a linked directory."""
+    full_path = os.path.join(root, rel_path)
+    if os.path.islink(full_path):
+        return False
+    real_root = os.path.realpath(root)
+    return os.path.commonpath([real_root, os.path.realpath(full_path)]) == real_root
+
+
+def iter_repository_files(
+    root: str,
+    extensions: Optional[Set[str]] = None,
+    max_file_size: int = MAX_FILE_SIZE,
+) -> Iterator[str]:
+    """
+    Yield repository-relative paths of indexable files.
+
+    Args:
+        root (str): Working tree to scan
+        extensions (set): Allowed file extensions, defaults to DEFAULT_EXTENSIONS
+        max_file_size (int): Files larger than this many bytes are skipped
+    """
+    extensions = DEFAULT_EXTENSIONS if extensions is None else extensions
+    git_files = _list_git_files(root)
+    candidates = git_files if git_files is not None else _walk_files(root)
+
+    for rel_path in candidates:
+        parts = rel_path.split('/')
+        if any(part in ALWAYS_SKIPPED_DIRS for part in parts[:-1]):
+            continue
+        name = parts[-1]
+        if os.path.splitext(name)[1].lower() not in extensions and name not in DEFAULT_FILENAMES:
+            continue
+        # A tracked symlink such as leak.txt -> /etc/hostname must never be read
+        if not _is_regular_file_inside(root, rel_path):
+            logger.debug(f"Skipping {rel_path} (symlink or outside the working tree)")
+            continue
+        full_path = os.path.join(root, rel_path)
+        try:
+            size = os.path.getsize(full_path)
+        except OSError:
+            continue
+        if size == 0 or size > max_file_size:
+            logger.debug(f"Skipping {rel_path} ({size} bytes)")
+            continue
+        yield rel_path
+
+
+def read_repository_file(root: str, rel_path: str) -> Optional[str]:
+    """Read a text file, returning None for binary content, symlinks and paths outside root."""
+    if not _is_regular_file_inside(root, rel_path):
+        return None
+    with open(os.path.join(root, rel_path), 'rb') as f:
+        raw = f.read()
+    if b'\0' in raw[:8192]:
+        return None
+    return raw.decode('utf-8', errors='ignore')
+
+
+def load_repository_documents(
+    root: str,
+    extensions: Optional[Set[str]] = None,
+    max_file_size: int = MAX_FILE_SIZE,
+) -> Iterator[Document]:
+    """Stream one Document per indexable file with its path as metadata."""
+    for rel_path in iter_repository_files(root, extensions, max_file_size):
+        text = read_repository_file(root, rel_path)
+        if not text or not text.strip():
+            continue
+        yield Document(
+            page_content=text,
+            metadata={"source": rel_path, "path": os.path.join(root, rel_path)},
+        )
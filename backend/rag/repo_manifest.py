@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+
+def hash_content(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_chunk_id(rel_path: str, content_hash: str, index: int) -> str:
+    """Deterministic ID for the index-th chunk of a file revision."""
+    return hashlib.sha1(f"{rel_path}\0{content_hash}\0{index}".encode('utf-8')).hexdigest()
+
+
+def fingerprint_file_hashes(file_hashes: Dict[str, str]) -> str:
+    """Hash of a file set given as path -> content hash, independent of order."""
+    return hash_content("\n".join(f"{path}\0{content_hash}" for path, content_hash in sorted(file_hashes.items())))
+
+
+class RepositoryManifest:
+    """
+    Per-file record of what has been indexed for one repository.
+
+    Maps each repository-relative path to the hash of the content that was
+    embedded and the IDs of the chunks it produced, so a refresh only has to
+    touch files whose hash changed.
+    """
+
+    def __init__(self, repository: str, files: Optional[Dict[str, Dict]] = None):
+        self.repository = repository
+        self.files = files or {}
+
+    def file_hash(self, rel_path: str) -> Optional[str]:
+        entry = self.files.get(rel_path)
+        return entry["hash"] if entry else None
+
+    def chunk_ids(self, rel_path: str) -> List[str]:
+        entry = self.files.get(rel_path)
+        return list(entry["chunk_ids"]) if entry else []
+
+    def set_file(self, rel_path: str, content_hash: str, chunk_ids: List[str]):
+        self.files[rel_path] = {"hash": content_hash, "chunk_ids": chunk_ids}
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"repository": self.repository, "files": self.files}, f)
+        os.replace(tmp_path, path)
+        logger.debug(f"Manifest with {len(self.files)} files saved to: {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["RepositoryManifest"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(data["repository"], data["files"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable manifest {path}: {str(e)}")
+            return None
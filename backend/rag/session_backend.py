@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# "sqlite:///path/to/state.db" (default: <data dir>/state.sqlite3) or "redis://host:port/db"
+SESSION_BACKEND_URL = os.environ.get("OMNILEARN_SESSION_BACKEND", "")
+
+
+class SQLiteBackend:
+    """
+    Shared key-value state in a SQLite file, with a subset of the Redis API.
+
+    Every uvicorn worker on a host opens the same file; WAL mode lets readers
+    proceed while another worker writes. Supports plain keys with optional
+    expiry (get, set with nx/ex, delete, incr, decr) and hashes (hget, hset,
+    hdel, hgetall), which is all the session and job bookkeeping needs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (name TEXT, field TEXT, value TEXT NOT NULL, "
+                "PRIMARY KEY (name, field))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value, nx: bool = False, ex: Optional[float] = None) -> bool:
+        expires_at = time.time() + ex if ex else None
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if nx:
+                conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, time.time()))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, str(value), expires_at)
+                )
+                return cursor.rowcount == 1
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, str(value), expires_at)
+            )
+            return True
+
+    def delete(self, *keys: str) -> int:
+        conn = self._connect()
+        with conn:
+            return sum(conn.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount for key in keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+                (key, str(amount), amount)
+            )
+            return int(conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0])
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        return self.incr(key, -amount)
+
+    def hget(self, name: str, field: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM hashes WHERE name = ? AND field = ?", (name, field)
+        ).fetchone()
+        return row[0] if row else None
+
+    def hset(self, name: str, field: str, value) -> int:
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hashes (name, field, value) VALUES (?, ?, ?)", (name, field, str(value))
+            )
+        return 1
+
+    def hdel(self, name: str, *fields: str) -> int:
+        conn = self._connect()
+        with conn:
+            return sum(
+                conn.execute("DELETE FROM hashes WHERE name = ? AND field = ?", (name, field)).rowcount
+                for field in fields
+            )
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        rows = self._connect().execute("SELECT field, value FROM hashes WHERE name = ?", (name,)).fetchall()
+        return dict(rows)
+
+
+class RedisBackend:
+    """
+    Shared state in Redis, for workers spread over several hosts.
+
+    Accepts a URL (requires the redis package) or any client object exposing
+    the same methods with decoded string responses, such as a local stand-in
+    used for development.
+    """
+
+    def __init__(self, url_or_client):
+        if isinstance(url_or_client, str):
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("The redis package is required for a redis:// session backend") from e
+            url_or_client = redis.Redis.from_url(url_or_client, decode_responses=True)
+        self.client = url_or_client
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def set(self, key: str, value, nx: bool = False, ex: Optional[float] = None) -> bool:
+        return bool(self.client.set(key, value, nx=nx, ex=int(ex) if ex else None))
+
+    def delete(self, *keys: str) -> int:
+        return self.client.delete(*keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return int(self.client.incr(key, amount))
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        return int(self.client.decr(key, amount))
+
+    def hget(self, name: str, field: str) -> Optional[str]:
+        return self.client.hget(name, field)
+
+    def hset(self, name: str, field: str, value) -> int:
+        return self.client.hset(name, field, value)
+
+    def hdel(self, name: str, *fields: str) -> int:
+        return self.client.hdel(name, *fields)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        return self.client.hgetall(name)
+
+
+def create_session_backend(url: str, data_dir: str):
+    """Build the backend named by url; an empty url means SQLite inside data_dir."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        logger.info("Using Redis session backend")
+        return RedisBackend(url)
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+    elif url:
+        raise ValueError(f"Unsupported session backend: {url}")
+    else:
+        path = os.path.join(data_dir, "state.sqlite3")
+    logger.info(f"Using SQLite session backend at: {path}")
+    return SQLiteBackend(path)
+
+
+_backends: Dict[str, object] = {}
+_backends_lock = threading.Lock()
+
+
+def get_session_backend(data_dir: str):
+    """Process-wide backend for the configured URL, shared by every store using data_dir."""
+    key = SESSION_BACKEND_URL or data_dir
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = create_session_backend(SESSION_BACKEND_URL, data_dir)
+        return _backends[key]
@@ -0,0 +1,601 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import chromadb
+from chromadb.config import Settings
+from langchain_chroma import Chroma
+from langchain_community.chat_message_histories import FileChatMessageHistory
+from utils.concurrency import interprocess_lock, run_blocking, run_ingest
+from utils.logger import setup_logger
+from .quantized_index import QuantizedIndexes
+from .session_backend import get_session_backend
+from .sparse_index import BM25Index
+
+# Set up logger
+logger = setup_logger(__name__)
+
+DATA_DIR = os.environ.get(
+    "OMNILEARN_DATA_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data")),
+)
+MAX_HOT_SESSIONS = int(os.environ.get("OMNILEARN_MAX_HOT_SESSIONS", 32))
+SESSION_IDLE_SECONDS = float(os.environ.get("OMNILEARN_SESSION_IDLE_SECONDS", 3600))
+# How often a worker drops sessions idle for longer than SESSION_IDLE_SECONDS
+SESSION_EVICTION_INTERVAL_SECONDS = float(os.environ.get("OMNILEARN_SESSION_EVICTION_INTERVAL_SECONDS", 60))
+# Upper bound on vector segments Chroma keeps loaded per store, least recently used unloaded first;
+# dropping a session's collection wrapper does not unload its segments. 0 disables the limit
+CHROMA_MEMORY_LIMIT_BYTES = int(os.environ.get("OMNILEARN_CHROMA_MEMORY_LIMIT_BYTES", 1024 ** 3))
+ADD_BATCH_SIZE = 512
+# A build lock older than this is treated as abandoned by a crashed worker
+INDEX_BUILD_TIMEOUT_SECONDS = float(os.environ.get("OMNILEARN_INDEX_BUILD_TIMEOUT_SECONDS", 3600))
+INDEX_BUILD_POLL_SECONDS = 0.5
+# Reference counts of a shared index change under a lock in the session backend, held for milliseconds
+INDEX_REFS_LOCK_TIMEOUT_SECONDS = 30
+INDEX_REFS_LOCK_POLL_SECONDS = 0.005
+# Storage of shared indexes: "chroma", or "quantized" for int8 vectors in memory-mapped files
+INDEX_BACKEND = os.environ.get("OMNILEARN_INDEX_BACKEND", "chroma").lower()
+
+# build(vector_store, sparse_index) fills a new shared index
+IndexBuilder = Callable[[Any, BM25Index], Awaitable[Any]]
+
+
+def session_key(namespace: str, session_id: str) -> str:
+    """Filesystem- and Chroma-safe name for a session's collection."""
+    return f"{namespace}-{hashlib.sha1(session_id.encode('utf-8')).hexdigest()[:16]}"
+
+
+def add_in_batches(vector_store, documents, ids: Optional[List[str]] = None,
+                   sparse_index: Optional[BM25Index] = None, batch_size: int = ADD_BATCH_SIZE,
+                   on_batch: Optional[Callable[[int], None]] = None):
+    """
+    Add documents without exceeding Chroma's maximum batch size, indexing them for BM25 too.
+
+    on_batch is called with the size of every batch once it is stored.
+    """
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        batch_ids = vector_store.add_documents(batch, ids=ids[start:start + batch_size] if ids else None)
+        if sparse_index is not None:
+            sparse_index.add(batch_ids, [doc.page_content for doc in batch])
+        if on_batch is not None:
+            on_batch(len(batch))
+
+
+def add_embedded(vector_store, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings):
+    """Store chunks whose embeddings are already known, in a Chroma collection or a quantized index."""
+    if hasattr(vector_store, "add_embedded"):
+        vector_store.add_embedded(ids, documents, metadatas, embeddings)
+    else:
+        vector_store._collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+
+class _HotCache:
+    """Bounded LRU of loaded per-session objects with idle-time eviction."""
+
+    def __init__(self, max_items: int, idle_seconds: float, on_evict: Optional[Callable[[str], None]] = None):
+        self.max_items = max_items
+        self.idle_seconds = idle_seconds
+        self.on_evict = on_evict
+        self._items = OrderedDict()  # session_id -> (value, last_used)
+        self._lock = threading.RLock()
+
+    def get(self, session_id: str):
+        with self._lock:
+            entry = self._items.get(session_id)
+            if entry is None:
+                return None
+            self._items[session_id] = (entry[0], time.monotonic())
+            self._items.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id: str, value):
+        with self._lock:
+            self._items[session_id] = (value, time.monotonic())
+            self._items.move_to_end(session_id)
+            self.evict()
+
+    def pop(self, session_id: str):
+        with self._lock:
+            entry = self._items.pop(session_id, None)
+            return entry[0] if entry else None
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    def evict(self):
+        """Drop sessions idle for too long, then the least recently used ones over the limit."""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for session_id, (_, last_used) in list(self._items.items()):
+                if now - last_used > self.idle_seconds:
+                    del self._items[session_id]
+                    evicted.append(session_id)
+            while len(self._items) > self.max_items:
+                session_id, _ = self._items.popitem(last=False)
+                evicted.append(session_id)
+        for session_id in evicted:
+            logger.debug(f"Evicted session from memory: {session_id}")
+            if self.on_evict:
+                self.on_evict(session_id)
+        return evicted
+
+
+class ChromaIndexes:
+    """Shared indexes stored as collections of the session store's Chroma database."""
+
+    def __init__(self, client, open_collection: Callable[[str, Optional[Dict]], Any]):
+        self.client = client
+        self.open_collection = open_collection
+
+    def create(self, name: str, metadata: Optional[Dict] = None):
+        self.delete(name)
+        return self.open_collection(name, metadata)
+
+    def open(self, name: str):
+        return self.open_collection(name, None)
+
+    def seal(self, vector_store):
+        pass
+
+    def delete(self, name: str):
+        try:
+            self.client.delete_collection(name)
+        except Exception:
+            pass
+
+
+class SharedIndexStore:
+    """
+    Read-only indexes of document sets, shared by every session with the same content.
+
+    An index is keyed by the fingerprint of its document set and built once:
+    concurrent requests for the same fingerprint, in this worker or another
+    one, wait for the first build instead of parsing and embedding again.
+    Sessions hold references counted in the session backend; the collection
+    is deleted when the last reference is released. Taking a reference,
+    checking readiness and deleting happen under one lock per index, held in
+    the session backend so it also covers other workers. Open indexes and their
+    BM25 indexes are cached per worker, so memory grows with unique content
+    rather than with the number of sessions.
+
+    indexes creates, seals, opens and deletes the stored indexes
+    (ChromaIndexes or QuantizedIndexes); name_prefix keeps the indexes of
+    different storage formats apart.
+    """
+
+    def __init__(self, namespace: str, indexes, backend, name_prefix: str = "shared",
+                 max_hot_indexes: int = MAX_HOT_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS,
+                 on_delete: Optional[Callable[[str], None]] = None):
+        self.namespace = namespace
+        self.indexes = indexes
+        self.backend = backend
+        self.name_prefix = name_prefix
+        self.on_delete = on_delete
+        self._hot = _HotCache(max_hot_indexes, idle_seconds, self.evicted)
+        self._sparse: Dict[str, BM25Index] = {}
+        self._building: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def collection_name(self, fingerprint: str) -> str:
+        return f"{self.namespace}-{self.name_prefix}-{fingerprint[:32]}"
+
+    def _key(self, kind: str, fingerprint: str) -> str:
+        return f"index-{kind}:{self.collection_name(fingerprint)}"
+
+    def is_ready(self, fingerprint: str) -> bool:
+        return self.backend.get(self._key("ready", fingerprint)) is not None
+
+    def references(self, fingerprint: str) -> int:
+        return int(self.backend.get(self._key("refs", fingerprint)) or 0)
+
+    @contextmanager
+    def _references_locked(self, fingerprint: str):
+        """
+        Serialize reference changes of an index across threads and workers.
+
+        Waiting for the lock blocks, so coroutines reach this through
+        run_blocking rather than calling retain, release or attach directly.
+        """
+        key = self._key("refs-lock", fingerprint)
+        with self._lock:
+            while not self.backend.set(key, 1, nx=True, ex=INDEX_REFS_LOCK_TIMEOUT_SECONDS):
+                time.sleep(INDEX_REFS_LOCK_POLL_SECONDS)
+            try:
+                yield
+            finally:
+                self.backend.delete(key)
+
+    async def ensure(self, fingerprint: str, build: IndexBuilder) -> bool:
+        """
+        Make sure the index exists, building it if needed, and take a reference to it.
+
+        The caller owns the reference and hands it to a session with
+        SessionStore.attach. Returns True if this call built the index.
+        """
+        while True:
+            if await run_blocking(self.retain, fingerprint):
+                return False
+            pending = self._building.get(fingerprint)
+            if pending is not None:
+                await asyncio.shield(pending)
+                continue
+            if self.backend.set(self._key("build", fingerprint), 1, nx=True, ex=INDEX_BUILD_TIMEOUT_SECONDS):
+                pending = self._building[fingerprint] = asyncio.get_running_loop().create_future()
+                try:
+                    await self._build(fingerprint, build)
+                    return True
+                finally:
+                    self.backend.delete(self._key("build", fingerprint))
+                    del self._building[fingerprint]
+                    pending.set_result(None)
+            # Another worker is building it
+            logger.debug(f"Waiting for another worker to build shared index {fingerprint[:12]}")
+            while self.backend.get(self._key("build", fingerprint)) and not self.is_ready(fingerprint):
+                await asyncio.sleep(INDEX_BUILD_POLL_SECONDS)
+
+    async def _build(self, fingerprint: str, build: IndexBuilder):
+        name = self.collection_name(fingerprint)
+        # Replaces leftovers of a build that was interrupted
+        vector_store = self.indexes.create(name, {"namespace": self.namespace, "fingerprint": fingerprint})
+        sparse_index = BM25Index()
+        try:
+            await build(vector_store, sparse_index)
+            await run_ingest(self.indexes.seal, vector_store)
+        except BaseException:
+            self.indexes.delete(name)
+            raise
+        self._hot.put(fingerprint, vector_store)
+        self._sparse[fingerprint] = sparse_index
+        await run_blocking(self._mark_built, fingerprint)
+        logger.info(f"Built shared index {fingerprint[:12]}")
+
+    def _mark_built(self, fingerprint: str):
+        """Publish a new index as ready, with the builder's reference to it."""
+        with self._references_locked(fingerprint):
+            self.backend.set(self._key("ready", fingerprint), 1)
+            self.backend.incr(self._key("refs", fingerprint))
+
+    def retain(self, fingerprint: str) -> bool:
+        """Take a reference to the index if it is ready; False if it is not, or was just deleted."""
+        with self._references_locked(fingerprint):
+            self.backend.incr(self._key("refs", fingerprint))
+            # Checked after counting the reference, so a concurrent release can no longer delete it
+            if self.is_ready(fingerprint):
+                return True
+            self.backend.decr(self._key("refs", fingerprint))
+            return False
+
+    def release(self, fingerprint: str) -> int:
+        """Drop one reference, deleting the index once nobody uses it."""
+        with self._references_locked(fingerprint):
+            remaining = self.backend.decr(self._key("refs", fingerprint))
+            if remaining <= 0:
+                logger.info(f"Deleting unreferenced shared index {fingerprint[:12]}")
+                self.backend.delete(self._key("ready", fingerprint), self._key("refs", fingerprint))
+                self.evicted(fingerprint)
+                self._hot.pop(fingerprint)
+                # Under the lock, so a rebuild of the same content cannot start before the old one is gone
+                self.indexes.delete(self.collection_name(fingerprint))
+                if self.on_delete:
+                    self.on_delete(fingerprint)
+        return remaining
+
+    def evicted(self, fingerprint: str):
+        self._sparse.pop(fingerprint, None)
+
+    def __getitem__(self, fingerprint: str):
+        vector_store = self._hot.get(fingerprint)
+        if vector_store is None:
+            if not self.is_ready(fingerprint):
+                raise KeyError(fingerprint)
+            vector_store = self.indexes.open(self.collection_name(fingerprint))
+            self._hot.put(fingerprint, vector_store)
+        return vector_store
+
+    def sparse_index(self, fingerprint: str) -> BM25Index:
+        vector_store = self[fingerprint]
+        index = self._sparse.get(fingerprint)
+        if index is None:
+            index = self._sparse[fingerprint] = BM25Index.from_vector_store(vector_store)
+        return index
+
+
+class SessionStore:
+    """
+    Persistent, lazily loaded vector stores keyed by session.
+
+    A session's documents live in a shared, read-only index of its document
+    set (its base, see SharedIndexStore) plus an optional private overlay
+    collection for files the session added on top. Everything is kept on
+    disk, overlays in a Chroma database and shared indexes in Chroma or, with
+    OMNILEARN_INDEX_BACKEND=quantized, in QuantizedVectorStore files, so
+    sessions survive restarts. Only a bounded number of recently used
+    indexes are kept open in memory; the rest are reopened on first access.
+
+    Several worker processes can share one store. Each completed write bumps
+    the session's version in the shared session backend, and a worker whose
+    open copy carries an older version reopens the collection and rebuilds
+    the BM25 index before using it.
+    """
+
+    def __init__(self, namespace: str, embeddings, data_dir: str = None,
+                 max_hot_sessions: int = MAX_HOT_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        self.namespace = namespace
+        self.embeddings = embeddings
+        self.persist_dir = os.path.join(data_dir or DATA_DIR, namespace, "chroma")
+        os.makedirs(self.persist_dir, exist_ok=True)
+        settings = {"anonymized_telemetry": False, "is_persistent": True, "persist_directory": self.persist_dir}
+        if CHROMA_MEMORY_LIMIT_BYTES:
+            settings.update(chroma_segment_cache_policy="LRU", chroma_memory_limit_bytes=CHROMA_MEMORY_LIMIT_BYTES)
+        # Workers starting together would otherwise race on creating the database schema
+        with interprocess_lock(self.persist_dir + ".lock"):
+            self.client = chromadb.PersistentClient(path=self.persist_dir, settings=Settings(**settings))
+        self.on_evict = on_evict
+        self.backend = get_session_backend(data_dir or DATA_DIR)
+        if INDEX_BACKEND == "quantized":
+            indexes = QuantizedIndexes(os.path.join(data_dir or DATA_DIR, namespace, "quantized"), embeddings)
+            name_prefix = "shared-q8"
+        else:
+            indexes, name_prefix = ChromaIndexes(self.client, self._open_collection), "shared"
+        self.shared = SharedIndexStore(
+            namespace, indexes, self.backend, name_prefix, max_hot_sessions, idle_seconds
+        )
+        self._hot = _HotCache(max_hot_sessions, idle_seconds, self._evicted)
+        self._sparse = {}
+        self._versions = {}
+        logger.info(f"Session store '{namespace}' opened at: {self.persist_dir}")
+
+    def collection_name(self, session_id: str) -> str:
+        return session_key(self.namespace, session_id)
+
+    def _evicted(self, session_id: str):
+        self._sparse.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        if self.on_evict:
+            self.on_evict(session_id)
+
+    def _open_collection(self, name: str, metadata: Optional[Dict] = None):
+        return Chroma(
+            client=self.client,
+            collection_name=name,
+            embedding_function=self.embeddings,
+            collection_metadata=metadata,
+        )
+
+    def _open(self, session_id: str):
+        return self._open_collection(
+            self.collection_name(session_id), {"session_id": session_id, "namespace": self.namespace}
+        )
+
+    def _exists_on_disk(self, session_id: str) -> bool:
+        try:
+            self.client.get_collection(self.collection_name(session_id))
+            return True
+        except Exception:
+            return False
+
+    def _record_key(self) -> str:
+        return f"session-index:{self.namespace}"
+
+    def _record(self, session_id: str) -> Dict[str, Optional[str]]:
+        """The session's base fingerprint and the fingerprint of its overlay content."""
+        record = self.backend.hget(self._record_key(), session_id)
+        return json.loads(record) if record else {"base": None, "overlay": None}
+
+    def _save_record(self, session_id: str, base: Optional[str], overlay: Optional[str]):
+        self.backend.hset(self._record_key(), session_id, json.dumps({"base": base, "overlay": overlay}))
+
+    def _version_key(self, session_id: str) -> str:
+        return f"session-version:{self.collection_name(session_id)}"
+
+    def version(self, session_id: str) -> int:
+        """Shared counter of completed writes to the session."""
+        return int(self.backend.get(self._version_key(session_id)) or 0)
+
+    def mark_changed(self, session_id: str):
+        """Tell other workers their copy of the session is stale; this worker's copy stays current."""
+        self._versions[session_id] = self.backend.incr(self._version_key(session_id))
+
+    def base(self, session_id: str) -> Optional[str]:
+        return self._record(session_id)["base"]
+
+    def attach(self, session_id: str, fingerprint: str):
+        """
+        Point the session at a built shared index, replacing all of its previous content.
+
+        The session takes over a reference the caller already holds, from
+        SharedIndexStore.ensure or SharedIndexStore.retain.
+        """
+        previous = self._record(session_id)["base"]
+        self._drop_overlay(session_id)
+        self._save_record(session_id, fingerprint, None)
+        if previous:
+            self.shared.release(previous)
+        self.mark_changed(session_id)
+        logger.info(f"Session {session_id} attached to shared index {fingerprint[:12]}")
+
+    def open_overlay(self, session_id: str):
+        """Return the session's private overlay collection, creating it if needed."""
+        try:
+            return self._overlay(session_id)
+        except KeyError:
+            vector_store = self._open(session_id)
+            self._hot.put(session_id, vector_store)
+            self._sparse[session_id] = BM25Index()
+            self._versions[session_id] = self.version(session_id)
+            return vector_store
+
+    def add_overlay(self, session_id: str, fingerprint: str):
+        """Record that files with this fingerprint were added to the session's overlay."""
+        record = self._record(session_id)
+        overlay = fingerprint if not record["overlay"] else hashlib.sha256(
+            f"{record['overlay']}\0{fingerprint}".encode('utf-8')
+        ).hexdigest()
+        self._save_record(session_id, record["base"], overlay)
+        self.mark_changed(session_id)
+
+    def _drop_overlay(self, session_id: str):
+        self._hot.pop(session_id)
+        self._evicted(session_id)
+        try:
+            self.client.delete_collection(self.collection_name(session_id))
+            logger.debug(f"Deleted overlay collection for session: {session_id}")
+        except Exception:
+            pass
+
+    def delete(self, session_id: str):
+        """Remove a session's overlay and its reference to a shared index."""
+        base = self._record(session_id)["base"]
+        self._drop_overlay(session_id)
+        self.backend.hdel(self._record_key(), session_id)
+        if base:
+            self.shared.release(base)
+        self.mark_changed(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        return (
+            self._record(session_id)["base"] is not None
+            or self._hot.get(session_id) is not None
+            or self._exists_on_disk(session_id)
+        )
+
+    def _overlay(self, session_id: str):
+        vector_store = self._hot.get(session_id)
+        version = self.version(session_id)
+        if vector_store is not None and self._versions.get(session_id) != version:
+            logger.info(f"Session changed in another worker, reloading: {session_id}")
+            self._hot.pop(session_id)
+            self._evicted(session_id)
+            vector_store = None
+        if vector_store is None:
+            if not self._exists_on_disk(session_id):
+                raise KeyError(session_id)
+            logger.info(f"Loading session from disk: {session_id}")
+            vector_store = self._open(session_id)
+            self._hot.put(session_id, vector_store)
+            self._versions[session_id] = version
+        else:
+            self._hot.evict()
+        return vector_store
+
+    def sources(self, session_id: str) -> List[tuple]:
+        """(vector store, BM25 index) pairs to search for the session: its base, then its overlay."""
+        sources = []
+        base = self.base(session_id)
+        if base:
+            sources.append((self.shared[base], self.shared.sparse_index(base)))
+        try:
+            overlay = self._overlay(session_id)
+        except KeyError:
+            overlay = None
+        if overlay is not None:
+            sources.append((overlay, self.sparse_index(session_id)))
+        if not sources:
+            raise KeyError(session_id)
+        return sources
+
+    def fingerprint(self, session_id: str) -> Optional[str]:
+        """Hash of everything the session can retrieve from, or None if unknown."""
+        record = self._record(session_id)
+        if record["base"] and not record["overlay"]:
+            return record["base"]
+        if record["base"] or record["overlay"]:
+            return hashlib.sha256(f"{record['base']}\0{record['overlay']}".encode('utf-8')).hexdigest()
+        # Sessions indexed before shared indexes existed keep it in their collection metadata
+        try:
+            return (self._overlay(session_id)._collection.metadata or {}).get("fingerprint")
+        except KeyError:
+            return None
+
+    def sparse_index(self, session_id: str) -> BM25Index:
+        """The overlay's BM25 index, rebuilt from its collection after a cold load."""
+        vector_store = self._overlay(session_id)
+        index = self._sparse.get(session_id)
+        if index is None:
+            index = self._sparse[session_id] = BM25Index.from_vector_store(vector_store)
+        return index
+
+    def keys(self) -> List[str]:
+        """All sessions on disk, whether or not they are loaded."""
+        sessions = set(self.backend.hgetall(self._record_key()))
+        for collection in self.client.list_collections():
+            if isinstance(collection, str):
+                collection = self.client.get_collection(collection)
+            metadata = collection.metadata or {}
+            if metadata.get("namespace") == self.namespace and "session_id" in metadata:
+                sessions.add(metadata["session_id"])
+        return sorted(sessions)
+
+    def hot_sessions(self) -> List[str]:
+        return self._hot.keys()
+
+    def evict_idle(self) -> List[str]:
+        """Drop idle sessions and shared indexes from memory; returns what was dropped."""
+        return self._hot.evict() + self.shared._hot.evict()
+
+
+class ChatHistoryStore:
+    """Chat histories persisted as one JSON file per session, with a bounded in-memory LRU."""
+
+    def __init__(self, namespace: str, data_dir: str = None,
+                 max_hot_sessions: int = MAX_HOT_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.namespace = namespace
+        self.persist_dir = os.path.join(data_dir or DATA_DIR, namespace, "histories")
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self._hot = _HotCache(max_hot_sessions, idle_seconds)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.persist_dir, f"{session_key(self.namespace, session_id)}.json")
+
+    def evict_idle(self) -> List[str]:
+        return self._hot.evict()
+
+    def create(self, session_id: str):
+        """Return the session's history, creating an empty one if needed."""
+        history = self._hot.get(session_id)
+        if history is None:
+            history = FileChatMessageHistory(self._path(session_id))
+            self._hot.put(session_id, history)
+        return history
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._hot.get(session_id) is not None or os.path.exists(self._path(session_id))
+
+    def __getitem__(self, session_id: str):
+        if session_id not in self:
+            raise KeyError(session_id)
+        return self.create(session_id)
+
+    def _summary_path(self, session_id: str) -> str:
+        return os.path.join(self.persist_dir, f"{session_key(self.namespace, session_id)}.summary.json")
+
+    def load_summary(self, session_id: str) -> Dict[str, Any]:
+        """Return the rolling summary and how many leading messages it covers."""
+        try:
+            with open(self._summary_path(session_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"summary": "", "covered": 0}
+
+    def save_summary(self, session_id: str, summary: str, covered: int):
+        path = self._summary_path(session_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "covered": covered}, f)
+        os.replace(tmp_path, path)
+
+    def clear(self, session_id: str):
+        """Drop the session's messages and summary."""
+        if session_id in self:
+            self[session_id].clear()
+        if os.path.exists(self._summary_path(session_id)):
+            os.remove(self._summary_path(session_id))
@@ -0,0 +1,147 @@
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "with", "does", "do", "self",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms for sparse matching.
+
+    Identifiers are kept whole and also split on snake_case and camelCase
+    boundaries, so "process_text_file" and "getResponse" match both exactly
+    and by their parts.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text):
+        lowered = token.lower()
+        if lowered not in STOPWORDS:
+            terms.append(lowered)
+        parts = [part for piece in token.split('_') for part in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts if part.lower() not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """
+    Incremental in-memory BM25 index over chunk IDs.
+
+    Postings are flat array('I') buffers of interleaved (slot, term frequency)
+    pairs, so the index costs a few bytes per term occurrence and holds no chunk
+    text. Removed chunks are tombstoned and purged from the postings once they
+    make up a quarter of the index.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, array] = {}
+        self._doc_lengths = array('I')
+        self._slot_ids: List[str] = []
+        self._id_slots: Dict[str, int] = {}
+        self._deleted = set()
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._id_slots)
+
+    def add(self, doc_ids: Iterable[str], texts: Iterable[str]):
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                if doc_id in self._id_slots:
+                    self._remove_one(doc_id)
+                terms = Counter(tokenize(text))
+                slot = len(self._slot_ids)
+                self._slot_ids.append(doc_id)
+                self._id_slots[doc_id] = slot
+                length = sum(terms.values())
+                self._doc_lengths.append(length)
+                self._total_length += length
+                for term, frequency in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = array('I')
+                    postings.append(slot)
+                    postings.append(frequency)
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove_one(doc_id)
+            if len(self._deleted) > max(64, len(self._slot_ids) // 4):
+                self._compact()
+
+    def _remove_one(self, doc_id: str):
+        slot = self._id_slots.pop(doc_id, None)
+        if slot is not None:
+            self._deleted.add(slot)
+            self._total_length -= self._doc_lengths[slot]
+
+    def _compact(self):
+        logger.debug(f"Compacting BM25 index, dropping {len(self._deleted)} removed chunks")
+        for term in list(self._postings):
+            old = self._postings[term]
+            new = array('I')
+            for i in range(0, len(old), 2):
+                if old[i] not in self._deleted:
+                    new.append(old[i])
+                    new.append(old[i + 1])
+            if new:
+                self._postings[term] = new
+            else:
+                del self._postings[term]
+        self._deleted.clear()
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to k (chunk ID, BM25 score) pairs, best first."""
+        with self._lock:
+            live_docs = len(self._id_slots)
+            if not live_docs:
+                return []
+            avg_length = self._total_length / live_docs or 1.0
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                doc_freq = len(postings) // 2
+                idf = math.log(1 + (live_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+                for i in range(0, len(postings), 2):
+                    slot = postings[i]
+                    if slot in self._deleted:
+                        continue
+                    frequency = postings[i + 1]
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[slot] / avg_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._slot_ids[slot], score) for slot, score in best]
+
+    @classmethod
+    def from_vector_store(cls, vector_store, page_size: int = 1000) -> "BM25Index":
+        """Rebuild an index from the chunks already stored in a Chroma collection."""
+        index = cls()
+        offset = 0
+        while True:
+            page = vector_store.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            index.add(page["ids"], page["documents"])
+            offset += len(page["ids"])
+        logger.debug(f"Rebuilt BM25 index with {len(index)} chunks")
+        return index
@@ -0,0 +1,87 @@
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from utils.logger import setup_logger
+from utils.tracing import span
+
+# Set up logger
+logger = setup_logger(__name__)
+
+
+def format_source(doc) -> Dict[str, Any]:
+    """Summarize a retrieved document for the client."""
+    return {
+        "metadata": {k: v for k, v in doc.metadata.items() if isinstance(v, (str, int, float, bool))},
+        "preview": doc.page_content[:200],
+    }
+
+
+async def stream_rag_chain(rag_chain, chat_history, message: str, prompt_history: Optional[List] = None,
+                           on_complete: Optional[Callable[[], None]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a retrieval chain as events.
+
+    Yields a "sources" event as soon as retrieval finishes, a "token" event for
+    every answer chunk, and a final "done" event carrying the full answer. The
+    exchange is committed to chat_history only once the answer is complete.
+    prompt_history replaces the full transcript in the prompts when given, and
+    on_complete runs after the exchange is committed.
+    """
+    if prompt_history is None:
+        prompt_history = chat_history.messages
+    answer_parts = []
+    sources_sent = False
+    async for chunk in rag_chain.astream({"input": message, "chat_history": prompt_history}):
+        if "context" in chunk and not sources_sent:
+            sources_sent = True
+            yield {"type": "sources", "sources": [format_source(doc) for doc in chunk["context"]]}
+        if chunk.get("answer"):
+            answer_parts.append(chunk["answer"])
+            yield {"type": "token", "content": chunk["answer"]}
+
+    answer = "".join(answer_parts)
+    with span("history_save"):
+        chat_history.add_user_message(message)
+        chat_history.add_ai_message(answer)
+    logger.debug(f"Streamed answer of {len(answer)} characters committed to history")
+    if on_complete is not None:
+        on_complete()
+    yield {"type": "done", "answer": answer}
+
+
+async def stream_batch_answers(rag_chain, questions: List[str],
+                               max_concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream batch answers as events, in completion order.
+
+    Yields an "answer" event (with its question index and sources) or a
+    "question_error" event per question, then a "done" event with the
+    totals. Nothing is written to the session's chat history.
+    """
+    kwargs = {"max_concurrency": max_concurrency} if max_concurrency else {}
+    answered = failed = 0
+    async for result in rag_chain.abatch_answers(questions, **kwargs):
+        if "error" in result:
+            failed += 1
+            yield {"type": "question_error", "index": result["index"], "question": result["question"],
+                   "detail": result["error"]}
+            continue
+        answered += 1
+        yield {
+            "type": "answer",
+            "index": result["index"],
+            "question": result["question"],
+            "answer": result["answer"],
+            "cached": result["cached"],
+            "sources": [format_source(doc) for doc in result["context"]],
+        }
+    yield {"type": "done", "answered": answered, "failed": failed}
+
+
+async def to_ndjson(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Serialize events as newline-delimited JSON, reporting failures in-band."""
+    try:
+        async for event in events:
+            yield json.dumps(event) + "\n"
+    except Exception as e:
+        logger.error(f"Error while streaming response: {str(e)}", exc_info=True)
+        yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
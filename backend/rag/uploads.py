@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from utils.concurrency import run_blocking
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# Chunk size suggested to clients; any size up to the declared file size is accepted
+UPLOAD_CHUNK_SIZE = int(os.environ.get("OMNILEARN_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.environ.get("OMNILEARN_MAX_UPLOAD_BYTES", 1024 * 1024 * 1024))
+# Unfinished or un-ingested uploads are deleted after this long
+UPLOAD_TTL_SECONDS = float(os.environ.get("OMNILEARN_UPLOAD_TTL_SECONDS", 24 * 3600))
+# A chunk write holding its lock longer than this is treated as abandoned
+UPLOAD_LOCK_SECONDS = 300
+READ_BLOCK_SIZE = 1024 * 1024
+
+UPLOADING = "uploading"
+COMPLETE = "complete"
+
+# prepare(path, filename) runs in the background once an upload completes
+UploadPreparer = Callable[[str, str], Awaitable[None]]
+
+
+class UploadSpool:
+    """
+    Resumable, chunked uploads spooled to disk.
+
+    A client creates an upload, then appends chunks at the offset the server
+    reports; an interrupted chunk keeps whatever reached the disk, so the
+    client asks for the current offset and resumes from there. The SHA-256
+    of the file is computed while the chunks stream in, and each chunk can
+    carry its own checksum. Memory per upload is one network read plus the
+    hash state, whatever the file size.
+
+    Upload records live in the shared session backend and the spool files in
+    the shared data directory, so consecutive chunks may reach different
+    workers. A worker that did not see the previous chunks rebuilds the hash
+    state by re-reading the spooled prefix.
+    """
+
+    def __init__(self, backend, spool_dir: str, prepare: Optional[UploadPreparer] = None,
+                 ttl_seconds: float = UPLOAD_TTL_SECONDS, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.backend = backend
+        self.spool_dir = spool_dir
+        self.prepare = prepare
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # upload_id -> (offset covered, running hash) for uploads this worker wrote to
+        self._hashers: Dict[str, tuple] = {}
+        self._preparing: Dict[str, asyncio.Task] = {}
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def path(self, upload_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{upload_id}.part")
+
+    def _load(self, upload_id: str) -> Dict[str, Any]:
+        record = self.backend.hget("uploads", upload_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+        return json.loads(record)
+
+    def _save(self, record: Dict[str, Any]):
+        record["updated_at"] = time.time()
+        self.backend.hset("uploads", record["upload_id"], json.dumps(record))
+
+    def _offset(self, upload_id: str) -> int:
+        path = self.path(upload_id)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def create(self, session_id: str, filename: str, size: Optional[int] = None,
+               sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Register a new upload and return its record, including the suggested chunk size."""
+        self._prune()
+        if not filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        if size is not None and size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {self.max_bytes} byte upload limit")
+        record = {
+            "upload_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "filename": filename,
+            "size": size,
+            "expected_sha256": sha256.lower() if sha256 else None,
+            "sha256": None,
+            "offset": 0,
+            "status": UPLOADING,
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+            "created_at": time.time(),
+        }
+        open(self.path(record["upload_id"]), 'wb').close()
+        self._save(record)
+        logger.info(f"Created upload {record['upload_id']} for {filename} (session {session_id})")
+        return record
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        record = self._load(upload_id)
+        if record["status"] == UPLOADING:
+            record["offset"] = self._offset(upload_id)
+        return record
+
+    def _hasher(self, upload_id: str, offset: int):
+        """Running SHA-256 of the first offset bytes, rebuilt from disk when not cached."""
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        hasher = hashlib.sha256()
+        with open(self.path(upload_id), 'rb') as f:
+            remaining = offset
+            while remaining:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    async def write(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes],
+                    chunk_sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Append a chunk streamed from chunks at offset.
+
+        The offset must equal the number of bytes already received; otherwise
+        409 is returned with the current offset so the client can resume. A
+        chunk that fails its checksum or overruns the declared size is rolled
+        back.
+        """
+        record = self._load(upload_id)
+        if record["status"] != UPLOADING:
+            raise HTTPException(status_code=409, detail=f"Upload {upload_id} is already {record['status']}")
+        lock_key = f"upload-lock:{upload_id}"
+        if not self.backend.set(lock_key, 1, nx=True, ex=UPLOAD_LOCK_SECONDS):
+            raise HTTPException(status_code=409, detail="Another chunk of this upload is being written")
+        try:
+            current = self._offset(upload_id)
+            if offset != current:
+                raise HTTPException(
+                    status_code=409, detail={"message": "Offset mismatch", "offset": current}
+                )
+            limit = min(record["size"], self.max_bytes) if record["size"] is not None else self.max_bytes
+            hasher = await run_blocking(self._hasher, upload_id, offset)
+            chunk_hasher = hashlib.sha256() if chunk_sha256 else None
+            written = 0
+            with open(self.path(upload_id), 'ab') as f:
+                try:
+                    async for piece in chunks:
+                        if not piece:
+                            continue
+                        if offset + written + len(piece) > limit:
+                            raise HTTPException(status_code=413, detail="Upload exceeds its declared size")
+                        await run_blocking(f.write, piece)
+                        hasher.update(piece)
+                        if chunk_hasher is not None:
+                            chunk_hasher.update(piece)
+                        written += len(piece)
+                    if chunk_hasher is not None and chunk_hasher.hexdigest() != chunk_sha256.lower():
+                        raise HTTPException(status_code=422, detail="Chunk checksum mismatch")
+                except HTTPException:
+                    # Roll the rejected chunk back so the client can resend it
+                    f.truncate(offset)
+                    self._hashers.pop(upload_id, None)
+                    raise
+                except BaseException:
+                    # Interrupted transfer: keep what reached the disk and let the client resume
+                    f.flush()
+                    self._hashers[upload_id] = (offset + written, hasher)
+                    raise
+            self._hashers[upload_id] = (offset + written, hasher)
+            record["offset"] = offset + written
+            self._save(record)
+            return record
+        finally:
+            self.backend.delete(lock_key)
+
+    async def complete(self, upload_id: str) -> Dict[str, Any]:
+        """Verify a fully received upload, seal it and start pre-parsing it."""
+        record = self._load(upload_id)
+        if record["status"] == COMPLETE:
+            return record
+        offset = self._offset(upload_id)
+        if record["size"] is not None and offset != record["size"]:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": f"Upload is incomplete: {offset} of {record['size']} bytes", "offset": offset}
+            )
+        with open(self.path(upload_id), 'rb') as f:
+            if f.read(5) != b"%PDF-":
+                raise HTTPException(status_code=400, detail=f"{record['filename']} is not a PDF file")
+        digest = (await run_blocking(self._hasher, upload_id, offset)).hexdigest()
+        self._hashers.pop(upload_id, None)
+        if record["expected_sha256"] and digest != record["expected_sha256"]:
+            raise HTTPException(status_code=422, detail="File checksum mismatch")
+        record.update(sha256=digest, offset=offset, size=offset, status=COMPLETE)
+        self._save(record)
+        logger.info(f"Upload {upload_id} complete: {record['filename']}, {offset} bytes")
+        if self.prepare is not None:
+            task = asyncio.create_task(self.prepare(self.path(upload_id), record["filename"]))
+            self._preparing[upload_id] = task
+            task.add_done_callback(lambda _: self._preparing.pop(upload_id, None))
+        return record
+
+    async def spool(self, session_id: str, filename: str, fileobj) -> Dict[str, Any]:
+        """Spool a whole file object (such as a multipart UploadFile) as one completed upload."""
+        record = self.create(session_id, filename)
+
+        async def blocks():
+            while True:
+                block = await run_blocking(fileobj.read, READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+        await self.write(record["upload_id"], 0, blocks())
+        return await self.complete(record["upload_id"])
+
+    async def resolve(self, session_id: str, upload_ids: List[str]) -> List[Dict[str, Any]]:
+        """Completed uploads of a session, ready to ingest once their pre-parsing has finished."""
+        records = []
+        for upload_id in upload_ids:
+            record = self._load(upload_id)
+            if record["session_id"] != session_id:
+                raise HTTPException(status_code=403, detail=f"Upload {upload_id} belongs to another session")
+            if record["status"] != COMPLETE:
+                raise HTTPException(status_code=409, detail=f"Upload {upload_id} is not complete")
+            records.append(record)
+        pending = [self._preparing[upload_id] for upload_id in upload_ids if upload_id in self._preparing]
+        if pending:
+            await asyncio.gather(*pending)
+        return records
+
+    def discard(self, upload_id: str):
+        """Delete an upload and its spooled files."""
+        task = self._preparing.pop(upload_id, None)
+        if task is not None:
+            task.cancel()
+        self._hashers.pop(upload_id, None)
+        for name in os.listdir(self.spool_dir):
+            if name.startswith(upload_id):
+                try:
+                    os.remove(os.path.join(self.spool_dir, name))
+                except FileNotFoundError:
+                    pass
+        self.backend.hdel("uploads", upload_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_seconds
+        for upload_id, record in self.backend.hgetall("uploads").items():
+            if json.loads(record)["updated_at"] < cutoff:
+                logger.info(f"Discarding expired upload {upload_id}")
+                self.discard(upload_id)
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app imports its packages (rag, utils, benchmarks) relative to the backend directory
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("OMNILEARN_WARM_UP", "0")
+
+
+def git(cwd, *args):
+    """Run git in cwd with a fixed identity and return its stdout."""
+    return subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    ).stdout
+
+
+@pytest.fixture
+def embeddings():
+    from benchmarks.common import HashEmbeddings
+    return HashEmbeddings()
@@ -0,0 +1,43 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from rag.history import HistoryManager
+
+
+class SummaryStore:
+    def __init__(self, summary="", covered=0):
+        self.state = {"summary": summary, "covered": covered}
+
+    def load_summary(self, session_id):
+        return dict(self.state)
+
+    def save_summary(self, session_id, summary, covered):
+        self.state = {"summary": summary, "covered": covered}
+
+
+def conversation(turns):
+    messages = []
+    for turn in range(turns):
+        messages += [HumanMessage(content=f"question {turn} " * 10), AIMessage(content=f"answer {turn} " * 10)]
+    return messages
+
+
+def test_messages_stay_in_the_window_until_summarized():
+    messages = conversation(6)
+    history = HistoryManager(SummaryStore(), token_budget=60, summarize_after=100)
+    assert history._window_start(messages, 0) > 0
+    assert history.window("s", messages) == messages
+
+
+def test_window_starts_where_the_summary_ends():
+    messages = conversation(6)
+    history = HistoryManager(SummaryStore("earlier turns", covered=4), token_budget=60)
+    window = history.window("s", messages)
+    assert "earlier turns" in window[0].content
+    assert window[1:] == messages[4:]
+
+
+def test_without_summaries_the_window_follows_the_budget():
+    messages = conversation(6)
+    history = HistoryManager(SummaryStore(), token_budget=60, summarize=False)
+    window = history.window("s", messages)
+    assert window == messages[history._window_start(messages, 0):]
+    assert window[0].type == "human" and len(window) < len(messages)
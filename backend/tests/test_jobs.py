@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from rag.jobs import CANCELLED, FAILED, FINISHED, SUCCEEDED, JobManager
+from rag.session_backend import SQLiteBackend
+
+
+@pytest.fixture(params=["local", "sqlite"])
+def manager(request, tmp_path):
+    return JobManager(SQLiteBackend(str(tmp_path / "state.db")) if request.param == "sqlite" else None)
+
+
+async def finished(manager, *job_ids):
+    for _ in range(200):
+        states = [manager.get(job_id) for job_id in job_ids]
+        if all(state["status"] in FINISHED for state in states):
+            return states
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"Jobs did not finish: {states}")
+
+
+def test_joined_request_succeeds_only_after_its_join(manager):
+    async def scenario():
+        gate = asyncio.Event()
+        joined, released = [], []
+
+        async def work(job):
+            await gate.wait()
+            return {"fingerprint": "abc"}
+
+        async def join(result):
+            joined.append(result["fingerprint"])
+
+        first = manager.submit("pdf", work, dedup_key="key")
+        second = manager.submit("pdf", work, dedup_key="key", join=join, release=lambda: released.append(True))
+        assert first["job_id"] != second["job_id"] and first["follows"] == second["follows"]
+        gate.set()
+        states = await finished(manager, first["job_id"], second["job_id"])
+        assert [state["status"] for state in states] == [SUCCEEDED, SUCCEEDED]
+        assert joined == ["abc"] and released == [True]
+        assert all(not state["shared"] for state in manager.list())
+
+    asyncio.run(scenario())
+
+
+def test_failed_join_fails_only_that_request(manager):
+    async def scenario():
+        async def work(job):
+            await asyncio.sleep(0.1)
+            return {"fingerprint": "abc"}
+
+        async def join(result):
+            raise KeyError("index was evicted")
+
+        first = manager.submit("pdf", work, dedup_key="key")
+        second = manager.submit("pdf", work, dedup_key="key", join=join)
+        owner, joiner = await finished(manager, first["job_id"], second["job_id"])
+        assert owner["status"] == SUCCEEDED
+        assert joiner["status"] == FAILED and "evicted" in joiner["error"]
+
+    asyncio.run(scenario())
+
+
+def test_joiners_are_released_when_the_shared_job_fails(manager):
+    async def scenario():
+        released = []
+
+        async def work(job):
+            await asyncio.sleep(0.1)
+            raise RuntimeError("unreadable PDF")
+
+        first = manager.submit("pdf", work, dedup_key="key")
+        second = manager.submit("pdf", work, dedup_key="key", release=lambda: released.append(True))
+        states = await finished(manager, first["job_id"], second["job_id"])
+        assert [state["status"] for state in states] == [FAILED, FAILED]
+        assert states[1]["error"] == "unreadable PDF" and released == [True]
+
+    asyncio.run(scenario())
+
+
+def test_cancel_detaches_a_request_while_another_still_waits(manager):
+    async def scenario():
+        gate = asyncio.Event()
+        released = []
+
+        async def work(job):
+            await gate.wait()
+            return {"fingerprint": "abc"}
+
+        first = manager.submit("pdf", work, dedup_key="key")
+        second = manager.submit("pdf", work, dedup_key="key", release=lambda: released.append(True))
+        manager.cancel(second["job_id"])
+        (joiner,) = await finished(manager, second["job_id"])
+        assert joiner["status"] == CANCELLED and released == [True]
+        assert manager.get(first["follows"])["status"] not in FINISHED
+
+        manager.cancel(first["job_id"])
+        await asyncio.sleep(0)
+        owner, shared = await finished(manager, first["job_id"], first["follows"])
+        assert owner["status"] == CANCELLED and shared["status"] == CANCELLED
+
+    asyncio.run(scenario())
+
+
+def test_owner_cancel_leaves_the_shared_job_to_its_joiners(manager):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def work(job):
+            await gate.wait()
+            return {"fingerprint": "abc"}
+
+        first = manager.submit("pdf", work, dedup_key="key")
+        second = manager.submit("pdf", work, dedup_key="key")
+        manager.cancel(first["job_id"])
+        (owner,) = await finished(manager, first["job_id"])
+        assert owner["status"] == CANCELLED
+        gate.set()
+        (joiner,) = await finished(manager, second["job_id"])
+        assert joiner["status"] == SUCCEEDED and joiner["result"] == {"fingerprint": "abc"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,161 @@
+"""LLMGateway against the fake Groq server: reported limits, 429 retries and coalescing."""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from benchmarks.fake_llm_server import create_app, serve_in_thread
+from benchmarks.llm_gateway import MODEL, free_port
+from rag.llm_gateway import LLMGateway, LLMQueueTimeout, parse_duration
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**options):
+        app = create_app(**options)
+        port = free_port()
+        servers.append(serve_in_thread(app, port))
+        return f"http://127.0.0.1:{port}", app.state.counters
+
+    yield start
+    for server in servers:
+        server.should_exit = True
+
+
+def gateway_for(base_url: str, **options) -> LLMGateway:
+    return LLMGateway(base_url=base_url, backoff_seconds=0.05, **options)
+
+
+def test_parse_duration():
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("120ms") == pytest.approx(0.12)
+    assert parse_duration("7") == 7.0
+    assert parse_duration(None) is None
+
+
+def test_static_limits_are_off_by_default(fake_server):
+    base_url, _ = fake_server()
+    gateway = LLMGateway(base_url=base_url)
+    gateway.chat_model("key", MODEL)
+
+    model_stats = next(iter(gateway.stats().values()))["models"][MODEL]
+    assert model_stats["requests"] is None and model_stats["tokens"] is None
+    assert gateway.max_queue_seconds == 0
+
+
+def test_reported_limits_pace_calls_instead_of_hitting_429(fake_server):
+    base_url, counters = fake_server(latency=0.01, limit=2, window_seconds=1.5)
+    llm = gateway_for(base_url).chat_model("key", MODEL)
+
+    async def ask_three():
+        start = time.perf_counter()
+        for i in range(3):
+            await llm.ainvoke(f"Question {i}")
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(ask_three())
+
+    # The second response reports the window spent, so the third call waits for its reset
+    assert counters["rate_limited"] == 0
+    assert counters["completed"] == 3
+    assert elapsed >= 1.0
+
+
+def test_429_is_retried_after_retry_after(fake_server):
+    base_url, counters = fake_server(latency=0.01, limit=2, window_seconds=1)
+    gateway = gateway_for(base_url)
+    llm = gateway.chat_model("key", MODEL)
+
+    async def burst():
+        # Nothing has been reported yet, so the whole burst goes out and part of it is rejected
+        return await asyncio.gather(*(llm.ainvoke(f"Question {i}") for i in range(4)))
+
+    answers = asyncio.run(burst())
+
+    assert len(answers) == 4
+    stats = next(iter(gateway.stats().values()))
+    assert counters["rate_limited"] >= 1
+    assert stats["rate_limited"] == counters["rate_limited"]
+    assert stats["retries"] >= stats["rate_limited"]
+    assert stats["failures"] == 0
+
+
+def test_429_fails_once_retries_are_exhausted(fake_server):
+    base_url, counters = fake_server(latency=0.01, limit=1, window_seconds=30)
+    gateway = gateway_for(base_url, max_retries=0)
+    llm = gateway.chat_model("key", MODEL)
+
+    async def burst():
+        return await asyncio.gather(*(llm.ainvoke(f"Question {i}") for i in range(2)), return_exceptions=True)
+
+    errors = [result for result in asyncio.run(burst()) if isinstance(result, Exception)]
+
+    assert [getattr(error, "status_code", None) for error in errors] == [429]
+    assert next(iter(gateway.stats().values()))["failures"] == 1
+    assert counters["requests"] == 2
+
+
+def test_call_fails_when_reset_is_beyond_queue_limit(fake_server):
+    base_url, counters = fake_server(latency=0.01, limit=1, window_seconds=30)
+    gateway = gateway_for(base_url, max_queue_seconds=5)
+    llm = gateway.chat_model("key", MODEL)
+
+    async def run():
+        await llm.ainvoke("First question")
+        with pytest.raises(LLMQueueTimeout):
+            # The reported reset is 30s away, beyond the queue limit
+            await llm.ainvoke("Second question")
+
+    asyncio.run(run())
+    assert counters["requests"] == 1
+
+
+def test_identical_concurrent_calls_are_coalesced(fake_server):
+    base_url, counters = fake_server(latency=0.3)
+    gateway = gateway_for(base_url)
+    llm = gateway.chat_model("key", MODEL)
+
+    async def stream():
+        return "".join([chunk.content async for chunk in llm.astream("Same question")])
+
+    async def bursts():
+        # The gateway's pooled clients belong to one event loop, as in the app
+        invoked = await asyncio.gather(*(llm.ainvoke("Same question") for _ in range(5)))
+        streamed = await asyncio.gather(*(stream() for _ in range(5)))
+        return [message.content for message in invoked], streamed
+
+    for answers in asyncio.run(bursts()):
+        assert len(set(answers)) == 1 and answers[0].startswith("Fake answer")
+
+    assert counters["requests"] == 2
+    assert next(iter(gateway.stats().values()))["coalesced"] == 8
+
+
+def test_sync_calls_are_paced_by_reported_limits(fake_server):
+    base_url, counters = fake_server(latency=0.01, limit=2, window_seconds=1)
+    gateway = gateway_for(base_url)
+    llm = gateway.chat_model("key", MODEL)
+
+    start = time.perf_counter()
+    answers = [llm.invoke(f"Question {i}").content for i in range(3)]
+
+    assert all(answer.startswith("Fake answer") for answer in answers)
+    # The third call waits for the window reported by the second response instead of hitting a 429
+    assert counters["rate_limited"] == 0 and counters["completed"] == 3
+    assert time.perf_counter() - start >= 0.5
+    assert next(iter(gateway.stats().values()))["requests"] == 3
+
+
+def test_sync_429_is_retried(fake_server):
+    base_url, counters = fake_server(latency=0.01, limit=2, window_seconds=1)
+    gateway = gateway_for(base_url)
+    llm = gateway.chat_model("key", MODEL)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        answers = list(pool.map(lambda i: llm.invoke(f"Question {i}").content, range(4)))
+
+    assert len(answers) == 4
+    stats = next(iter(gateway.stats().values()))
+    assert counters["rate_limited"] >= 1
+    assert stats["retries"] >= counters["rate_limited"] and stats["failures"] == 0
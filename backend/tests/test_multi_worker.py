@@ -0,0 +1,56 @@
+"""Two worker processes sharing one data directory and SQLite session backend."""
+import pytest
+from benchmarks.multi_worker_consistency import Worker
+
+TEXT = "Photosynthesis converts light into chemical energy."
+
+
+@pytest.fixture
+def workers(tmp_path):
+    started = [Worker(str(tmp_path)) for _ in range(2)]
+    yield started
+    for worker in started:
+        worker.close()
+
+
+def call(worker, op, **params):
+    reply = worker.call(op, **params)
+    assert reply["ok"], reply
+    return reply["result"]
+
+
+def test_session_ingested_in_one_worker_is_visible_in_the_other(workers):
+    first, second = workers
+    call(first, "ingest", session="biology", pages=[TEXT])
+
+    assert "biology" in call(second, "sessions")
+    assert "Photosynthesis" in call(second, "search", session="biology", query="photosynthesis light")[0]
+
+
+def test_same_upload_in_the_other_worker_reuses_the_shared_index(workers):
+    first, second = workers
+    assert call(first, "ingest", session="student-a", pages=[TEXT])["shared"] is False
+
+    assert call(second, "ingest", session="student-b", pages=[TEXT])["shared"] is True
+    assert {"student-a", "student-b"} <= set(call(first, "sessions"))
+
+
+def test_reingest_replaces_the_copy_cached_by_the_other_worker(workers):
+    first, second = workers
+    call(first, "ingest", session="biology", pages=[TEXT])
+    call(second, "search", session="biology", query="photosynthesis")
+
+    call(first, "ingest", session="biology", pages=["Mitochondria are the powerhouse of the cell."])
+
+    assert "Mitochondria" in call(second, "search", session="biology", query="mitochondria cell")[0]
+
+
+def test_chat_history_is_shared_between_workers(workers):
+    first, second = workers
+    call(first, "ingest", session="biology", pages=[TEXT])
+
+    assert call(first, "chat", session="biology", message="What does photosynthesis do?") == 2
+    # The second worker appends to the history the first one wrote
+    assert call(second, "chat", session="biology", message="Where does it happen?") == 4
+    assert call(first, "history", session="biology") == 4
+    assert call(second, "history", session="biology") == 4
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import pytest
+from conftest import git
+from rag import repo_ingest
+from rag.repo_ingest import (
+    check_repository_source,
+    checkout_repository,
+    get_checkout_name,
+    iter_repository_files,
+    load_repository_documents,
+    read_repository_file,
+)
+
+
+def write(root, rel_path, text):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def repos(tmp_path):
+    """A working repository and a bare clone of it serving as the remote, both under tmp_path."""
+    work = str(tmp_path / "work")
+    os.makedirs(work)
+    git(work, "init", "-q", "-b", "main")
+    write(work, "app/main.py", "def main():\n    return 'hello'\n")
+    write(work, "app/util.py", "def helper(value):\n    return value * 2\n")
+    write(work, "README.md", "# Demo\n\nA small repository used by the tests.\n")
+    write(work, ".gitignore", "build/\n*.log\n")
+    write(work, "build/generated.py", "GENERATED = True\n")
+    write(work, "debug.log", "noise\n")
+    git(work, "add", "-A")
+    git(work, "commit", "-q", "-m", "initial")
+    bare = str(tmp_path / "remote.git")
+    git(str(tmp_path), "clone", "-q", "--bare", work, bare)
+    git(work, "remote", "add", "origin", bare)
+    return work, bare
+
+
+def push_change(work, rel_path, text):
+    write(work, rel_path, text)
+    git(work, "add", "-A")
+    git(work, "commit", "-q", "-m", f"change {rel_path}")
+    git(work, "push", "-q", "origin", "main")
+
+
+@pytest.mark.parametrize("source", ["/etc", "/root", "file:///etc/passwd", "--upload-pack=touch x", "ssh://-oProxyCommand=x/r"])
+def test_rejects_sources_that_are_not_git_remotes(source):
+    with pytest.raises(ValueError):
+        check_repository_source(source, local_root="")
+
+
+@pytest.mark.parametrize("source", ["https://github.com/owner/repo", "git@github.com:owner/repo.git",
+                                    "ssh://git@example.com/owner/repo.git"])
+def test_accepts_git_remotes(source):
+    assert check_repository_source(source, local_root="") == source
+
+
+def test_local_paths_must_stay_under_the_root(tmp_path, repos):
+    work, _ = repos
+    assert check_repository_source(work, local_root=str(tmp_path)) == os.path.realpath(work)
+    with pytest.raises(ValueError):
+        check_repository_source(os.path.join(work, "..", "..", ".."), local_root=str(tmp_path))
+    os.symlink("/etc", tmp_path / "escape")
+    with pytest.raises(ValueError):
+        check_repository_source(str(tmp_path / "escape"), local_root=str(tmp_path))
+
+
+def test_checkout_names_differ_per_host_and_ignore_url_spelling():
+    assert get_checkout_name("https://github.com/a/b") != get_checkout_name("https://gitlab.com/a/b")
+    assert get_checkout_name("https://github.com/a/b") == get_checkout_name("https://GitHub.com/a/b.git/")
+    assert get_checkout_name("https://github.com/a/b").startswith("a-b-")
+
+
+def test_clones_bare_repository_and_fetches_updates(tmp_path, repos):
+    work, bare = repos
+    checkouts = str(tmp_path / "checkouts")
+    with checkout_repository(bare, checkouts, local_root=str(tmp_path)) as root:
+        assert root.startswith(checkouts)
+        assert sorted(iter_repository_files(root)) == ["README.md", "app/main.py", "app/util.py"]
+
+    push_change(work, "app/extra.py", "EXTRA = 1\n")
+    with checkout_repository(bare, checkouts, local_root=str(tmp_path)) as updated:
+        assert updated == root
+        assert "app/extra.py" in set(iter_repository_files(updated))
+
+
+def test_checkout_with_another_origin_is_cloned_again(tmp_path, repos):
+    _, bare = repos
+    other = str(tmp_path / "other.git")
+    git(str(tmp_path), "init", "-q", "--bare", other)
+    checkouts = str(tmp_path / "checkouts")
+    with checkout_repository(bare, checkouts, local_root=str(tmp_path)) as root:
+        git(root, "remote", "set-url", "origin", other)
+    with checkout_repository(bare, checkouts, local_root=str(tmp_path)) as root:
+        assert git(root, "remote", "get-url", "origin").strip() == bare
+
+
+def test_tracked_symlinks_to_host_files_are_not_indexed(tmp_path, repos):
+    work, bare = repos
+    write(str(tmp_path), "host/.env", "GROQ_API_KEY=server-secret\n")
+    os.symlink(str(tmp_path / "host" / ".env"), os.path.join(work, "leak.txt"))
+    os.symlink("../../host/.env", os.path.join(work, "app", "relative.md"))
+    git(work, "add", "-A")
+    git(work, "commit", "-q", "-m", "add links")
+    git(work, "push", "-q", "origin", "main")
+
+    with checkout_repository(bare, str(tmp_path / "checkouts"), local_root=str(tmp_path)) as root:
+        assert os.path.islink(os.path.join(root, "leak.txt"))
+        files = set(iter_repository_files(root))
+        documents = list(load_repository_documents(root))
+        assert read_repository_file(root, "leak.txt") is None
+    assert "leak.txt" not in files and "app/relative.md" not in files
+    assert not any("server-secret" in doc.page_content for doc in documents)
+
+
+def test_gitignore_filtering_without_git(tmp_path):
+    root = str(tmp_path / "plain")
+    write(root, ".gitignore", "build/\n*.txt\n!keep.txt\n")
+    write(root, "src/app.py", "print('app')\n")
+    write(root, "src/.gitignore", "secret.py\n")
+    write(root, "src/secret.py", "TOKEN = 'x'\n")
+    write(root, "build/out.py", "print('built')\n")
+    write(root, "node_modules/lib/index.js", "module.exports = 1\n")
+    write(root, "trace.txt", "noise\n")
+    write(root, "keep.txt", "kept despite *.txt\n")
+    with open(os.path.join(root, "blob.bin"), 'wb') as f:
+        f.write(b"\0binary")
+    assert sorted(iter_repository_files(root)) == ["keep.txt", "src/app.py"]
+
+
+def test_gitignore_filtering_in_git_checkout(repos):
+    work, _ = repos
+    files = set(iter_repository_files(work))
+    assert "build/generated.py" not in files
+    assert "debug.log" not in files
+    assert {"app/main.py", "app/util.py", "README.md"} <= files
+
+
+def test_incremental_reingest_embeds_only_changed_files(tmp_path, repos, embeddings, monkeypatch):
+    from rag.chain_registry import ChainRegistry
+    from rag.github_rag import GitHubRAGBot
+    work, bare = repos
+    monkeypatch.setattr(repo_ingest, "LOCAL_REPOSITORY_ROOT", str(tmp_path))
+    bot = GitHubRAGBot(embeddings, chain_registry=ChainRegistry(), data_dir=str(tmp_path / "data"),
+                       answer_cache=None, compressor=None)
+    bot.repositories_dir = str(tmp_path / "checkouts")
+
+    first = asyncio.run(bot.process_repository(bare, "session-1"))
+    assert first["added"] == 3 and first["chunks"] > 0
+    fingerprint = bot.vector_stores.fingerprint("session-1")
+
+    push_change(work, "app/util.py", "def helper(value):\n    return value * 3\n")
+    second = asyncio.run(bot.process_repository(bare, "session-1"))
+    assert (second["added"], second["changed"], second["removed"], second["unchanged"]) == (0, 1, 0, 2)
+    assert second["chunks"] == 1
+    assert bot.vector_stores.fingerprint("session-1") != fingerprint
+    stored = bot.vector_stores.shared[bot.vector_stores.base("session-1")].get(include=["documents", "metadatas"])
+    assert {metadata["source"] for metadata in stored["metadatas"]} == {"README.md", "app/main.py", "app/util.py"}
+    assert any("value * 3" in text for text in stored["documents"])
+    assert not any("value * 2" in text for text in stored["documents"])
+
+    again = asyncio.run(bot.process_repository(bare, "session-2"))
+    assert again["shared"] and again["chunks"] == 0
+
+
+def test_process_repository_rejects_server_paths(tmp_path, embeddings, monkeypatch):
+    from fastapi import HTTPException
+    from rag.chain_registry import ChainRegistry
+    from rag.github_rag import GitHubRAGBot
+    monkeypatch.setattr(repo_ingest, "LOCAL_REPOSITORY_ROOT", None)
+    bot = GitHubRAGBot(embeddings, chain_registry=ChainRegistry(), data_dir=str(tmp_path / "data"),
+                       answer_cache=None, compressor=None)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(bot.process_repository("/etc", "session-1"))
+    assert raised.value.status_code == 400
@@ -0,0 +1,27 @@
+import asyncio
+from rag.session_backend import SQLiteBackend
+from rag.session_store import SharedIndexStore
+
+
+def test_waiting_for_the_references_lock_leaves_the_event_loop_running(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    store = SharedIndexStore("pdf", indexes=None, backend=backend)
+    backend.set(store._key("ready", "abc"), 1)
+    # Held by another worker
+    backend.set(store._key("refs-lock", "abc"), 1)
+
+    async def build(vector_store, sparse_index):
+        raise AssertionError("a ready index must not be rebuilt")
+
+    async def scenario():
+        ensured = asyncio.create_task(store.ensure("abc", build))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not ensured.done()
+        backend.delete(store._key("refs-lock", "abc"))
+        return await asyncio.wait_for(ensured, timeout=5)
+
+    assert asyncio.run(scenario()) is False
+    assert store.references("abc") == 1
@@ -0,0 +1,35 @@
+import asyncio
+import os
+from utils.tracing import TracingMiddleware
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def request(middleware, profile=True):
+    scope = {"type": "http", "method": "GET", "path": "/chat",
+             "headers": [(b"x-omnilearn-profile", b"1")] if profile else []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware(scope, receive, send))
+
+
+def test_profile_header_is_ignored_unless_enabled(tmp_path):
+    request(TracingMiddleware(app, profile_dir=str(tmp_path / "profiles")))
+    assert not os.path.exists(tmp_path / "profiles")
+
+
+def test_profile_directory_keeps_only_the_newest_files(tmp_path):
+    profiles = tmp_path / "profiles"
+    middleware = TracingMiddleware(app, profile_requests=True, profile_dir=str(profiles), max_profiles=3)
+    for _ in range(5):
+        request(middleware)
+    request(middleware, profile=False)
+    assert len(os.listdir(profiles)) == 3
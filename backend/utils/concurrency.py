@@ -0,0 +1,103 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# Pool sizes can be tuned per deployment through the environment
+THREAD_WORKERS = int(os.environ.get("OMNILEARN_THREAD_WORKERS", min(8, (os.cpu_count() or 1) + 2)))
+PROCESS_WORKERS = int(os.environ.get("OMNILEARN_PROCESS_WORKERS", max(1, (os.cpu_count() or 1) - 1)))
+MAX_CONCURRENT_INGESTS = int(os.environ.get("OMNILEARN_MAX_CONCURRENT_INGESTS", 2))
+# Ingestion gets its own threads, so a large ingest never occupies the ones chat requests need
+INGEST_THREAD_WORKERS = int(os.environ.get("OMNILEARN_INGEST_THREAD_WORKERS", MAX_CONCURRENT_INGESTS))
+
+_thread_pool = None
+_ingest_pool = None
+_process_pool = None
+_ingest_semaphore = None
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Shared pool for the blocking steps of requests: retrieval, caches, file I/O."""
+    global _thread_pool
+    if _thread_pool is None:
+        logger.info(f"Starting thread pool with {THREAD_WORKERS} workers")
+        _thread_pool = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix="omnilearn")
+    return _thread_pool
+
+
+def get_ingest_pool() -> ThreadPoolExecutor:
+    """Pool for the blocking steps of ingestion: fetching, splitting and embedding documents."""
+    global _ingest_pool
+    if _ingest_pool is None:
+        logger.info(f"Starting ingestion thread pool with {INGEST_THREAD_WORKERS} workers")
+        _ingest_pool = ThreadPoolExecutor(max_workers=INGEST_THREAD_WORKERS, thread_name_prefix="omnilearn-ingest")
+    return _ingest_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared pool for pure-Python CPU-bound work such as PDF parsing."""
+    global _process_pool
+    if _process_pool is None:
+        logger.info(f"Starting process pool with {PROCESS_WORKERS} workers")
+        _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+    return _process_pool
+
+
+def ingest_slot() -> asyncio.Semaphore:
+    """Semaphore limiting how many ingestions run at the same time."""
+    global _ingest_semaphore
+    if _ingest_semaphore is None:
+        _ingest_semaphore = asyncio.Semaphore(MAX_CONCURRENT_INGESTS)
+    return _ingest_semaphore
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the shared thread pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), partial(func, *args, **kwargs))
+
+
+async def run_ingest(func, *args, **kwargs):
+    """Run a blocking ingestion step on the ingestion pool, leaving the shared pool to requests."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_ingest_pool(), partial(func, *args, **kwargs))
+
+
+async def run_in_process(func, *args):
+    """Run a picklable CPU-bound callable on the shared process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args))
+
+
+@contextmanager
+def interprocess_lock(path: str):
+    """Exclusive advisory file lock shared by all workers on the host (no-op where flock is unavailable)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def shutdown_pools():
+    global _thread_pool, _ingest_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False)
+        _thread_pool = None
+    if _ingest_pool is not None:
+        _ingest_pool.shutdown(wait=False)
+        _ingest_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _process_pool = None
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+DEFAULT_MAX_ENTRIES = 200_000
+# Rows are counted exactly at most once per this many inserts (other workers insert too)
+COUNT_REFRESH_INSERTS = 10_000
+
+
+def _vector_to_blob(vector: List[float]) -> bytes:
+    return array('f', vector).tobytes()
+
+
+def _blob_to_vector(blob: bytes) -> List[float]:
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Disk-backed, content-addressed cache in front of an embeddings model.
+
+    Vectors are keyed by (model name, sha256 of the chunk text) and stored as
+    float32 blobs in SQLite, so every bot and every session sharing the same
+    cache file only pays for embedding a given chunk once. The least recently
+    used entries are evicted once the cache grows past max_entries, down to
+    5% below it, so the table is counted and trimmed in occasional batches
+    rather than on every store.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_path: str,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Running row count, corrected by an exact count when eviction may be due
+        self._entries = self._count()
+        self._inserts_since_count = 0
+        logger.info(f"Embedding cache opened at: {cache_path}")
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update((key, _blob_to_vector(blob)) for key, blob in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            # A key stored meanwhile by another worker holds the same vector
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, _vector_to_blob(vector), now) for key, vector in entries.items()],
+            ).rowcount
+            self._entries += inserted
+            self._inserts_since_count += inserted
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Trim the least recently used entries once the running count says the cache is full."""
+        if self._entries <= self.max_entries and self._inserts_since_count < COUNT_REFRESH_INSERTS:
+            return
+        self._entries = self._count()
+        self._inserts_since_count = 0
+        if self._entries <= self.max_entries:
+            return
+        overflow = self._entries - (self.max_entries - self.max_entries // 20)
+        logger.debug(f"Evicting {overflow} least recently used embeddings")
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (overflow,),
+        )
+        self._entries -= overflow
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            logger.debug(f"Embedding {len(missing)} uncached chunks ({len(texts) - len(missing)} cache hits)")
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are rarely repeated verbatim, so they bypass the cache
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current number of cached vectors."""
+        with self._lock:
+            entries = self._count()
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": entries,
+        }
@@ -1,4 +1,235 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+from langchain_core.embeddings import Embeddings
+from utils.embedding_cache import CachedEmbeddings
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+CACHE_PATH = os.environ.get(
+    "OMNILEARN_EMBEDDING_CACHE",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../../cache/embeddings.sqlite")),
+)
+EMBED_BATCH_SIZE = int(os.environ.get("OMNILEARN_EMBED_BATCH_SIZE", 64))
+EMBED_BATCH_TOKENS = int(os.environ.get("OMNILEARN_EMBED_BATCH_TOKENS", 16384))
+EMBED_MAX_WAIT_MS = float(os.environ.get("OMNILEARN_EMBED_MAX_WAIT_MS", 5))
+EMBED_WORKERS = int(os.environ.get("OMNILEARN_EMBED_WORKERS", 1))
+
+_shared_embeddings = None
+_shared_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count; about four characters per token for English text and code."""
+    return len(text) // 4 + 1
+
+
+class _Request:
+    def __init__(self, size: int):
+        self.future = Future()
+        self.results = [None] * size
+        self.remaining = size
+        self.lock = threading.Lock()
+
+    def fulfil(self, position: int, vector: List[float]):
+        with self.lock:
+            self.results[position] = vector
+            self.remaining -= 1
+            done = self.remaining == 0
+        if done:
+            self.future.set_result(self.results)
+
+    def fail(self, error: Exception):
+        with self.lock:
+            if self.future.done():
+                return
+            self.remaining = -1
+        self.future.set_exception(error)
+
+
+class EmbeddingService:
+    """
+    Shared micro-batching front end for an embeddings model.
+
+    Chunk texts submitted by any session are queued and packed into batches of
+    up to max_batch_size texts and max_batch_tokens estimated tokens. Under
+    load, batches fill up from several concurrent ingests; when idle, a batch
+    is flushed after max_wait_ms. Batches run on a dedicated worker pool and
+    callers receive a Future for their own vectors.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = EMBED_BATCH_SIZE,
+                 max_batch_tokens: int = EMBED_BATCH_TOKENS, max_wait_ms: float = EMBED_MAX_WAIT_MS,
+                 workers: int = EMBED_WORKERS):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        # An item that did not fit the previous batch's token budget; it opens the next one
+        self._carried = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+        # Keep at most one batch queued per worker so new work can still join the next batch
+        self._slots = threading.Semaphore(workers + 1)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="embed-dispatcher", daemon=True)
+        self._stopped = False
+        self.batches = 0
+        self.texts = 0
+        self._dispatcher.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for embedding and return a Future of their vectors."""
+        request = _Request(len(texts))
+        if not texts:
+            request.future.set_result([])
+        for position, text in enumerate(texts):
+            self._queue.put((text, request, position))
+        return request.future
+
+    def _next_batch(self):
+        # Only the dispatcher thread builds batches, so the carried item needs no lock
+        first, self._carried = self._carried, None
+        if first is None:
+            first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        tokens = estimate_tokens(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            item_tokens = estimate_tokens(item[0])
+            if tokens + item_tokens > self.max_batch_tokens:
+                # Re-queuing it at the tail would let later work overtake it indefinitely
+                self._carried = item
+                break
+            batch.append(item)
+            tokens += item_tokens
+        return batch
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._pool.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            vectors = self.embeddings.embed_documents([text for text, _, _ in batch])
+            for (_, request, position), vector in zip(batch, vectors):
+                request.fulfil(position, vector)
+            self.batches += 1
+            self.texts += len(batch)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} texts failed: {str(e)}", exc_info=True)
+            for _, request, _ in batch:
+                request.fail(e)
+        finally:
+            self._slots.release()
+
+    def stop(self):
+        if not self._stopped:
+            self._stopped = True
+            self._queue.put(None)
+            self._pool.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize() + (self._carried is not None),
+        }
+
+
+class ServiceEmbeddings(Embeddings):
+    """
+    Embeddings interface that routes document embedding through an EmbeddingService.
+
+    Queries call the model directly: a single text gains nothing from
+    batching, and a chat request must not wait behind queued ingest chunks.
+    """
+
+    def __init__(self, service: EmbeddingService):
+        self.service = service
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.service.submit(texts).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.service.embeddings.embed_query(text)
+
+
+class LazyEmbeddings(Embeddings):
+    """Defers importing and loading the sentence-transformer until it is first used."""
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+                    logger.info(f"Loaded embedding model {self.model_name} in {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
 
 def get_embeddings():
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
\ No newline at end of file
+    """Return the process-wide embeddings stack; the model itself loads on first use."""
+    global _shared_embeddings
+    if _shared_embeddings is None:
+        with _shared_lock:
+            if _shared_embeddings is None:
+                service = EmbeddingService(LazyEmbeddings(MODEL_NAME))
+                _shared_embeddings = CachedEmbeddings(
+                    ServiceEmbeddings(service),
+                    model_name=MODEL_NAME,
+                    cache_path=CACHE_PATH,
+                )
+    return _shared_embeddings
+
+
+def warm_up_embeddings(background: bool = True):
+    """Load the model and run one query so the first request does not pay for it."""
+    def warm_up():
+        try:
+            get_embeddings().embed_query("warm up")
+        except Exception as e:
+            logger.error(f"Embedding warm-up failed: {str(e)}", exc_info=True)
+
+    if not background:
+        warm_up()
+        return None
+    thread = threading.Thread(target=warm_up, name="embed-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,313 @@
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from utils.concurrency import run_blocking
+from utils.logger import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+# Whether clients may ask for a JSON trace dump with X-OmniLearn-Profile; off in production
+PROFILE_REQUESTS = os.environ.get("OMNILEARN_PROFILE_REQUESTS", "0") == "1"
+# Where X-OmniLearn-Profile requests dump their trace as JSON
+PROFILE_DIR = os.environ.get(
+    "OMNILEARN_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "profiles"),
+)
+# Only the newest profiles are kept; older ones are deleted as new ones arrive
+PROFILE_MAX_FILES = int(os.environ.get("OMNILEARN_PROFILE_MAX_FILES", 100))
+# Requests slower than this are logged with their stage breakdown at WARNING
+SLOW_REQUEST_MS = float(os.environ.get("OMNILEARN_SLOW_REQUEST_MS", 5000))
+PROFILE_HEADER = b"x-omnilearn-profile"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Numeric span attributes that are also accumulated as per-stage counters
+COUNTED_ATTRIBUTES = ("pages", "chunks", "documents", "bytes", "tokens_in", "tokens_out", "tokens_saved")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative latency histogram with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    le = 'le="{}"'.format(bound if bound == "+Inf" else f"{bound:g}")
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics served by the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram(
+    "omnilearn_http_request_seconds", "HTTP request latency, including streamed bodies.",
+    ("method", "route", "status")
+)
+STAGE_SECONDS = metrics.histogram("omnilearn_stage_seconds", "Latency of each traced stage.", ("stage",))
+STAGE_ERRORS = metrics.counter("omnilearn_stage_errors_total", "Traced stages that raised.", ("stage",))
+STAGE_UNITS = metrics.counter(
+    "omnilearn_stage_units_total", "Items processed by traced stages (chunks, tokens, bytes, ...).",
+    ("stage", "unit")
+)
+
+
+class Span:
+    """One timed stage with attributes such as chunk, token and byte counts."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+
+class Trace:
+    """Spans recorded while serving one request."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds spent per stage name, summed over repeated spans."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.duration is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration * 1000
+        return totals
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stage_totals().items())
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={ms:.0f}ms" for name, ms in self.stage_totals().items())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.elapsed_ms(),
+            "spans": [
+                {
+                    "name": span.name,
+                    "offset_ms": (span.start - self.start) * 1000,
+                    "duration_ms": span.duration * 1000 if span.duration is not None else None,
+                    "error": span.error,
+                    "attributes": span.attributes,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("omnilearn_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage and attach it to the current request's trace.
+
+    Works the same inside and outside a request; without a trace only the
+    stage metrics are recorded. Attributes can be added while the stage runs
+    through the yielded span's set().
+    """
+    stage = Span(name, attributes)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append(stage)
+    try:
+        yield stage
+    except BaseException as e:
+        stage.error = type(e).__name__
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        stage.finish()
+        STAGE_SECONDS.observe(stage.duration, stage=name)
+        for unit in COUNTED_ATTRIBUTES:
+            value = stage.attributes.get(unit)
+            if isinstance(value, (int, float)) and value:
+                STAGE_UNITS.inc(value, stage=name, unit=unit)
+
+
+def _write_profile(trace: Trace, status: int, profile_dir: str = PROFILE_DIR,
+                   max_files: int = PROFILE_MAX_FILES) -> str:
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f"{trace.id}.json")
+    with open(path, 'w') as f:
+        json.dump({**trace.to_dict(), "status": status}, f, indent=2)
+    profiles = sorted(
+        (entry for entry in os.scandir(profile_dir) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(0, len(profiles) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+    return path
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces every HTTP request.
+
+    Records the request latency (until the last body chunk of a streamed
+    response is sent), returns the trace ID in X-Trace-Id and the stages
+    finished before the headers went out in Server-Timing, and logs slow
+    requests with their stage breakdown. When profile_requests is set,
+    sending X-OmniLearn-Profile: 1 dumps the full trace as JSON under
+    profile_dir, keeping the newest max_profiles files.
+    """
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS, skip_paths: Tuple[str, ...] = ("/metrics",),
+                 profile_requests: bool = PROFILE_REQUESTS, profile_dir: str = PROFILE_DIR,
+                 max_profiles: int = PROFILE_MAX_FILES):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.skip_paths = skip_paths
+        self.profile_requests = profile_requests
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        profile = self.profile_requests and dict(scope.get("headers") or []).get(PROFILE_HEADER) == b"1"
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-trace-id", trace.id.encode()))
+                timing = trace.server_timing()
+                if timing:
+                    headers.append((b"server-timing", timing.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _current_trace.reset(token)
+            elapsed_ms = trace.elapsed_ms()
+            # The matched route template keeps the label set small (no session IDs in paths)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed_ms / 1000, method=scope["method"], route=route, status=status)
+            line = f"{trace.name} -> {status} in {elapsed_ms:.0f} ms [{trace.id}] {trace.summary()}"
+            if elapsed_ms >= self.slow_request_ms:
+                logger.warning(f"Slow request: {line}")
+            else:
+                logger.debug(line)
+            if profile:
+                try:
+                    path = await run_blocking(_write_profile, trace, status, self.profile_dir, self.max_profiles)
+                    logger.info(f"Request profile written to {path}")
+                except Exception as e:
+                    logger.warning(f"Failed to write request profile: {str(e)}")
@@ -43,51 +43,6 @@ function addMessage(content, isUser = false) {
     }
 }
 
-// Upload files
-uploadButton.addEventListener('click', async () => {
-    const files = fileInput.files;
-    if (files.length === 0) {
-        uploadStatus.textContent = 'Please select files to upload';
-        return;
-    }
-
-    const sessionId = sessionIdInput.value;
-    if (!sessionId) {
-        uploadStatus.textContent = 'Please enter a session ID';
-        return;
-    }
-
-    isUploading = true;
-    uploadButton.disabled = true;
-    uploadStatus.textContent = 'Uploading files...';
-
-    const formData = new FormData();
-    for (const file of files) {
-        formData.append('files', file);
-    }
-    formData.append('session_id', sessionId);
-
-    try {
-        const response = await fetch('/api/upload', {
-            method: 'POST',
-            body: formData,
-        });
-
-        if (!response.ok) {
-            throw new Error('Upload failed');
-        }
-
-        const data = await response.json();
-        uploadStatus.textContent = 'Files uploaded successfully!';
-        fileInput.value = ''; // Clear file input
-    } catch (error) {
-        uploadStatus.textContent = `Error uploading files: ${error.message}`;
-    } finally {
-        isUploading = false;
-        uploadButton.disabled = false;
-    }
-});
-
 // Send message
 async function sendMessage() {
     const message = messageInput.value.trim();
@@ -183,7 +138,73 @@ fileUploadArea.addEventListener('drop', (e) => {
     fileInput.files = e.dataTransfer.files;
 });
 
-// Modified upload function
+// Chunked, resumable upload of one file; returns the completed upload ID.
+// The upload ID is remembered per file, so a retry after a dropped connection
+// or a page reload continues from the last byte the server received.
+const UPLOAD_RETRIES = 5;
+
+async function sha256Hex(blob) {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadRequest(url, options = {}) {
+    const response = await fetch(url, options);
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+        const error = new Error((data.detail && (data.detail.message || data.detail)) || data.error || 'Upload failed');
+        error.status = response.status;
+        error.offset = data.detail && data.detail.offset;
+        throw error;
+    }
+    return data;
+}
+
+async function uploadFileInChunks(file, sessionId, onProgress) {
+    const resumeKey = `upload:${sessionId}:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = null;
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        upload = await uploadRequest(`/api/uploads/${savedId}`).catch(() => null);
+    }
+    if (!upload) {
+        upload = await uploadRequest('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ session_id: sessionId, filename: file.name, size: file.size }),
+        });
+        localStorage.setItem(resumeKey, upload.upload_id);
+    }
+
+    let offset = upload.offset;
+    let failures = 0;
+    while (upload.status === 'uploading' && offset < file.size) {
+        const chunk = file.slice(offset, offset + upload.chunk_size);
+        try {
+            const result = await uploadRequest(`/api/uploads/${upload.upload_id}?offset=${offset}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': await sha256Hex(chunk) },
+                body: chunk,
+            });
+            offset = result.offset;
+            failures = 0;
+            onProgress(offset / file.size);
+        } catch (error) {
+            if (++failures > UPLOAD_RETRIES || (error.status && error.status < 500 && error.status !== 409)) {
+                throw error;
+            }
+            // Ask the server how much arrived and resume from there
+            const status = await uploadRequest(`/api/uploads/${upload.upload_id}`).catch(() => null);
+            offset = status ? status.offset : offset;
+            await new Promise((resolve) => setTimeout(resolve, 500 * failures));
+        }
+    }
+
+    await uploadRequest(`/api/uploads/${upload.upload_id}/complete`, { method: 'POST' });
+    localStorage.removeItem(resumeKey);
+    return upload.upload_id;
+}
+
 async function uploadFiles() {
     const files = fileInput.files;
     if (files.length === 0) {
@@ -197,34 +218,31 @@ async function uploadFiles() {
         return;
     }
 
-    isUploading = true;
-    uploadButton.disabled = true;
-    uploadStatus.textContent = 'Uploading files...';
-
-    const formData = new FormData();
     for (const file of files) {
         if (!file.name.toLowerCase().endsWith('.pdf')) {
             uploadStatus.textContent = 'Only PDF files are allowed';
-            isUploading = false;
-            uploadButton.disabled = false;
             return;
         }
-        formData.append('files', file);
     }
-    formData.append('session_id', sessionId);
 
-    try {
-        const response = await fetch('/api/upload', {
-            method: 'POST',
-            body: formData
-        });
+    isUploading = true;
+    uploadButton.disabled = true;
 
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.detail || 'Upload failed');
+    try {
+        const uploadIds = [];
+        for (const [index, file] of Array.from(files).entries()) {
+            uploadIds.push(await uploadFileInChunks(file, sessionId, (fraction) => {
+                uploadStatus.textContent =
+                    `Uploading ${file.name} (${index + 1}/${files.length}): ${Math.round(fraction * 100)}%`;
+            }));
         }
 
-        const data = await response.json();
+        uploadStatus.textContent = 'Processing files...';
+        await uploadRequest('/api/uploads/ingest', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ session_id: sessionId, upload_ids: uploadIds }),
+        });
         uploadStatus.textContent = 'Files uploaded successfully!';
         fileInput.value = ''; // Clear file input
     } catch (error) {
@@ -235,6 +253,4 @@ async function uploadFiles() {
     }
 }
 
-// Replace the click event listener
-uploadButton.removeEventListener('click', uploadFiles);
 uploadButton.addEventListener('click', uploadFiles);
\ No newline at end of file
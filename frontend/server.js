@@ -1,8 +1,6 @@
 const express = require('express');
 const path = require('path');
-const multer = require('multer');
 const axios = require('axios');
-const FormData = require('form-data');
 const cors = require('cors');
 
 const app = express();
@@ -14,8 +12,30 @@ app.use(express.json());
 app.use(cors());
 app.use(express.static(path.join(__dirname, 'public')));
 
-// Multer configuration for file uploads
-const upload = multer();
+// Pass the backend's status and error body through instead of a generic 500
+function sendError(res, error) {
+    if (error.response) {
+        res.status(error.response.status).json(error.response.data);
+    } else {
+        res.status(500).json({ error: error.message });
+    }
+}
+
+// Forward a request body to the backend as a stream, without buffering it
+function streamTo(url, req, method = 'post', extraHeaders = {}) {
+    const headers = { 'content-type': req.headers['content-type'], ...extraHeaders };
+    if (req.headers['content-length']) {
+        headers['content-length'] = req.headers['content-length'];
+    }
+    return axios({
+        method,
+        url,
+        data: req,
+        headers,
+        maxBodyLength: Infinity,
+        maxContentLength: Infinity,
+    });
+}
 
 // API routes
 app.post('/api/chat', async (req, res) => {
@@ -27,22 +47,73 @@ app.post('/api/chat', async (req, res) => {
     }
 });
 
-app.post('/api/upload', upload.array('files'), async (req, res) => {
+// Multipart uploads are piped through untouched; the backend spools them to disk
+app.post('/api/upload', async (req, res) => {
     try {
-        const formData = new FormData();
-        req.files.forEach((file) => {
-            formData.append('files', file.buffer, file.originalname);
-        });
-        formData.append('session_id', req.body.session_id);
-
-        const response = await axios.post(`${FASTAPI_URL}/upload`, formData, {
-            headers: {
-                ...formData.getHeaders(),
-            },
-        });
+        const response = await streamTo(`${FASTAPI_URL}/upload`, req);
         res.json(response.data);
     } catch (error) {
-        res.status(500).json({ error: error.message });
+        sendError(res, error);
+    }
+});
+
+// Resumable chunked uploads
+app.post('/api/uploads', async (req, res) => {
+    try {
+        const response = await axios.post(`${FASTAPI_URL}/api/uploads`, req.body);
+        res.status(response.status).json(response.data);
+    } catch (error) {
+        sendError(res, error);
+    }
+});
+
+app.post('/api/uploads/ingest', async (req, res) => {
+    try {
+        const response = await axios.post(`${FASTAPI_URL}/api/uploads/ingest`, req.body);
+        res.status(response.status).json(response.data);
+    } catch (error) {
+        sendError(res, error);
+    }
+});
+
+app.get('/api/uploads/:uploadId', async (req, res) => {
+    try {
+        const response = await axios.get(`${FASTAPI_URL}/api/uploads/${encodeURIComponent(req.params.uploadId)}`);
+        res.json(response.data);
+    } catch (error) {
+        sendError(res, error);
+    }
+});
+
+app.put('/api/uploads/:uploadId', async (req, res) => {
+    try {
+        const url = `${FASTAPI_URL}/api/uploads/${encodeURIComponent(req.params.uploadId)}` +
+            `?offset=${encodeURIComponent(req.query.offset)}`;
+        const checksum = req.headers['x-chunk-sha256'];
+        const response = await streamTo(url, req, 'put', checksum ? { 'x-chunk-sha256': checksum } : {});
+        res.json(response.data);
+    } catch (error) {
+        sendError(res, error);
+    }
+});
+
+app.post('/api/uploads/:uploadId/complete', async (req, res) => {
+    try {
+        const response = await axios.post(
+            `${FASTAPI_URL}/api/uploads/${encodeURIComponent(req.params.uploadId)}/complete`
+        );
+        res.json(response.data);
+    } catch (error) {
+        sendError(res, error);
+    }
+});
+
+app.delete('/api/uploads/:uploadId', async (req, res) => {
+    try {
+        const response = await axios.delete(`${FASTAPI_URL}/api/uploads/${encodeURIComponent(req.params.uploadId)}`);
+        res.json(response.data);
+    } catch (error) {
+        sendError(res, error);
     }
 });
 